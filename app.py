@@ -1,4 +1,3 @@
-
 # ============================================================
 #  APP.PY — MANUAL DE FATURAMENTO (VERSÃO PREMIUM)
 #  COLUNA ÚNICA NA SEÇÃO 1 • TABELA DA SEÇÃO 2 IGUAL AO PRINT
@@ -12,13 +11,10 @@
 # ------------------------------------------------------------
 import os
 import re
-import json
 import time
+import threading
 import base64
-import random
-import unicodedata
 
-import requests
 import pandas as pd
 from fpdf import FPDF
 import streamlit as st
@@ -28,185 +24,227 @@ from streamlit_quill import st_quill
 from streamlit_paste_button import paste_image_button
 
 # ------------------------------------------------------------
-# 2. GITHUB DATABASE (Incluído no módulo — sem import externo)
-#    Seguro | Atômico | Anti-race | SHA locking | Cache curto
+# 2. GITHUB DATABASE (github_database.py)
+#    Seguro | Atômico | Anti-race | SHA locking | Cache curto + ETag
 # ------------------------------------------------------------
-class GitHubJSON:
-    API_URL = "https://api.github.com/repos/{owner}/{repo}/contents/{path}"
-
-    def __init__(self, token, owner, repo, path="dados.json", branch="main"):
-        self.token = token
-        self.owner = owner
-        self.repo = repo
-        self.path = path
-        self.branch = branch
-
-        # Cache ultra-curto para evitar GET múltiplos desnecessários
-        self._cache_data = None
-        self._cache_sha = None
-        self._cache_time = 0.0
-
-    @property
-    def headers(self):
-        return {
-            "Authorization": f"Bearer {self.token}",
-            "Accept": "application/vnd.github.v3+json",
-        }
-
-    # ============================
-    # LOAD — Leitura segura (200ms)
-    # ============================
-    
-    def load(self, force=False):
-        now = time.time()
-        if not force and self._cache_data is not None:
-            if (now - self._cache_time) < 0.2:  # cache curtíssimo
-                return self._cache_data, self._cache_sha
-    
-        url = self.API_URL.format(owner=self.owner, repo=self.repo, path=self.path)
-        r = requests.get(url, headers=self.headers, params={"ref": self.branch})
-    
-        if r.status_code == 404:
-            # Arquivo não existe — retorna base vazia
-            self._cache_data = []
-            self._cache_sha = None
-            self._cache_time = now
-            return [], None
-    
-        if r.status_code != 200:
-            raise Exception(f"GitHub GET error: {r.status_code} - {r.text}")
-    
-        body = r.json()
-        sha = body.get("sha")
-    
-        # Pode vir vazio; garante string
-        decoded_b64 = body.get("content") or ""
-        decoded = base64.b64decode(decoded_b64).decode("utf-8")
-    
-        # Auto-healing p/ arquivo vazio ou inválido
-        if not decoded.strip():
-            data = []
-        else:
-            try:
-                data = json.loads(decoded)
-            except json.JSONDecodeError:
-                # remove possíveis BOMs e tenta de novo
-                decoded = decoded.lstrip("\ufeff")
-                try:
-                    data = json.loads(decoded)
-                except json.JSONDecodeError:
-                    # fallback seguro: considera base vazia
-                    data = []
-    
-        # Garante tipo lista (se vier dict por engano)
-        if not isinstance(data, list):
-            data = []
-    
-        self._cache_data = data
-        self._cache_sha = sha
-        self._cache_time = now
-    
-        return data, sha
-
-
-    # ============================================
-    # SAVE — Salvamento atômico com SHA locking
-    # ============================================
-    def save(self, new_data, retries=8):
-        for attempt in range(retries):
-            # SHA sempre atualizado
-            _, sha = self.load(force=True)
-
-            url = self.API_URL.format(owner=self.owner, repo=self.repo, path=self.path)
-            encoded = base64.b64encode(
-                json.dumps(new_data, indent=4, ensure_ascii=False).encode("utf-8")
-            ).decode("utf-8")
-
-            payload = {
-                "message": "Atualização Manual Faturamento",
-                "content": encoded,
-                "sha": sha,
-                "branch": self.branch,
-            }
-
-            r = requests.put(url, headers=self.headers, json=payload)
+from github_database import GitHubJSON
+from shared_store import SharedStore
+from sharded_database import ShardedGitHubJSON
+from journal_database import JournaledGitHubJSON
+from revision_history import RevisionHistory
+from offline_queue import QUEUED, OfflineJSON
+from blob_store import BlobStore
+from local_database import LocalJSON, SQLiteJSON
+from record_merge import MergeConflict
+from http_session import get_session
+from change_poller import get_change_poller
+from invalidation_bus import InvalidationBus
+from rate_budget import get_rate_budget
+import text_sanitizer
+from text_sanitizer import sanitize_text
+from circuit_breaker import get_circuit_breaker
+from derived_fields import get_derived_fields
+import metrics
 
-            # SALVO COM SUCESSO
-            if r.status_code in (200, 201):
-                body = r.json()
-                new_sha = body["content"]["sha"]
-
-                # Atualiza cache
-                self._cache_data = new_data
-                self._cache_sha = new_sha
-                self._cache_time = time.time()
-                return True
+# ------------------------------------------------------------
+# 3. CONFIGURAÇÃO DE ACESSO (SECRETS)
+# ------------------------------------------------------------
+# Onde ficam os dados:
+#   "github"     -> repositório GitHub (padrão)
+#   "filesystem" -> arquivos JSON em LOCAL_DATA_DIR (on-prem / desenvolvimento)
+#   "sqlite"     -> banco SQLite em SQLITE_PATH (uma linha por registro)
+STORAGE_BACKEND = st.secrets.get("STORAGE_BACKEND", "github")
+LOCAL_DATA_DIR = st.secrets.get("LOCAL_DATA_DIR", "data")
+SQLITE_PATH = st.secrets.get("SQLITE_PATH", os.path.join(LOCAL_DATA_DIR, "faturamento.db"))
+
+if STORAGE_BACKEND == "github":
+    try:
+        GITHUB_TOKEN = st.secrets["GITHUB_TOKEN"]
+        REPO_OWNER = st.secrets["REPO_OWNER"]
+        REPO_NAME = st.secrets["REPO_NAME"]
+    except Exception:
+        st.error("⚠️ Configure os Secrets: GITHUB_TOKEN, REPO_OWNER e REPO_NAME.")
+        st.stop()
+elif STORAGE_BACKEND not in ("filesystem", "sqlite"):
+    st.error(f"⚠️ STORAGE_BACKEND inválido: {STORAGE_BACKEND!r} (use github, filesystem ou sqlite).")
+    st.stop()
 
-            # SHA inválido => arquivo mudou no GitHub => retry exponencial
-            if r.status_code == 409:
-                time.sleep((2 ** attempt) * 0.15 + random.random() * 0.2)
-                continue
+FILE_PATH = "dados.json"
+BRANCH = "main"
 
-            # Rate limit
-            if r.status_code == 403 and "rate" in r.text.lower():
-                time.sleep(2 + random.random())
-                continue
+# Cache compartilhado por TODAS as sessões/reruns deste processo
+CACHE_TTL = float(st.secrets.get("CACHE_TTL", 30))
+# Snapshot em disco: cold start serve a última cópia e revalida em background
+CACHE_DIR = st.secrets.get("CACHE_DIR", ".cache")
 
-            raise Exception(f"GitHub PUT error: {r.status_code} - {r.text}")
+# API do GitHub (GitHub Enterprise ou o github_stub.py local p/ testes)
+GITHUB_API_URL = st.secrets.get("GITHUB_API_URL", GitHubJSON.API_BASE)
 
-        raise TimeoutError("Falha ao salvar após múltiplas tentativas.")
+# Timeouts (s) de todas as chamadas ao GitHub — sessão keep-alive única
+HTTP_TIMEOUT = (
+    float(st.secrets.get("HTTP_CONNECT_TIMEOUT", 6)),
+    float(st.secrets.get("HTTP_READ_TIMEOUT", 30)),
+)
 
-    # =================================================
-    # UPDATE — Carregar, alterar e salvar com atomicidade
-    # =================================================
-    def update(self, update_fn):
-        for attempt in range(8):
-            data, _ = self.load(force=True)
-            new_data = update_fn(data)
+# Leitura com prazo: com uma cópia em mãos, a página espera o GitHub no
+# máximo READ_DEADLINE segundos (0 = sem prazo) e depois mostra a cópia com
+# aviso. BREAKER_FAILURES falhas seguidas abrem o disjuntor: por
+# BREAKER_RESET segundos nem se tenta o GitHub nas leituras.
+READ_DEADLINE = float(st.secrets.get("READ_DEADLINE", 2.5))
+BREAKER_FAILURES = int(st.secrets.get("BREAKER_FAILURES", 3))
+BREAKER_RESET = float(st.secrets.get("BREAKER_RESET", 30))
+
+# Métricas dos caminhos quentes (desligadas por padrão). METRICS_FILE grava
+# o texto Prometheus periodicamente ("{pid}" separa os workers).
+metrics.enable(bool(st.secrets.get("METRICS_ENABLED", False)))
+METRICS_FILE = st.secrets.get("METRICS_FILE", "")
+if metrics.is_enabled() and METRICS_FILE:
+    METRICS_FILE = metrics.start_exporter(METRICS_FILE)
+
+# Painel de métricas só p/ admin: abrir o app com ?admin=<ADMIN_KEY>
+ADMIN_KEY = st.secrets.get("ADMIN_KEY", "")
+
+# Rate limit: abaixo desta fração do limite, poller e revalidações de fundo
+# esperam o reset (o restante fica p/ leituras e saves dos usuários)
+get_rate_budget().reserve_ratio = float(st.secrets.get("RATE_RESERVE_RATIO", 0.2))
+
+@st.cache_resource
+def get_shared_store():
+    return SharedStore(ttl=CACHE_TTL)
+
+# Vários workers (processos) na mesma máquina/volume: o save de um avisa os
+# outros por esta pasta compartilhada ("" desliga)
+INVALIDATION_DIR = st.secrets.get("INVALIDATION_DIR", os.path.join(CACHE_DIR, "invalidation"))
+
+@st.cache_resource
+def get_invalidation_bus():
+    if not INVALIDATION_DIR:
+        return None
+    return InvalidationBus(INVALIDATION_DIR).subscribe(get_shared_store())
+
+# Layout no repositório:
+#   "monolithic" -> um JSON por base (dados.json / rotinas.json)
+#   "sharded"    -> um arquivo por registro (dados/, rotinas/), PUT por shard,
+#                   migrado automaticamente a partir do JSON monolítico
+#   "journal"    -> JSON monolítico como snapshot + diário de eventos
+#                   (dados.journal/), compactado periodicamente
+STORAGE_LAYOUT = st.secrets.get("STORAGE_LAYOUT", "monolithic")
+
+# Formato gravado: JSON canônico compacto; opcionalmente comprimido
+# ("gzip" ou "zstd"). A leitura reconhece qualquer um deles sozinha.
+STORAGE_COMPRESSION = st.secrets.get("STORAGE_COMPRESSION", "none")
+STORAGE_COMPRESSION = None if STORAGE_COMPRESSION in ("", "none") else STORAGE_COMPRESSION
+
+# Write-behind: gravações simultâneas viram um único commit por janela
+WRITE_BEHIND = bool(st.secrets.get("WRITE_BEHIND", False))
+WRITE_WINDOW = float(st.secrets.get("WRITE_WINDOW", 0.5))
+
+# Imagens (prints e imagens do Quill) ficam em blobs/<hash>, fora dos JSONs.
+# Nos backends locais as imagens continuam inline nos registros.
+blob_store = None
+if STORAGE_BACKEND == "github":
+    blob_store = BlobStore(
+        token=GITHUB_TOKEN,
+        owner=REPO_OWNER,
+        repo=REPO_NAME,
+        branch=BRANCH,
+        folder="blobs",
+        cache_dir=CACHE_DIR,
+        timeout=HTTP_TIMEOUT,
+        api_base=GITHUB_API_URL,
+    )
 
-            try:
-                self.save(new_data)
-                return True
-            except TimeoutError:
-                continue
-            except Exception:
-                time.sleep(0.2)
+# Fila local (write-ahead log): upsert/delete vão p/ o disco antes do GitHub
+# e são publicados em segundo plano se ele estiver fora/lento. O save espera
+# no máximo OFFLINE_SYNC_WAIT segundos; depois disso segue na fila.
+OFFLINE_QUEUE = bool(st.secrets.get("OFFLINE_QUEUE", True))
+OFFLINE_QUEUE_DIR = st.secrets.get("OFFLINE_QUEUE_DIR", os.path.join(CACHE_DIR, "wal"))
+OFFLINE_SYNC_WAIT = float(st.secrets.get("OFFLINE_SYNC_WAIT", 3))
+
+def make_db(file_path, derived=None):
+    if STORAGE_BACKEND == "filesystem":
+        return LocalJSON(LOCAL_DATA_DIR, path=file_path, compression=STORAGE_COMPRESSION, derived=derived)
+    if STORAGE_BACKEND == "sqlite":
+        return SQLiteJSON(SQLITE_PATH, path=file_path, derived=derived)
+
+    common = dict(
+        token=GITHUB_TOKEN,
+        owner=REPO_OWNER,
+        repo=REPO_NAME,
+        branch=BRANCH,
+        store=get_shared_store(),
+        cache_dir=CACHE_DIR,
+        blob_store=blob_store,
+        write_behind=WRITE_BEHIND,
+        write_window=WRITE_WINDOW,
+        timeout=HTTP_TIMEOUT,
+        api_base=GITHUB_API_URL,
+        compression=STORAGE_COMPRESSION,
+        bus=get_invalidation_bus(),
+        read_deadline=READ_DEADLINE,
+        breaker=get_circuit_breaker(GITHUB_API_URL, BREAKER_FAILURES, BREAKER_RESET),
+        derived=derived,
+    )
+    if STORAGE_LAYOUT == "sharded":
+        folder = os.path.splitext(file_path)[0]
+        remote = ShardedGitHubJSON(path=folder, legacy_path=file_path, **common)
+    elif STORAGE_LAYOUT == "journal":
+        remote = JournaledGitHubJSON(path=file_path, **common)
+    else:
+        remote = GitHubJSON(path=file_path, **common)
+    if OFFLINE_QUEUE:
+        return OfflineJSON(remote, OFFLINE_QUEUE_DIR, sync_wait=OFFLINE_SYNC_WAIT)
+    return remote
+
+# Derivados dos convênios (texto da consulta/PDF, linhas do PDF) calculados na
+# gravação e guardados num sidecar: no backend "filesystem" ao lado dos
+# dados, nos demais na pasta de cache.
+DERIVED_DIR = LOCAL_DATA_DIR if STORAGE_BACKEND == "filesystem" else os.path.join(CACHE_DIR, "derived")
+
+# Campos de origem dos derivados (só eles entram no hash do sidecar)
+CAMPOS_DERIVADOS = (
+    "nome", "empresa", "codigo", "sistema_utilizado", "prazo_retorno",
+    "site", "login", "senha", "envio", "validade", "xml", "versao_xml",
+    "nf", "fluxo_nf", "config_gerador", "doc_digitalizacao", "observacoes",
+)
+# Só estes saem sanitizados; os demais (login, senha, site, prazos...) ficam
+# como digitados — sanitize_text mexeria em URLs e credenciais
+CAMPOS_SANITIZADOS = ("nome", "config_gerador", "doc_digitalizacao", "observacoes")
+# Mudou o cálculo (ou o layout do PDF)? Incremente: o sidecar é refeito
+DERIVADOS_VERSAO = "2"
+
+# derivar_convenio é definida mais abaixo (só é chamada depois do import)
+derivados_conv = get_derived_fields(
+    os.path.join(DERIVED_DIR, f"{os.path.splitext(FILE_PATH)[0]}.derived.json"),
+    lambda rec: derivar_convenio(rec),
+    CAMPOS_DERIVADOS,
+    version=lambda: f"{DERIVADOS_VERSAO}|{text_sanitizer.current_corrections().version}",
+)
 
-        raise Exception("Falha ao atualizar após múltiplas tentativas.")
+db = make_db(FILE_PATH, derived=derivados_conv)
 
 # ------------------------------------------------------------
-# 3. CONFIGURAÇÃO DE ACESSO (SECRETS)
-# ------------------------------------------------------------
-try:
-    GITHUB_TOKEN = st.secrets["GITHUB_TOKEN"]
-    REPO_OWNER = st.secrets["REPO_OWNER"]
-    REPO_NAME = st.secrets["REPO_NAME"]
-except Exception:
-    st.error("⚠️ Configure os Secrets: GITHUB_TOKEN, REPO_OWNER e REPO_NAME.")
-    st.stop()
 
-FILE_PATH = "dados.json"
-BRANCH = "main"
+ROTINAS_FILE_PATH = "rotinas.json"
 
-db = GitHubJSON(
-    token=GITHUB_TOKEN,
-    owner=REPO_OWNER,
-    repo=REPO_NAME,
-    path=FILE_PATH,
-    branch=BRANCH
-)
+db_rotinas = make_db(ROTINAS_FILE_PATH)
 
 # ------------------------------------------------------------
 
-ROTINAS_FILE_PATH = "rotinas.json"
+# Tabela de correções de colagem do sanitize_text ({"id", "erro", "certo"}),
+# editável em "Visualizar Banco". Sem o arquivo, vale a tabela padrão.
+CORRECOES_FILE_PATH = "correcoes.json"
 
-db_rotinas = GitHubJSON(
-    token=GITHUB_TOKEN,
-    owner=REPO_OWNER,
-    repo=REPO_NAME,
-    path=ROTINAS_FILE_PATH,
-    branch=BRANCH
-)
+db_correcoes = make_db(CORRECOES_FILE_PATH)
+
+# Poller de mudanças: uma thread por processo vigia o HEAD da branch e avisa
+# as sessões abertas quando outra pessoa salva (0 desliga)
+POLL_INTERVAL = float(st.secrets.get("POLL_INTERVAL", 15))
+change_poller = None
+if STORAGE_BACKEND == "github" and POLL_INTERVAL > 0:
+    change_poller = get_change_poller(db, interval=POLL_INTERVAL)
+    change_poller.watch(db)
+    change_poller.watch(db_rotinas)
 
 # ------------------------------------------------------------
 # 4. CONSTANTES / PALETA
@@ -316,74 +354,20 @@ def clean_html(raw_html):
     cleanr = re.compile('<.*?>')
     return re.sub(cleanr, '', raw_html)
 
+# sanitize_text / fix_technical_spacing: text_sanitizer.py (regex
+# pré-compiladas, correções numa passada e cache LRU)
+
+def carregar_correcoes():
+    """Aplica o correcoes.json ao sanitize_text (recompila só se o SHA mudou)."""
+    try:
+        registros, sha = db_correcoes.load()
+    except Exception:
+        return   # GitHub fora: segue com a tabela já compilada
+    if sha is None:
+        text_sanitizer.set_corrections(text_sanitizer.CORRECOES_PADRAO, version="padrao")
+    else:
+        text_sanitizer.set_corrections(text_sanitizer.corrections_from_records(registros), version=sha)
 
-def fix_technical_spacing(txt: str) -> str:
-    if not txt:
-        return ""
-
-    urls = {}
-    def _url_replacer(match):
-        key = f"\u0000{len(urls)}\u0000"
-        urls[key] = match.group(0)
-        return key
-
-    # 1) Protege URLs para não inserir espaços no meio delas
-    txt = re.sub(r"https?://[^\s<>\"']+", _url_replacer, txt)
-
-    # 2) Espaço entre Números e Letras (ex: 90dias -> 90 dias)
-    txt = re.sub(r"(\d)([A-Za-zÁÉÍÓÚÂÊÔÃÕÀÇáéíóúâêôãõàç])", r"\1 \2", txt)
-    txt = re.sub(r"([A-Za-zÁÉÍÓÚÂÊÔÃÕÀÇáéíóúâêôãõàç])(\d)", r"\1 \2", txt)
-
-    # 3) Espaço após pontuação se estiver colado (ex: fechar.> -> fechar. >)
-    # Ignora pontos decimais em números
-    txt = re.sub(r"(?<!\d)\.(?=[^\s\d])", ". ", txt)
-    txt = re.sub(r":(?!\s)", ": ", txt)
-    txt = re.sub(r";(?!\s)", "; ", txt)
-
-    # 4) Espaços ao redor de operadores e delimitadores técnicos
-    txt = re.sub(r"\s*>\s*", " > ", txt)
-    txt = re.sub(r"\s*/\s*", " / ", txt)
-    
-    # 5) Correções específicas de colagem comuns em faturamento
-    correcoes = {
-        r"PELASMARTKIDS": "PELA SMARTKIDS",
-        r"serpediatria": "ser pediatria",
-        r"depacote": "de pacote",
-        r"diasútil": "dias útil",
-        r"às12:00": "às 12:00",
-        r"sófechar": "só fechar",
-        r"gera oXML": "gera o XML",
-        r"noSisAmil": "no SisAmil"
-    }
-    for erro, certo in correcoes.items():
-        txt = re.sub(erro, certo, txt, flags=re.IGNORECASE)
-
-    # 6) Bullets coladas (•Texto -> • Texto)
-    txt = re.sub(r"([•\-–—\*→])([^\s])", r"\1 \2", txt)
-
-    # 7) Restaura URLs
-    for k, v in urls.items():
-        txt = txt.replace(k, v)
-
-    return txt
-
-
-def sanitize_text(text: str) -> str:
-    if not text:
-        return ""
-    txt = str(text)
-    # Normalização e remoção de caracteres invisíveis que causam colagem
-    txt = unicodedata.normalize("NFKC", txt)
-    txt = re.sub(r"[\u00A0\u200B-\u200F\uFEFF]", " ", txt) 
-    
-    # Aplica correções de espaçamento
-    txt = fix_technical_spacing(txt)
-    
-    # Remove espaços duplos
-    txt = re.sub(r"[ \t]+", " ", txt)
-    return txt.strip()
-
-    
 def normalize(value):
     if not value: return ""
     return sanitize_text(value).strip().lower()
@@ -431,6 +415,7 @@ def _split_token_preserving_delims(token: str):
         segs.append(seg)
     return segs
 
+@metrics.timed("pdf.wrap_text")
 def wrap_text(text, pdf, max_width):
     if not text:
         return [""]
@@ -492,6 +477,7 @@ def _pdf_set_fonts(pdf: FPDF) -> str:
     return "Helvetica"
 
 
+@metrics.timed("pdf.build_wrapped_lines")
 def build_wrapped_lines(text, pdf, usable_w, line_h, bullet_indent=4.0):
     lines_out = []
     if not text: return []
@@ -522,6 +508,7 @@ def build_wrapped_lines(text, pdf, usable_w, line_h, bullet_indent=4.0):
 # ============================================================
 # 9. GERAÇÃO DO PDF — layout completo
 # ============================================================
+@metrics.timed("pdf.gerar_pdf")
 def gerar_pdf(dados):
     """
     Layout: título azul, Seção 1, Seção 2 (Tabela) e Observações Críticas.
@@ -540,15 +527,19 @@ def gerar_pdf(dados):
     FONT_FAMILY = _pdf_set_fonts(pdf)
     pdf.set_font(FONT_FAMILY, '', 10) 
     
-    line_h = 6.6
-    padding = 1.8
-    bullet_indent = 4.0
+    line_h = PDF_OBS_LINE_H
+    padding = PDF_OBS_PADDING
+    bullet_indent = PDF_OBS_BULLET_INDENT
     usable_w = CONTENT_W - 2 * padding
 
-    # 2. PROCESSAMENTO DO TEXTO RICO
-    obs_text_raw = safe_get(dados, "observacoes")
-    obs_text = clean_html(obs_text_raw) 
-    wrapped_lines = build_wrapped_lines(obs_text, pdf, usable_w, line_h, bullet_indent=bullet_indent)
+    # 2. PROCESSAMENTO DO TEXTO RICO (do sidecar se o layout é o mesmo)
+    derivado = derivados_conv.get(dados)
+    texto = derivado["texto"]
+    if derivado.get("pdf_layout") == _pdf_obs_layout(FONT_FAMILY, usable_w):
+        wrapped_lines = [(linha, recuo) for linha, recuo in derivado["pdf_obs"]]
+    else:
+        obs_text = clean_html(safe_get(dados, "observacoes"))
+        wrapped_lines = build_wrapped_lines(obs_text, pdf, usable_w, line_h, bullet_indent=bullet_indent)
 
     # ---------- HELPERS INTERNOS ----------
     def apply_font(size=10, bold=False):
@@ -573,7 +564,6 @@ def gerar_pdf(dados):
             label = label or ""
             value = value or ""
             apply_font(val_size, False) 
-            value = sanitize_text(value)
             lines = wrap_text(value, pdf, max(1, u_w))
             needed_h = max(1, len(lines)) * line_h_val
             if y + needed_h > pdf.page_break_trigger:
@@ -611,7 +601,7 @@ def gerar_pdf(dados):
             max_l = 1
             for i, val in enumerate(row_data):
                 content_w = max(1, widths[i] - 2*pad)
-                lines = wrap_text(sanitize_text(val or ""), pdf, content_w)
+                lines = wrap_text(val or "", pdf, content_w)
                 wrapped_cols.append(lines)
                 max_l = max(max_l, len(lines))
             row_h = max_l * cell_h + 2*pad
@@ -631,7 +621,7 @@ def gerar_pdf(dados):
             pdf.ln(row_h)
 
     # ---------- RENDERIZAÇÃO ----------
-    nome_conv = sanitize_text(safe_get(dados, "nome")).upper()
+    nome_conv = texto["nome"].upper()
     pdf.set_fill_color(*BLUE)
     pdf.set_text_color(255, 255, 255)
     apply_font(18, True)
@@ -640,14 +630,15 @@ def gerar_pdf(dados):
     pdf.ln(5)
 
     bar_title("1. Dados de Identificação e Acesso")
+    # Valores como digitados (derivados, sem sanitize_text)
     pares_unicos = [
-        ("Empresa",  safe_get(dados, "empresa")),
-        ("Código",   safe_get(dados, "codigo")),
-        ("Portal",   safe_get(dados, "site")),
-        ("Senha",    safe_get(dados, "senha")),
-        ("Login",    safe_get(dados, "login")),
-        ("Retorno",  safe_get(dados, "prazo_retorno")),
-        ("Sistema",  safe_get(dados, "sistema_utilizado")),
+        ("Empresa",  texto["empresa"]),
+        ("Código",   texto["codigo"]),
+        ("Portal",   texto["site"]),
+        ("Senha",    texto["senha"]),
+        ("Login",    texto["login"]),
+        ("Retorno",  texto["prazo_retorno"]),
+        ("Sistema",  texto["sistema_utilizado"]),
     ]
     one_column_info(pares_unicos)
 
@@ -657,9 +648,9 @@ def gerar_pdf(dados):
     widths = [w1, w2, w3, w4, w5]
     headers = ["Prazo Envio", "Validade Guia", "XML / Versão", "Nota Fiscal", "Fluxo NF"]
     
-    xml_flag = safe_get(dados, "xml") or "—"
-    xml_ver = safe_get(dados, "versao_xml") or "—"
-    row = [safe_get(dados, "envio"), safe_get(dados, "validade"), f"{xml_flag} / {xml_ver}", safe_get(dados, "nf"), safe_get(dados, "fluxo_nf")]
+    xml_flag = texto["xml"] or "—"
+    xml_ver = texto["versao_xml"] or "—"
+    row = [texto["envio"], texto["validade"], f"{xml_flag} / {xml_ver}", texto["nf"], texto["fluxo_nf"]]
     table(headers, [row], widths)
 
     bar_title("Observações Críticas")
@@ -694,6 +685,51 @@ def gerar_pdf(dados):
     return bytes(result)
 
 
+# ============================================================
+# 9.1 DERIVADOS — calculados na gravação (sidecar), lidos no PDF/consulta
+# ============================================================
+PDF_OBS_LINE_H = 6.6
+PDF_OBS_PADDING = 1.8
+PDF_OBS_BULLET_INDENT = 4.0
+PDF_OBS_FONT_SIZE = 10
+
+_pdf_medidor_lock = threading.Lock()
+_pdf_medidor = {}
+
+def _pdf_obs_layout(font_family, usable_w):
+    """Linhas quebradas só valem p/ a mesma fonte/largura."""
+    return f"{font_family}|{PDF_OBS_FONT_SIZE}|{usable_w:.2f}|{PDF_OBS_BULLET_INDENT}"
+
+def _pdf_medir():
+    """FPDF só p/ medir texto, com a mesma página/fonte do gerar_pdf."""
+    if "pdf" not in _pdf_medidor:
+        pdf = FPDF(orientation="P", unit="mm", format="A4")
+        pdf.set_margins(15, 12, 15)
+        family = _pdf_set_fonts(pdf)
+        pdf.set_font(family, "", PDF_OBS_FONT_SIZE)
+        usable_w = pdf.w - pdf.l_margin - pdf.r_margin - 2 * PDF_OBS_PADDING
+        _pdf_medidor["pdf"] = (pdf, family, usable_w)
+    return _pdf_medidor["pdf"]
+
+def derivar_convenio(rec):
+    """Texto das telas/PDF (sanitizado só em CAMPOS_SANITIZADOS) + linhas das Observações no PDF."""
+    texto = {
+        campo: sanitize_text(safe_get(rec, campo)) if campo in CAMPOS_SANITIZADOS else str(safe_get(rec, campo))
+        for campo in CAMPOS_DERIVADOS
+    }
+    # Pode rodar na thread da fila/write-behind: o FPDF de medição é único
+    with _pdf_medidor_lock:
+        pdf, family, usable_w = _pdf_medir()
+        linhas = build_wrapped_lines(
+            clean_html(safe_get(rec, "observacoes")), pdf, usable_w,
+            PDF_OBS_LINE_H, bullet_indent=PDF_OBS_BULLET_INDENT,
+        )
+    return {
+        "texto": texto,
+        "pdf_layout": _pdf_obs_layout(family, usable_w),
+        "pdf_obs": [[linha, recuo] for linha, recuo in linhas],
+    }
+
 # ============================================================
 # 10. UI COMPONENTS
 # ============================================================
@@ -735,9 +771,10 @@ def ui_info_line(label: str, value: str):
         unsafe_allow_html=True
     )
 
-def ui_block_info(title: str, content: str):
+def ui_block_info(title: str, content: str, sanitizado: bool = False):
     if not content:
         return
+    texto = content if sanitizado else sanitize_text(content)
     ui_card_start(title)
     st.markdown(
         f"""
@@ -748,7 +785,7 @@ def ui_block_info(title: str, content: str):
             border-radius:6px;
             font-size:15px;
             line-height:1.5;">
-            {sanitize_text(content).replace("\n", "<br>")}
+            {texto.replace("\n", "<br>")}
         </div>
         """,
         unsafe_allow_html=True,
@@ -783,11 +820,12 @@ def clean_html(raw_html):
 # ------------------------------------------------------------
 # MÓDULO DE CADASTRO COMPLETO (REINTEGRADO XML/NF)
 # ------------------------------------------------------------
+@metrics.timed("pagina.cadastro")
 def page_cadastro():
     from streamlit_quill import st_quill
     from streamlit_paste_button import paste_image_button
 
-    dados_atuais, _ = db.load(force=True)
+    dados_atuais, _ = db.load()
     dados_atuais = list(dados_atuais)
 
     ui_card_start("📝 Gestão de Convênios")
@@ -812,6 +850,11 @@ def page_cadastro():
 
     form_key = f"form_premium_{conv_id}" if conv_id else "form_premium_novo"
 
+    # Registro como estava ao abrir o formulário (detecta edição concorrente)
+    base_key = f"base_{form_key}"
+    if base_key not in st.session_state:
+        st.session_state[base_key] = dados_conv
+
     with st.form(key=form_key):
         # --- BLOCO 1: IDENTIFICAÇÃO ---
         st.markdown("##### 🏢 Identificação e Acesso")
@@ -865,7 +908,11 @@ def page_cadastro():
         # --- BLOCO 3: EDITOR RICO ---
         st.markdown("##### 🖋️ Observações Críticas")
         observacoes_html = st_quill(
-            value=safe_get(dados_conv, "observacoes"),
+            # Imagens salvas como referência voltam como data URI só p/ o editor
+            value=(
+                blob_store.inline_html(safe_get(dados_conv, "observacoes"))
+                if blob_store else safe_get(dados_conv, "observacoes")
+            ),
             placeholder="Digite as regras detalhadas de faturamento aqui...",
             key=f"quill_{conv_id}"
         )
@@ -878,12 +925,23 @@ def page_cadastro():
             st.info("Clique no botão abaixo e cole (Ctrl+V) o print.")
             pasted_img = paste_image_button(label="📋 Colar Imagem", key=f"paste_btn_{conv_id}")
         
-        img_b64_salva = safe_get(dados_conv, "print_b64")
-        
+        img_b64_salva = safe_get(dados_conv, "print_b64")   # legado (inline)
+        img_ref_salva = safe_get(dados_conv, "print_ref")   # blobs/<hash>
+
+        # Nova imagem vai como base64 e é extraída p/ o BlobStore no save
+        ref_para_salvar = ""
         if pasted_img.image_data is not None:
             with c_preview:
                 st.image(pasted_img.image_data, caption="Nova Imagem", use_container_width=True)
             img_para_salvar = image_to_base64(pasted_img.image_data)
+        elif img_ref_salva:
+            with c_preview:
+                try:
+                    st.image(blob_store.get(img_ref_salva), caption="Imagem Atual", use_container_width=True)
+                except Exception:
+                    st.warning("Não foi possível carregar a imagem atual.")
+            img_para_salvar = ""
+            ref_para_salvar = img_ref_salva
         elif img_b64_salva:
             with c_preview:
                 st.image(base64.b64decode(img_b64_salva), caption="Imagem Atual", use_container_width=True)
@@ -916,20 +974,43 @@ def page_cadastro():
                     "fluxo_nf": fluxo_nf,
                     "observacoes": observacoes_html,
                     "print_b64": img_para_salvar,
+                    "print_ref": ref_para_salvar,
                     # Mantém campos antigos se existirem no banco para não perder histórico
                     "config_gerador": safe_get(dados_conv, "config_gerador"),
                     "doc_digitalizacao": safe_get(dados_conv, "doc_digitalizacao")
                 }
 
-                if conv_id is None:
-                    dados_atuais.append(novo_reg)
-                else:
-                    for i, c in enumerate(dados_atuais):
-                        if str(c.get("id")) == str(conv_id):
-                            dados_atuais[i] = novo_reg
-                            break
-
-                if db.save(dados_atuais):
+                # Grava só este registro (insere ou substitui pelo id).
+                # Novo: create=True — id já criado por outra sessão não é sobrescrito
+                try:
+                    salvo = db.upsert(
+                        novo_reg, expected=st.session_state.get(base_key), create=not conv_id,
+                    )
+                except MergeConflict:
+                    st.session_state.pop(base_key, None)
+                    if conv_id:
+                        st.error(
+                            "⚠️ Este convênio foi alterado por outra pessoa enquanto você editava. "
+                            "Nada foi sobrescrito: confira a versão atual e salve novamente."
+                        )
+                    else:
+                        # Próximo rerun relê o banco e gera outro id
+                        db.invalidate()
+                        st.error(
+                            "⚠️ Outra pessoa cadastrou um convênio com o mesmo ID agora há pouco. "
+                            "Nada foi sobrescrito: clique em salvar novamente para usar um novo ID."
+                        )
+                    salvo = False
+                if salvo == QUEUED:
+                    st.session_state.pop(base_key, None)
+                    st.warning(
+                        "📤 GitHub indisponível: alteração salva localmente e será "
+                        "enviada automaticamente assim que ele responder."
+                    )
+                    time.sleep(1.5)
+                    st.rerun()
+                elif salvo:
+                    st.session_state.pop(base_key, None)
                     st.success("✔ Dados atualizados com sucesso!")
                     time.sleep(0.8)
                     st.rerun()
@@ -972,31 +1053,119 @@ def page_cadastro():
                 key=f"btn_del_conv_{conv_id_str}"
             ):
                 try:
-                    def _update(data):
-                        # remove o registro cujo id == conv_id_str
-                        return [c for c in (data or []) if str(c.get("id")) != conv_id_str]
-
-                    # Atualiza no GitHub de forma atômica (SHA locking)
-                    db.update(_update)
+                    # Remove o registro no GitHub de forma atômica (SHA locking)
+                    db.delete(conv_id_str)
 
                     st.success(f"✔ Convênio {conv_id_str} excluído com sucesso!")
 
                     # Limpa caches e estado da UI; recarrega a app
-                    db._cache_data = None
-                    db._cache_sha = None
-                    db._cache_time = 0.0
+                    db.invalidate()
                     st.session_state.clear()
                     time.sleep(1)
                     st.rerun()
 
                 except Exception as e:
                     st.error(f"Falha ao excluir convênio {conv_id_str}: {e}")   
+
+        if STORAGE_BACKEND == "github":
+            ui_historico_revisoes(dados_conv)
     
 
 
+# ------------------------------------------------------------
+# HISTÓRICO DE REVISÕES (commits do arquivo do registro)
+# ------------------------------------------------------------
+CAMPOS_HISTORICO = [
+    ("nome", "Nome"), ("codigo", "Código"), ("empresa", "Empresa"), ("site", "Site/Portal"),
+    ("login", "Login"), ("senha", "Senha"), ("sistema_utilizado", "Sistema"),
+    ("prazo_retorno", "Prazo Retorno"), ("envio", "Prazo Envio"), ("validade", "Validade"),
+    ("xml", "XML"), ("versao_xml", "Versão TISS"), ("nf", "NF"), ("fluxo_nf", "Fluxo NF"),
+    ("observacoes", "Observações Críticas"), ("print_ref", "Print"),
+]
+
+def ui_historico_revisoes(dados_conv):
+    conv_id = str(dados_conv.get("id"))
+    pages_key = f"hist_pages_{conv_id}"
+
+    with st.expander("🕘 Histórico de revisões", expanded=pages_key in st.session_state):
+        # Só consulta o GitHub quando pedido: 1 requisição por página
+        if pages_key not in st.session_state:
+            if st.button("Carregar histórico", key=f"hist_load_{conv_id}"):
+                st.session_state[pages_key] = 1
+                st.rerun()
+            return
+
+        history = RevisionHistory(db, cache_dir=CACHE_DIR)
+        commits, more = [], False
+        try:
+            for page in range(1, st.session_state[pages_key] + 1):
+                items, more = history.page(conv_id, page)
+                commits += items
+        except Exception as e:
+            st.error(f"Falha ao carregar o histórico: {e}")
+            return
+
+        if RevisionHistory.journaled(db):
+            st.caption("Layout de diário: só as alterações desde a última compactação.")
+        if not commits:
+            st.info("Nenhuma revisão encontrada para este convênio.")
+            return
+
+        rotulos = {
+            c["sha"]: f"{(c['date'] or '')[:16].replace('T', ' ')} — {c['message']} ({c['sha'][:7]})"
+            for c in commits
+        }
+        escolhido = st.selectbox(
+            "Revisão:", list(rotulos), format_func=rotulos.get, key=f"hist_sel_{conv_id}"
+        )
+        if more and st.button("Carregar mais", key=f"hist_more_{conv_id}"):
+            st.session_state[pages_key] += 1
+            st.rerun()
+
+        try:
+            antigo = history.record_at(conv_id, escolhido)
+        except Exception as e:
+            st.error(f"Falha ao ler a revisão: {e}")
+            return
+        if antigo is None:
+            st.caption("O convênio não existia nesta revisão.")
+            return
+
+        diffs = [
+            {
+                "Campo": rotulo,
+                "Nesta revisão": clean_html(safe_get(antigo, campo))[:300],
+                "Atual": clean_html(safe_get(dados_conv, campo))[:300],
+            }
+            for campo, rotulo in CAMPOS_HISTORICO
+            if safe_get(antigo, campo) != safe_get(dados_conv, campo)
+        ]
+        if not diffs:
+            st.caption("Igual à versão atual.")
+            return
+        st.dataframe(pd.DataFrame(diffs), use_container_width=True, hide_index=True)
+
+        if st.button("♻️ Restaurar esta revisão", key=f"hist_restore_{conv_id}"):
+            try:
+                history.restore(conv_id, antigo, expected=dados_conv, commit_sha=escolhido)
+            except MergeConflict:
+                st.error(
+                    "⚠️ Este convênio foi alterado por outra pessoa. "
+                    "Nada foi sobrescrito: confira a versão atual e tente de novo."
+                )
+                return
+            # Formulário volta a partir do registro restaurado
+            st.session_state.pop(f"base_form_premium_{conv_id}", None)
+            st.session_state.pop(f"quill_{conv_id}", None)
+            st.success("✔ Revisão restaurada!")
+            time.sleep(0.8)
+            st.rerun()
+
+
 # ============================================================
 # 12. PÁGINAS — CONSULTA & VISUALIZAR BANCO
 # ============================================================
+@metrics.timed("pagina.consulta")
 def page_consulta(dados_atuais):
     if not dados_atuais:
         st.info("Nenhum convênio cadastrado.")
@@ -1013,34 +1182,39 @@ def page_consulta(dados_atuais):
 
     ui_section_title(safe_get(dados, "nome"))
 
+    # Sidecar de derivados (recalcula se o registro mudou): as linhas passam
+    # por ui_text como antes, os blocos já vêm sanitizados
+    texto = derivados_conv.get(dados)["texto"]
+
     ui_card_start("🧾 Dados de Identificação")
-    ui_info_line("Empresa", safe_get(dados, "empresa"))
-    ui_info_line("Código", safe_get(dados, "codigo"))
-    ui_info_line("Sistema", safe_get(dados, "sistema_utilizado"))
-    ui_info_line("Prazo de Retorno", safe_get(dados, "prazo_retorno"))
+    ui_info_line("Empresa", texto["empresa"])
+    ui_info_line("Código", texto["codigo"])
+    ui_info_line("Sistema", texto["sistema_utilizado"])
+    ui_info_line("Prazo de Retorno", texto["prazo_retorno"])
     ui_card_end()
 
     ui_card_start("🔐 Acesso ao Portal")
-    ui_info_line("Portal", safe_get(dados, "site"))
-    ui_info_line("Login", safe_get(dados, "login"))
-    ui_info_line("Senha", safe_get(dados, "senha"))
+    ui_info_line("Portal", texto["site"])
+    ui_info_line("Login", texto["login"])
+    ui_info_line("Senha", texto["senha"])
     ui_card_end()
 
     ui_card_start("📦 Regras Técnicas")
-    ui_info_line("Prazo Envio", safe_get(dados, "envio"))
-    ui_info_line("Validade da Guia", safe_get(dados, "validade"))
-    ui_info_line("Envia XML?", safe_get(dados, "xml"))
-    ui_info_line("Versão XML", safe_get(dados, "versao_xml"))
-    ui_info_line("Exige NF?", safe_get(dados, "nf"))
-    ui_info_line("Fluxo da Nota", safe_get(dados, "fluxo_nf"))
+    ui_info_line("Prazo Envio", texto["envio"])
+    ui_info_line("Validade da Guia", texto["validade"])
+    ui_info_line("Envia XML?", texto["xml"])
+    ui_info_line("Versão XML", texto["versao_xml"])
+    ui_info_line("Exige NF?", texto["nf"])
+    ui_info_line("Fluxo da Nota", texto["fluxo_nf"])
     ui_card_end()
 
-    ui_block_info("⚙️ Configuração XML", safe_get(dados, "config_gerador"))
-    ui_block_info("🗂 Digitalização e Documentação", safe_get(dados, "doc_digitalizacao"))
-    ui_block_info("⚠️ Observações Críticas", safe_get(dados, "observacoes"))
+    ui_block_info("⚙️ Configuração XML", texto["config_gerador"], sanitizado=True)
+    ui_block_info("🗂 Digitalização e Documentação", texto["doc_digitalizacao"], sanitizado=True)
+    ui_block_info("⚠️ Observações Críticas", texto["observacoes"], sanitizado=True)
 
     st.caption("Manual de Faturamento — Visualização Premium")
 
+@metrics.timed("pagina.visualizar_banco")
 def page_visualizar_banco(dados_atuais):
     ui_card_start("📋 Banco de Dados Completo")
     if dados_atuais:
@@ -1050,6 +1224,57 @@ def page_visualizar_banco(dados_atuais):
         st.info("⚠️ Banco vazio.")
     ui_card_end()
 
+    ui_correcoes()
+
+
+def ui_correcoes():
+    """Editor da tabela de correções (correcoes.json no repositório)."""
+    ui_card_start("🔤 Correções de Texto")
+    st.caption(
+        "Trechos colados corrigidos automaticamente nas telas e nos PDFs "
+        "(sem diferenciar maiúsculas/minúsculas)."
+    )
+    registros, sha = db_correcoes.load()
+    if sha is None:
+        linhas = [{"erro": e, "certo": c} for e, c in text_sanitizer.CORRECOES_PADRAO.items()]
+    else:
+        linhas = [
+            {"erro": r.get("erro", ""), "certo": r.get("certo", "")}
+            for r in registros if isinstance(r, dict)
+        ]
+
+    editado = st.data_editor(
+        pd.DataFrame(linhas, columns=["erro", "certo"]),
+        num_rows="dynamic",
+        use_container_width=True,
+        key="editor_correcoes",
+    )
+
+    if st.button("💾 Salvar correções", key="salvar_correcoes"):
+        novos = {}
+        for row in editado.to_dict("records"):
+            erro = "" if pd.isna(row.get("erro")) else str(row.get("erro")).strip()
+            if not erro:
+                continue
+            certo = "" if pd.isna(row.get("certo")) else str(row.get("certo"))
+            novos[erro.lower()] = {"id": erro.lower(), "erro": erro, "certo": certo}
+        try:
+            db_correcoes.save(
+                list(novos.values()),
+                base=(registros, sha),
+                commit_message="Atualiza correções de texto — GABMA",
+            )
+        except MergeConflict:
+            st.error(
+                "⚠️ As correções foram alteradas por outra pessoa. "
+                "Nada foi sobrescrito: confira a versão atual e salve novamente."
+            )
+        else:
+            st.success(f"✔ {len(novos)} correções salvas!")
+            time.sleep(0.8)
+            st.rerun()
+    ui_card_end()
+
 
 # >>>>>>>>>>>>> INSTÂNCIA DO MÓDULO DE ROTINAS <<<<<<<<<<<<
 rotinas_module = RotinasModule(
@@ -1060,18 +1285,133 @@ rotinas_module = RotinasModule(
     generate_id=generate_id,
     safe_get=safe_get,
     primary_color=PRIMARY_COLOR,
-    setores_opcoes=SETORES_ROTINA,  
+    setores_opcoes=SETORES_ROTINA,
+    blob_store=blob_store,
 )
 
 # ============================================================
 # 13. MAIN — set_page_config vem ANTES de qualquer render
 # ============================================================
+# ------------------------------------------------------------
+# AVISO DE ALTERAÇÕES (poller)
+# ------------------------------------------------------------
+# st.fragment (>= 1.37) ou experimental_fragment: só o aviso reroda no
+# intervalo, a página continua como está até o usuário pedir
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+
+# ------------------------------------------------------------
+# FILA OFFLINE (alterações ainda não enviadas ao GitHub)
+# ------------------------------------------------------------
+def ui_fila_offline():
+    filas = [(nome, base) for nome, base in (("Convênios", db), ("Rotinas", db_rotinas))
+             if isinstance(base, OfflineJSON)]
+    for nome, base in filas:
+        stats = base.queue.snapshot_stats()
+        if stats["pending"]:
+            st.sidebar.warning(f"📤 {nome}: {stats['pending']} alteração(ões) aguardando envio ao GitHub.")
+            if stats["last_error"]:
+                st.sidebar.caption(f"Última falha: {stats['last_error'][:120]}")
+            with st.sidebar.expander(f"📤 {nome}: pendentes"):
+                for item in base.queue.pending():
+                    rec = item.get("record") or {}
+                    st.markdown(f"**{item.get('op')}** — {rec.get('id', item.get('id'))} {safe_get(rec, 'nome')}")
+                    if st.button("Descartar", key=f"wal_drop_{item['name']}"):
+                        if not base.queue.discard_pending(item["name"]):
+                            st.warning("Envio em andamento: tente de novo em instantes.")
+                        else:
+                            st.rerun()
+        recusadas = base.queue.conflicts() if stats["parked"] else []
+        if recusadas:
+            with st.sidebar.expander(f"⚠️ {nome}: {len(recusadas)} alteração(ões) recusada(s)"):
+                st.caption("Conflito com outra pessoa ou erro que não se resolve sozinho (ex.: credencial).")
+                for item in recusadas:
+                    rec = item.get("record") or {}
+                    st.markdown(f"**{item.get('op')}** — {rec.get('id', item.get('id'))} {safe_get(rec, 'nome')}")
+                    st.caption(item.get("error", ""))
+                    if st.button("Descartar", key=f"wal_discard_{item['name']}"):
+                        base.queue.discard_conflict(item["name"])
+                        st.rerun()
+
+# ------------------------------------------------------------
+# PAINEL DE MÉTRICAS (admin)
+# ------------------------------------------------------------
+def is_admin():
+    return bool(ADMIN_KEY) and st.query_params.get("admin") == ADMIN_KEY
+
+def painel_metricas():
+    with st.sidebar.expander("⏱️ Métricas (admin)", expanded=False):
+        if not metrics.is_enabled():
+            st.caption("Desligadas — use METRICS_ENABLED = true nos secrets.")
+            return
+        rows, counters = metrics.snapshot()
+        if rows:
+            df = pd.DataFrame(rows).set_index("operacao").round(2)
+            st.dataframe(df, use_container_width=True)
+        else:
+            st.caption("Nenhuma chamada medida ainda.")
+        if counters:
+            st.json(counters)
+        if METRICS_FILE:
+            st.caption(f"Exportando p/ {METRICS_FILE}")
+        st.download_button(
+            "Baixar (Prometheus)",
+            data=metrics.to_prometheus(),
+            file_name="metrics.prom",
+            mime="text/plain",
+        )
+        if st.button("Zerar métricas"):
+            metrics.reset()
+            st.rerun()
+
+def aviso_alteracoes():
+    if change_poller is None:
+        return
+    vistas = st.session_state.get("poll_versions_seen", {})
+    mudou = [
+        k for k, v in change_poller.versions().items()
+        if v != vistas.get(k, v)
+    ]
+    if not mudou:
+        return
+    nomes = ", ".join(sorted(k.rsplit(":", 1)[-1] for k in mudou))
+    st.info(f"🔔 Outra pessoa salvou alterações ({nomes}). Atualize para ver a versão mais recente.")
+    if st.button("Atualizar agora", key="poll_refresh"):
+        st.rerun()
+
+if _fragment is not None and change_poller is not None:
+    aviso_alteracoes = _fragment(run_every=POLL_INTERVAL)(aviso_alteracoes)
+
+MOTIVOS_DADOS_ANTIGOS = {
+    "deadline": "o GitHub está lento",
+    "circuit_open": "o GitHub está fora do ar",
+    "error": "a leitura no GitHub falhou",
+}
+
+def aviso_dados_antigos(banco):
+    """Aviso quando o último load() serviu a cópia anterior (leitura com prazo)."""
+    motivo = getattr(banco, "stale", None)
+    if not motivo:
+        return
+    lido = getattr(banco, "stale_fetched_at", None)
+    quando = f" de {time.strftime('%H:%M:%S', time.localtime(lido))}" if lido else ""
+    st.warning(
+        f"⏳ Exibindo dados{quando}: {MOTIVOS_DADOS_ANTIGOS.get(motivo, motivo)}. "
+        "A atualização segue em segundo plano e aparece na próxima interação."
+    )
+
 def main():
     st.set_page_config(page_title="💼 Manual de Faturamento", layout="wide")
     # Aplica CSS e header somente após set_page_config
     st.markdown(CSS_GLOBAL, unsafe_allow_html=True)
 
     dados_atuais, _ = db.load()
+    aviso_dados_antigos(db)
+    carregar_correcoes()
+
+    if change_poller is not None:
+        # Rerun completo: a página exibe os dados atuais -> versões vistas
+        st.session_state["poll_versions_seen"] = change_poller.versions()
+        aviso_alteracoes()
 
     st.sidebar.title("📚 Navegação")
     
@@ -1080,10 +1420,39 @@ def main():
         ["Cadastrar / Editar", "Consulta de Convênios", "Visualizar Banco", "Rotinas do Setor"]
     )
 
+    ui_fila_offline()
+
     st.sidebar.markdown("---")
     st.sidebar.markdown("### 🔄 Atualizar Sistema")
     if st.sidebar.button("Recarregar"):
+        db.invalidate()
+        db_rotinas.invalidate()
+        db_correcoes.invalidate()
         st.rerun()
+
+    with st.sidebar.expander("🔧 Diagnóstico", expanded=False):
+        st.caption("Cache (convênios)")
+        st.json(db.cache_stats())
+        st.caption("Sanitização de texto (cache LRU)")
+        st.json(text_sanitizer.cache_info()._asdict())
+        st.caption("Derivados dos convênios (sidecar)")
+        st.json(derivados_conv.snapshot_stats())
+        if STORAGE_BACKEND == "github":
+            st.caption("HTTP — conexões keep-alive e latência")
+            st.json(get_session().latency_summary())
+            st.caption("Rate limit do GitHub — orçamento e adiamentos")
+            st.json(get_rate_budget().snapshot())
+            st.caption("Disjuntor das leituras do GitHub")
+            st.json(db.breaker.snapshot())
+        if STORAGE_BACKEND == "github" and get_invalidation_bus() is not None:
+            st.caption("Invalidação entre workers")
+            st.json(get_invalidation_bus().snapshot_stats())
+        if change_poller is not None:
+            st.caption("Poller de alterações (HEAD da branch)")
+            st.json(change_poller.snapshot_stats())
+
+    if is_admin():
+        painel_metricas()
     
     if menu == "Cadastrar / Editar":
         page_cadastro()
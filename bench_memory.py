@@ -0,0 +1,156 @@
+# bench_memory.py — Pico de memória (tracemalloc) de um load e de um save
+# Compara o caminho antigo (r.json + b64decode + decode + loads /
+# dumps + b64encode + json=payload) com o caminho em streaming atual.
+#
+#   python bench_memory.py                    # usa rotinas.json do repositório
+#   python bench_memory.py --file dados.json
+#
+# O github_stub roda em OUTRO processo: o tracemalloc mede só o cliente.
+
+import argparse
+import base64
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import requests
+
+from github_database import GitHubJSON
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_stub(repo_path, local_file):
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "github_stub.py"), "--port", str(port),
+         "--seed-file", f"{repo_path}={local_file}"],
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(f"{url}/repos/o/r/contents/{repo_path}", timeout=1)
+            return proc, url
+        except requests.ConnectionError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError("github_stub não subiu")
+
+
+def measure(fn, setup=None):
+    args = setup() if setup else ()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak - base, elapsed
+
+
+# ============================================================
+# CAMINHO ANTIGO (reproduzido p/ comparação)
+# ============================================================
+def legacy_load(session, url, path):
+    r = session.get(f"{url}/repos/o/r/contents/{path}", params={"ref": "main"})
+    body = r.json()
+    decoded = base64.b64decode(body.get("content") or "").decode("utf-8")
+    return json.loads(decoded)
+
+
+def legacy_sha(session, url, path):
+    r = session.get(f"{url}/repos/o/r/contents/{path}", params={"ref": "main"})
+    return (r.json()["sha"],)
+
+
+def legacy_save(session, url, path, data, sha):
+    raw = json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+    payload = {
+        "message": "bench",
+        "content": base64.b64encode(raw).decode("utf-8"),
+        "sha": sha,
+        "branch": "main",
+    }
+    r = session.put(f"{url}/repos/o/r/contents/{path}", json=payload)
+    r.raise_for_status()
+    return True
+
+
+# ============================================================
+# CAMINHO ATUAL (GitHubJSON)
+# ============================================================
+def streaming_load(url, path):
+    db = GitHubJSON("bench", "o", "r", path=path, api_base=url)
+    return db.load(force=True)[0]
+
+
+def streaming_db(url, path):
+    db = GitHubJSON("bench", "o", "r", path=path, api_base=url)
+    db.load(force=True)
+    return (db,)
+
+
+def streaming_save(db, data):
+    return db.save(data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pico de memória de load/save (tracemalloc).")
+    parser.add_argument("--file", default=os.path.join(HERE, "rotinas.json"))
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with open(args.file, "rb") as f:
+        payload_bytes = len(f.read())
+    repo_path = os.path.basename(args.file)
+    if payload_bytes > 1024 * 1024:
+        print("Arquivo > 1 MB usa o caminho de blobs (já em streaming); escolha um menor.")
+        return 2
+
+    proc, url = _start_stub(repo_path, args.file)
+    try:
+        session = requests.Session()
+        data = legacy_load(session, url, repo_path)
+
+        rows = []
+        # O GET do SHA (save) fica fora da medição: só o PUT é comparado
+        for name, fn, setup in [
+            ("load  antigo", lambda: legacy_load(session, url, repo_path), None),
+            ("load  stream", lambda: streaming_load(url, repo_path), None),
+            ("save  antigo", lambda sha: legacy_save(session, url, repo_path, data, sha),
+             lambda: legacy_sha(session, url, repo_path)),
+            ("save  stream", lambda db: streaming_save(db, data),
+             lambda: streaming_db(url, repo_path)),
+        ]:
+            peaks, times = [], []
+            for _ in range(args.rounds):
+                _, peak, elapsed = measure(fn, setup)
+                peaks.append(peak)
+                times.append(elapsed)
+            rows.append((name, min(peaks), min(times)))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    print(f"arquivo: {args.file} ({payload_bytes / 1024:.0f} KB)")
+    print(f"{'caminho':<14}{'pico (KB)':>12}{'x arquivo':>11}{'tempo (ms)':>12}")
+    for name, peak, elapsed in rows:
+        print(f"{name:<14}{peak / 1024:>12.0f}{peak / payload_bytes:>11.2f}{elapsed * 1000:>12.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
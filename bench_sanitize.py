@@ -0,0 +1,147 @@
+# bench_sanitize.py — sanitize_text antigo x pré-compilado x com cache LRU
+# Corpus: o campo "observacoes" de dados.json (o mais longo e o mais sanitizado)
+#
+#   python bench_sanitize.py
+#   python bench_sanitize.py --file dados.json --field observacoes --reruns 50
+#   python bench_sanitize.py --correcoes 500   # tabela com 500 entradas sintéticas
+#
+# "reruns" simula a página sendo reexecutada: os mesmos textos sanitizados
+# de novo a cada passada. Sai com 1 se alguma saída divergir do antigo.
+
+import argparse
+import json
+import os
+import random
+import re
+import string
+import sys
+import time
+import unicodedata
+
+import text_sanitizer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+# ============================================================
+# CAMINHO ANTIGO (como era no app.py) — referência
+# ============================================================
+def legacy_fix_technical_spacing(txt, correcoes=None):
+    if not txt:
+        return ""
+    urls = {}
+    def _url_replacer(match):
+        key = f"\u0000{len(urls)}\u0000"
+        urls[key] = match.group(0)
+        return key
+    txt = re.sub(r"https?://[^\s<>\"']+", _url_replacer, txt)
+    txt = re.sub(r"(\d)([A-Za-zÁÉÍÓÚÂÊÔÃÕÀÇáéíóúâêôãõàç])", r"\1 \2", txt)
+    txt = re.sub(r"([A-Za-zÁÉÍÓÚÂÊÔÃÕÀÇáéíóúâêôãõàç])(\d)", r"\1 \2", txt)
+    txt = re.sub(r"(?<!\d)\.(?=[^\s\d])", ". ", txt)
+    txt = re.sub(r":(?!\s)", ": ", txt)
+    txt = re.sub(r";(?!\s)", "; ", txt)
+    txt = re.sub(r"\s*>\s*", " > ", txt)
+    txt = re.sub(r"\s*/\s*", " / ", txt)
+    for erro, certo in (correcoes or text_sanitizer.CORRECOES_PADRAO).items():
+        txt = re.sub(erro, certo, txt, flags=re.IGNORECASE)
+    txt = re.sub(r"([•\-–—\*→])([^\s])", r"\1 \2", txt)
+    for k, v in urls.items():
+        txt = txt.replace(k, v)
+    return txt
+
+
+def legacy_sanitize_text(text, correcoes=None):
+    if not text:
+        return ""
+    txt = unicodedata.normalize("NFKC", str(text))
+    txt = re.sub(r"[\u00A0\u200B-\u200F\uFEFF]", " ", txt)
+    txt = legacy_fix_technical_spacing(txt, correcoes)
+    txt = re.sub(r"[ \t]+", " ", txt)
+    return txt.strip()
+
+
+# ============================================================
+# MEDIÇÃO
+# ============================================================
+def load_corpus(path, field):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [str(r.get(field)) for r in data if isinstance(r, dict) and r.get(field)]
+
+
+def synthetic_corrections(n, seed=1):
+    """Tabela padrão + n entradas aleatórias (palavras coladas, como as reais)."""
+    rng = random.Random(seed)
+    table = dict(text_sanitizer.CORRECOES_PADRAO)
+    while len(table) < len(text_sanitizer.CORRECOES_PADRAO) + n:
+        a = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 6)))
+        b = "".join(rng.choices(string.ascii_uppercase, k=rng.randint(3, 8)))
+        table[a + b] = f"{a} {b}"
+    return table
+
+
+def measure(fn, corpus, reruns):
+    started = time.perf_counter()
+    for _ in range(reruns):
+        for text in corpus:
+            fn(text)
+    elapsed = time.perf_counter() - started
+    return elapsed / (reruns * len(corpus)) * 1e6   # µs por chamada
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmark do sanitize_text.")
+    parser.add_argument("--file", default=os.path.join(HERE, "dados.json"))
+    parser.add_argument("--field", default="observacoes")
+    parser.add_argument("--reruns", type=int, default=200)
+    parser.add_argument("--correcoes", type=int, default=0,
+                        help="mede também com N correções sintéticas a mais")
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.file, args.field)
+    if not corpus:
+        print(f"Nenhum texto em '{args.field}' de {args.file}.")
+        return 1
+
+    divergentes = [t for t in corpus if legacy_sanitize_text(t) != text_sanitizer.sanitize_text(t)]
+
+    # Aquece os caches (re interno / LRU) antes de medir
+    for text in corpus:
+        legacy_sanitize_text(text)
+    legacy = measure(legacy_sanitize_text, corpus, args.reruns)
+    compiled = measure(text_sanitizer._sanitize, corpus, args.reruns)
+    text_sanitizer.cache_clear()
+    cold = measure(text_sanitizer.sanitize_text, corpus, 1)
+    warm = measure(text_sanitizer.sanitize_text, corpus, args.reruns)
+
+    chars = sum(len(t) for t in corpus)
+    rows = [
+        ("corpus", f"{len(corpus)} textos, {chars} caracteres ({args.field})"),
+        ("antigo", f"{legacy:9.1f} µs/chamada"),
+        ("pré-compilado", f"{compiled:9.1f} µs/chamada  ({legacy / compiled:.1f}x)"),
+        ("LRU 1ª passada", f"{cold:9.1f} µs/chamada"),
+        ("LRU reruns", f"{warm:9.1f} µs/chamada  ({legacy / warm:.0f}x)"),
+        ("cache", str(text_sanitizer.cache_info())),
+        ("saídas divergentes", len(divergentes)),
+    ]
+    if args.correcoes:
+        table = synthetic_corrections(args.correcoes)
+        compiled_big = text_sanitizer.CompiledCorrections(table)
+        reruns = max(1, args.reruns // 10)
+        legacy_big = measure(lambda t: legacy_sanitize_text(t, table), corpus, reruns)
+        big = measure(lambda t: text_sanitizer._sanitize(t, compiled_big), corpus, args.reruns)
+        divergentes += [t for t in corpus
+                        if legacy_sanitize_text(t, table) != text_sanitizer._sanitize(t, compiled_big)]
+        rows[-1:-1] = [
+            (f"antigo, {len(table)} correções", f"{legacy_big:9.1f} µs/chamada"),
+            (f"pré-compilado, {len(table)} correções", f"{big:9.1f} µs/chamada  ({legacy_big / big:.1f}x)"),
+        ]
+        rows[-1] = ("saídas divergentes", len(divergentes))
+    width = max(len(k) for k, _ in rows)
+    for k, v in rows:
+        print(f"{k.ljust(width)}  {v}")
+    return 1 if divergentes else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+# bench_storage.py — Carga concorrente no GitHubJSON contra o github_stub local
+# N escritores + M leitores | p50/p99 | tentativas por escrita | lost updates
+# Roda offline (CI):  python bench_storage.py --writers 8 --ops 10
+#
+# Cada escritor grava registros próprios (id "w<escritor>-<n>"); no fim, todo
+# id gravado com sucesso precisa estar no arquivo final — o que faltar é
+# lost update. Tentativas por escrita = PUTs/commits recebidos pelo stub
+# divididos pelas escritas concluídas.
+
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+
+from github_database import GitHubJSON
+from github_stub import GitHubStub
+from sharded_database import ShardedGitHubJSON
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def make_db(args, stub):
+    common = dict(token="bench", owner="bench", repo="bench", branch="main",
+                  api_base=stub.url, write_behind=args.write_behind,
+                  write_window=args.write_window)
+    if args.layout == "sharded":
+        return ShardedGitHubJSON(path="dados", **common)
+    return GitHubJSON(path="dados.json", **common)
+
+
+def writer(args, stub, wid, results):
+    db = make_db(args, stub)
+    for n in range(args.ops):
+        rid = f"w{wid}-{n}"
+        record = {"id": rid, "nome": f"Registro {rid}", "payload": "x" * args.record_bytes}
+        started = time.perf_counter()
+        try:
+            if args.mode == "save":
+                data, sha = db.load(force=True)
+                db.save(list(data) + [record], base=(data, sha))
+            elif args.mode == "update":
+                db.update(lambda data, record=record: data + [record])
+            else:
+                db.upsert(record)
+        except Exception as e:
+            results["errors"].append(f"{rid}: {e}")
+            continue
+        results["write_ms"].append((time.perf_counter() - started) * 1000.0)
+        results["written"].append(rid)
+        if args.think:
+            time.sleep(args.think)
+
+
+def reader(args, stub, stop, results):
+    db = make_db(args, stub)
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            db.load(force=True)
+        except Exception as e:
+            results["errors"].append(f"read: {e}")
+            continue
+        results["read_ms"].append((time.perf_counter() - started) * 1000.0)
+
+
+def run(args):
+    stub = GitHubStub(
+        latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit,
+        rate_window=args.rate_window, error_rate=args.error_rate, seed=args.seed,
+    ).start()
+    try:
+        seed = [{"id": f"seed-{i}", "nome": f"Seed {i}", "payload": "x" * args.record_bytes}
+                for i in range(args.seed_records)]
+        make_db(args, stub).save(seed)
+        stub.reset_counters()
+
+        results = {"write_ms": [], "read_ms": [], "written": [], "errors": []}
+        stop = threading.Event()
+        readers = [threading.Thread(target=reader, args=(args, stub, stop, results))
+                   for _ in range(args.readers)]
+        writers = [threading.Thread(target=writer, args=(args, stub, w, results))
+                   for w in range(args.writers)]
+
+        started = time.perf_counter()
+        for t in readers + writers:
+            t.start()
+        for t in writers:
+            t.join()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        for t in readers:
+            t.join()
+
+        final, _ = make_db(args, stub).load(force=True)
+        final_ids = {str(r.get("id")) for r in final}
+        lost = [rid for rid in results["written"] if rid not in final_ids]
+        missing_seed = [r["id"] for r in seed if r["id"] not in final_ids]
+
+        c = dict(stub.counters)
+        # 1 PUT na contents API por tentativa (save() do sharded usa a Git Data API)
+        attempts = c["put"] or None
+        writes = len(results["written"])
+        report = {
+            "config": {k: v for k, v in vars(args).items() if k != "json"},
+            "writes": writes,
+            "write_errors": len(results["errors"]),
+            "lost_updates": len(lost) + len(missing_seed),
+            "throughput_wps": writes / elapsed if elapsed else 0.0,
+            "elapsed_s": elapsed,
+            "write_p50_ms": percentile(results["write_ms"], 50),
+            "write_p99_ms": percentile(results["write_ms"], 99),
+            "write_mean_ms": statistics.fmean(results["write_ms"]) if results["write_ms"] else 0.0,
+            "reads": len(results["read_ms"]),
+            "read_p50_ms": percentile(results["read_ms"], 50),
+            "read_p99_ms": percentile(results["read_ms"], 99),
+            "conflicts": c["conflicts"],
+            "conflicts_per_write": c["conflicts"] / writes if writes else 0.0,
+            "put_attempts_per_write": (attempts / writes) if (attempts is not None and writes) else None,
+            "rate_limited": c["rate_limited"],
+            "injected_errors": c["injected_errors"],
+            "server_requests": c["requests"],
+            "errors_sample": results["errors"][:5],
+        }
+        return report
+    finally:
+        stub.stop()
+
+
+def print_report(report):
+    rows = [
+        ("escritas", f"{report['writes']} ({report['write_errors']} erros)"),
+        ("lost updates", report["lost_updates"]),
+        ("vazão", f"{report['throughput_wps']:.1f} escritas/s em {report['elapsed_s']:.2f}s"),
+        ("escrita p50/p99", f"{report['write_p50_ms']:.1f} / {report['write_p99_ms']:.1f} ms"),
+        ("leitura p50/p99", f"{report['read_p50_ms']:.1f} / {report['read_p99_ms']:.1f} ms ({report['reads']} leituras)"),
+        ("conflitos/escrita", f"{report['conflicts_per_write']:.2f} ({report['conflicts']} no total)"),
+        ("PUTs/escrita", "-" if report["put_attempts_per_write"] is None
+         else f"{report['put_attempts_per_write']:.2f}"),
+        ("rate limit (403)", report["rate_limited"]),
+        ("falhas 5xx injetadas", report["injected_errors"]),
+        ("requisições no stub", report["server_requests"]),
+    ]
+    width = max(len(k) for k, _ in rows)
+    for k, v in rows:
+        print(f"{k.ljust(width)}  {v}")
+    for err in report["errors_sample"]:
+        print(f"  ! {err}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de save/update sob contenção (offline).")
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--ops", type=int, default=10, help="escritas por escritor")
+    parser.add_argument("--mode", choices=("save", "update", "upsert"), default="upsert")
+    parser.add_argument("--layout", choices=("monolithic", "sharded"), default="monolithic")
+    parser.add_argument("--write-behind", action="store_true")
+    parser.add_argument("--write-window", type=float, default=0.2)
+    parser.add_argument("--seed-records", type=int, default=50)
+    parser.add_argument("--record-bytes", type=int, default=200)
+    parser.add_argument("--think", type=float, default=0.0, help="pausa (s) entre escritas")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--rate-limit", type=int, default=0)
+    parser.add_argument("--rate-window", type=float, default=60.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="imprime o relatório em JSON")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    # CI: perda de escrita ou escrita que falhou é falha
+    return 1 if report["lost_updates"] or report["write_errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+# blob_store.py — Imagens fora dos JSONs (armazenamento endereçado por conteúdo)
+# Nome = SHA-256 do arquivo | Upload uma única vez | Deduplicação | Leitura lazy
+#
+#   blobs/<2 primeiros hex>/<sha256>.<ext>
+#
+# No JSON fica só a referência "sha256:<hex>.<ext>":
+#   - campo print_b64 (print colado)       -> print_ref
+#   - <img src="data:image/...;base64,..."> -> <img src="sha256:<hex>.<ext>">
+# As imagens só são baixadas quando uma página realmente as exibe.
+
+import base64
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from github_database import GitHubJSON, LARGE_FILE_BYTES, atomic_write_bytes
+
+REF_RE = re.compile(r"^sha256:([0-9a-f]{64})\.([a-z0-9]+)$")
+
+# <img ... src="data:image/png;base64,...." ...>
+_DATA_URI_SRC_RE = re.compile(
+    r"""src=(["'])data:(image/[A-Za-z0-9.+-]+);base64,([A-Za-z0-9+/=\s]+)\1"""
+)
+# <img ... src="sha256:<hex>.<ext>" ...>
+_REF_SRC_RE = re.compile(r"""src=(["'])(sha256:[0-9a-f]{64}\.[a-z0-9]+)\1""")
+
+_MIME_TO_EXT = {
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/jpg": "jpg",
+    "image/gif": "gif",
+    "image/webp": "webp",
+    "image/svg+xml": "svg",
+}
+_EXT_TO_MIME = {"png": "image/png", "jpg": "image/jpeg", "gif": "image/gif",
+                "webp": "image/webp", "svg": "image/svg+xml"}
+
+# Bytes já baixados (imutáveis pelo hash) — compartilhado no processo
+_MEM_CACHE = OrderedDict()
+_MEM_CACHE_MAX_BYTES = 64 * 1024 * 1024
+_MEM_CACHE_LOCK = threading.Lock()
+_mem_cache_bytes = 0
+
+# Hashes que sabidamente já existem no repositório (evita reenviar)
+_KNOWN_REMOTE = set()
+
+
+def _mem_put(digest, raw):
+    global _mem_cache_bytes
+    with _MEM_CACHE_LOCK:
+        if digest in _MEM_CACHE:
+            _MEM_CACHE.move_to_end(digest)
+            return
+        _MEM_CACHE[digest] = raw
+        _mem_cache_bytes += len(raw)
+        while _mem_cache_bytes > _MEM_CACHE_MAX_BYTES and len(_MEM_CACHE) > 1:
+            _, old = _MEM_CACHE.popitem(last=False)
+            _mem_cache_bytes -= len(old)
+
+
+def _mem_get(digest):
+    with _MEM_CACHE_LOCK:
+        raw = _MEM_CACHE.get(digest)
+        if raw is not None:
+            _MEM_CACHE.move_to_end(digest)
+        return raw
+
+
+def is_ref(value):
+    return isinstance(value, str) and REF_RE.match(value) is not None
+
+
+class BlobStore:
+    def __init__(self, token, owner, repo, branch="main", folder="blobs", cache_dir=None,
+                 timeout=None, api_base=None):
+        self.folder = folder.strip("/")
+        self.cache_dir = cache_dir
+        # Reaproveita as chamadas da contents API (sessão, retry, rate limit)
+        self._gh = GitHubJSON(
+            token, owner, repo, path=self.folder, branch=branch, timeout=timeout, api_base=api_base
+        )
+        self.stats = {"uploads": 0, "dedup_hits": 0, "downloads": 0}
+
+    def _remote_path(self, digest, ext):
+        return f"{self.folder}/{digest[:2]}/{digest}.{ext}"
+
+    def _local_path(self, digest, ext):
+        return os.path.join(self.cache_dir, "blobs", f"{digest}.{ext}")
+
+    # ============================================================
+    # PUT — upload único por hash
+    # ============================================================
+    def put(self, raw, ext="png", retries=8, tx=None):
+        """
+        Envia os bytes (se ainda não existirem) e retorna a referência.
+        Com tx (GitTransaction), a imagem entra no mesmo commit dos dados.
+        """
+        digest = hashlib.sha256(raw).hexdigest()
+        ref = f"sha256:{digest}.{ext}"
+        _mem_put(digest, raw)
+        self._write_local(digest, ext, raw)
+
+        if digest in _KNOWN_REMOTE:
+            self.stats["dedup_hits"] += 1
+            return ref
+
+        path = self._remote_path(digest, ext)
+        if tx is not None:
+            tx.put(path, raw)
+            self.stats["uploads"] += 1
+            return ref
+
+        msg = f"Imagem {digest[:12]}"
+        if len(raw) > LARGE_FILE_BYTES:
+            # Imagem grande: blob + tree + commit (contents API limita 1 MB)
+            self._gh.transaction(msg).put(path, raw).commit(retries=retries)
+            self.stats["uploads"] += 1
+            _KNOWN_REMOTE.add(digest)
+            return ref
+
+        for attempt in range(retries):
+            r = self._gh._put_contents(raw, None, msg, path=path)
+            if r.status_code in (200, 201):
+                self.stats["uploads"] += 1
+                break
+            # 422 = arquivo já existe (mesmo hash => mesmo conteúdo)
+            if r.status_code == 422:
+                self.stats["dedup_hits"] += 1
+                break
+            if self._gh._retry_wait(r, attempt):
+                continue
+            raise Exception(f"GitHub PUT error ({path}): {r.status_code} - {r.text}")
+        else:
+            raise TimeoutError(f"Falha ao enviar {path} após múltiplas tentativas.")
+
+        _KNOWN_REMOTE.add(digest)
+        return ref
+
+    # ============================================================
+    # GET — memória -> disco -> GitHub (lazy)
+    # ============================================================
+    def get(self, ref):
+        m = REF_RE.match(ref or "")
+        if not m:
+            raise ValueError(f"Referência de imagem inválida: {ref!r}")
+        digest, ext = m.group(1), m.group(2)
+
+        raw = _mem_get(digest)
+        if raw is not None:
+            return raw
+
+        raw = self._read_local(digest, ext)
+        if raw is None:
+            path = self._remote_path(digest, ext)
+            # Conteúdo cru: sem base64 e sem o limite de 1 MB da contents API
+            r = self._gh._get_raw(path)
+            if r.status_code != 200:
+                raise Exception(f"GitHub GET error ({path}): {r.status_code} - {r.text}")
+            raw = r.content
+            if hashlib.sha256(raw).hexdigest() != digest:
+                raise Exception(f"Imagem corrompida: {path}")
+            self.stats["downloads"] += 1
+            self._write_local(digest, ext, raw)
+
+        _KNOWN_REMOTE.add(digest)
+        _mem_put(digest, raw)
+        return raw
+
+    def _read_local(self, digest, ext):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._local_path(digest, ext), "rb") as f:
+                raw = f.read()
+        except OSError:
+            return None
+        return raw if hashlib.sha256(raw).hexdigest() == digest else None
+
+    def _write_local(self, digest, ext, raw):
+        if not self.cache_dir:
+            return
+        path = self._local_path(digest, ext)
+        if os.path.exists(path):
+            return
+        try:
+            atomic_write_bytes(path, raw)
+        except OSError:
+            pass
+
+    # ============================================================
+    # EXTRAÇÃO (no save) / RESOLUÇÃO (na exibição)
+    # ============================================================
+    def extract_html(self, html, tx=None):
+        """Troca cada data URI de <img> por uma referência sha256."""
+        if not html or "data:image/" not in html:
+            return html
+
+        def _repl(m):
+            quote, mime, b64 = m.group(1), m.group(2).lower(), m.group(3)
+            try:
+                raw = base64.b64decode(re.sub(r"\s+", "", b64))
+            except ValueError:
+                return m.group(0)
+            ref = self.put(raw, _MIME_TO_EXT.get(mime, "bin"), tx=tx)
+            return f"src={quote}{ref}{quote}"
+
+        return _DATA_URI_SRC_RE.sub(_repl, html)
+
+    def inline_html(self, html):
+        """Troca as referências sha256 por data URIs (p/ o editor exibir)."""
+        if not html or "sha256:" not in html:
+            return html
+
+        def _repl(m):
+            quote, ref = m.group(1), m.group(2)
+            try:
+                raw = self.get(ref)
+            except Exception:
+                return m.group(0)
+            ext = REF_RE.match(ref).group(2)
+            mime = _EXT_TO_MIME.get(ext, "application/octet-stream")
+            return f"src={quote}data:{mime};base64,{base64.b64encode(raw).decode()}{quote}"
+
+        return _REF_SRC_RE.sub(_repl, html)
+
+    def extract_record(self, record, html_fields=("observacoes", "descricao"), tx=None):
+        """
+        Retorna uma cópia do registro sem imagens inline:
+        print_b64 -> print_ref e data URIs dos campos HTML -> referências.
+        """
+        if not isinstance(record, dict):
+            return record
+        out = dict(record)
+
+        b64 = out.get("print_b64")
+        if b64:
+            out["print_ref"] = self.put(base64.b64decode(b64), "png", tx=tx)
+            out["print_b64"] = ""
+
+        for field in html_fields:
+            value = out.get(field)
+            if isinstance(value, str):
+                out[field] = self.extract_html(value, tx=tx)
+        return out
@@ -0,0 +1,166 @@
+# change_poller.py — Uma thread por repositório/branch vigia o HEAD no GitHub
+# GET condicional da ref (304 não gasta rate limit) | Atualiza o store UMA vez
+# Versão por arquivo: sessões comparam com a que exibiram e mostram o aviso
+#
+# Sem isso, cada sessão só via edições alheias ao clicar em "Recarregar" (ou
+# num rerun qualquer) e salvava em cima de dados velhos -> 409. Aqui o
+# processo inteiro faz um único GET leve a cada intervalo; quando a branch
+# anda, cada arquivo vigiado é recarregado (GET condicional: só o que mudou
+# vem inteiro) e sua versão é incrementada.
+
+import threading
+import time
+
+from rate_budget import get_rate_budget
+
+# Um poller por owner/repo@branch, compartilhado no processo
+_POLLERS = {}
+_POLLERS_LOCK = threading.Lock()
+
+
+def get_change_poller(db, interval=15.0):
+    key = f"{db.owner}/{db.repo}@{db.branch}"
+    with _POLLERS_LOCK:
+        poller = _POLLERS.get(key)
+        if poller is None:
+            poller = ChangePoller(interval=interval)
+            _POLLERS[key] = poller
+        return poller
+
+
+class ChangePoller:
+    def __init__(self, interval=15.0):
+        self.interval = float(interval)
+        self._lock = threading.Lock()
+        self._dbs = {}          # cache_key -> instância mais recente
+        self._versions = {}     # cache_key -> int (sobe a cada mudança externa)
+        self._changed_at = {}   # cache_key -> epoch da última mudança
+        self._shas = {}         # cache_key -> último SHA visto pelo poller
+        self._etag = None
+        self._head = None
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.stats = {"polls": 0, "not_modified": 0, "head_changes": 0, "refreshes": 0, "deferred": 0, "errors": 0}
+        self.last_poll = None
+        self.last_error = None
+
+    # ============================================================
+    # API PÚBLICA
+    # ============================================================
+    def watch(self, db):
+        """
+        Registra o arquivo do db (a instância mais recente é a usada p/
+        recarregar — o Streamlit recria as instâncias a cada rerun).
+        """
+        with self._lock:
+            self._dbs[db.cache_key] = db
+            self._versions.setdefault(db.cache_key, 0)
+            entry = db.store.peek(db.cache_key)
+            if entry is not None:
+                self._shas.setdefault(db.cache_key, entry.sha)
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        return self
+
+    def version(self, cache_key):
+        with self._lock:
+            return self._versions.get(cache_key, 0)
+
+    def versions(self):
+        with self._lock:
+            return dict(self._versions)
+
+    def changed_at(self, cache_key):
+        with self._lock:
+            return self._changed_at.get(cache_key)
+
+    def snapshot_stats(self):
+        with self._lock:
+            return {
+                **self.stats,
+                "interval_s": self.interval,
+                "watched": len(self._dbs),
+                "last_poll": self.last_poll,
+                "last_error": self.last_error,
+            }
+
+    def stop(self):
+        self._stop.set()
+
+    # ============================================================
+    # WORKER
+    # ============================================================
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll_once()
+            except Exception as e:
+                with self._lock:
+                    self.stats["errors"] += 1
+                    self.last_error = str(e)
+
+    def poll_once(self):
+        """Um ciclo: GET condicional da ref; se o HEAD andou, recarrega os arquivos."""
+        with self._lock:
+            dbs = list(self._dbs.values())
+            etag = self._etag
+        if not dbs:
+            return False
+        if not get_rate_budget().allow("background", consumer="poller"):
+            # Orçamento na reserva: fica p/ os saves; volta após o reset
+            with self._lock:
+                self.stats["deferred"] += 1
+            return False
+
+        gh = dbs[0]
+        headers = gh.headers
+        if etag:
+            headers["If-None-Match"] = etag
+        r = gh.session.get(gh._git_url(f"ref/heads/{gh.branch}"), headers=headers, timeout=gh.timeout)
+
+        with self._lock:
+            self.stats["polls"] += 1
+            self.last_poll = time.time()
+        if r.status_code == 304:
+            with self._lock:
+                self.stats["not_modified"] += 1
+            return False
+        if r.status_code != 200:
+            raise Exception(f"GitHub ref error: {r.status_code} - {r.text}")
+
+        head = r.json()["object"]["sha"]
+        with self._lock:
+            self._etag = r.headers.get("ETag")
+            first, changed = self._head is None, head != self._head
+            self._head = head
+        if first or not changed:
+            # Primeira leitura só fixa a referência
+            return False
+
+        with self._lock:
+            self.stats["head_changes"] += 1
+        for db in dbs:
+            try:
+                self._refresh(db)
+            except Exception as e:
+                # Um arquivo com erro não impede os demais
+                with self._lock:
+                    self.stats["errors"] += 1
+                    self.last_error = f"{db.path}: {e}"
+        return True
+
+    def _refresh(self, db):
+        before = db.store.peek(db.cache_key)
+        _, sha = db.load(force=True)
+        with self._lock:
+            self.stats["refreshes"] += 1
+            # Save deste processo já fez store.put com o SHA novo: não é
+            # mudança externa. Sem cópia no store, compara com o último SHA visto.
+            known = before.sha if before is not None else self._shas.get(db.cache_key)
+            self._shas[db.cache_key] = sha
+            if known is not None and known != sha:
+                self._versions[db.cache_key] = self._versions.get(db.cache_key, 0) + 1
+                self._changed_at[db.cache_key] = time.time()
@@ -0,0 +1,97 @@
+# circuit_breaker.py — Disjuntor das leituras do GitHub (por API base)
+# Fechado -> aberto após N falhas seguidas | Meio-aberto: 1 tentativa após o tempo
+#
+# Com o GitHub fora, cada rerun esperava os timeouts inteiros antes de
+# desistir. Com o disjuntor aberto, a leitura nem é tentada: o app serve a
+# última cópia boa na hora. Passado reset_timeout, UMA leitura testa o
+# caminho (as demais continuam servindo a cópia); se der certo, fecha.
+# Teste sem resposta em reset_timeout (thread presa) libera outro teste.
+
+import threading
+import time
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+_BREAKERS = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_circuit_breaker(key, failure_threshold=3, reset_timeout=30.0):
+    """Um disjuntor por chave (ex.: API base), compartilhado no processo."""
+    with _BREAKERS_LOCK:
+        breaker = _BREAKERS.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(failure_threshold, reset_timeout)
+            _BREAKERS[key] = breaker
+        return breaker
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = int(failure_threshold)
+        self.reset_timeout = float(reset_timeout)
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probe_at = None
+        self.last_error = None
+        self.stats = {"opened": 0, "rejected": 0, "probes": 0}
+
+    def allow(self):
+        """True se a chamada pode ir ao GitHub agora."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.time()
+            if self.state == HALF_OPEN and now - self.probe_at >= self.reset_timeout:
+                # Teste anterior nunca registrou resultado: volta a aberto
+                self.state = OPEN
+            if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+                # Meio-aberto: só esta chamada testa; as outras seguem rejeitadas
+                self.state = HALF_OPEN
+                self.probe_at = now
+                self.stats["probes"] += 1
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def record_probe(self, error=None):
+        """
+        Resultado do teste liberado por allow(), venha de onde vier (busca
+        própria, coalescida com outra ou cópia já fresca). Sem efeito se o
+        teste já foi registrado.
+        """
+        if self.state != HALF_OPEN:
+            return
+        if error is None:
+            self.record_success()
+        else:
+            self.record_failure(error)
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+            self.last_error = None
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error) if error is not None else None
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.stats["opened"] += 1
+                self.state = OPEN
+                self.opened_at = time.time()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "open_for_s": round(time.time() - self.opened_at, 1) if self.opened_at else None,
+                "last_error": self.last_error,
+                **self.stats,
+            }
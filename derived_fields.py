@@ -0,0 +1,145 @@
+# derived_fields.py — Campos derivados por registro, calculados na gravação
+# Sidecar {id: {hash, campos}} ao lado dos dados | Hash do conteúdo de origem
+#
+# Texto sanitizado, observações sem HTML e linhas já quebradas do PDF eram
+# recalculados a cada rerun/visualização. Aqui o save/update/upsert do banco
+# (parâmetro derived=) calcula os derivados dos registros gravados e os
+# guarda num arquivo sidecar; quem lê usa o sidecar quando o hash dos campos
+# de origem bate e recalcula só os registros que mudaram.
+#
+# O hash inclui `version()` (ex.: versão da tabela de correções): trocou a
+# regra, os derivados antigos deixam de valer sozinhos. Vários processos
+# gravando o mesmo sidecar: o último vence e o que se perdeu é recalculado.
+
+import hashlib
+import json
+import threading
+
+import json_codec
+from github_database import atomic_write_bytes
+
+# Um sidecar por arquivo, compartilhado no processo
+_SIDECARS = {}
+_SIDECARS_LOCK = threading.Lock()
+
+
+def get_derived_fields(path, compute, fields, version=None):
+    with _SIDECARS_LOCK:
+        sidecar = _SIDECARS.get(path)
+        if sidecar is None:
+            sidecar = DerivedFields(path, compute, fields, version=version)
+            _SIDECARS[path] = sidecar
+        else:
+            # Funções novas a cada rerun: usa as mais recentes
+            sidecar.compute = compute
+            sidecar.version = version
+        return sidecar
+
+
+class DerivedFields:
+    """
+    compute: função(registro) -> dict JSON-serializável com os derivados.
+    fields:  campos de origem (só eles entram no hash).
+    version: função() -> str, ou None.
+    """
+
+    def __init__(self, path, compute, fields, version=None):
+        self.path = path
+        self.compute = compute
+        self.fields = tuple(fields)
+        self.version = version
+        self._lock = threading.Lock()
+        self._entries = None        # id -> {"hash", "campos"} (lido do disco sob demanda)
+        self.stats = {"hits": 0, "computed": 0, "errors": 0, "writes": 0}
+        self.last_error = None
+
+    # ============================================================
+    # API PÚBLICA
+    # ============================================================
+    def fingerprint(self, record):
+        source = {f: record.get(f) for f in self.fields}
+        tag = self.version() if callable(self.version) else ""
+        raw = json.dumps([tag, source], ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, record):
+        """Derivados do registro: do sidecar se o hash bate; senão calcula."""
+        rid = record.get("id") if isinstance(record, dict) else None
+        if rid in (None, ""):
+            return self.compute(record or {})
+        rid = str(rid)
+        digest = self.fingerprint(record)
+        with self._lock:
+            entry = self._table().get(rid)
+        if entry is not None and entry.get("hash") == digest:
+            self.stats["hits"] += 1
+            return entry["campos"]
+
+        campos = self.compute(record)
+        self.stats["computed"] += 1
+        self._store({rid: {"hash": digest, "campos": campos}})
+        return campos
+
+    def refresh(self, records):
+        """
+        Chamado na gravação: calcula os derivados dos registros que mudaram.
+        Falhas aqui nunca derrubam o save (o leitor recalcula).
+        """
+        try:
+            changed = {}
+            with self._lock:
+                table = self._table()
+            for record in records:
+                rid = record.get("id") if isinstance(record, dict) else None
+                if rid in (None, ""):
+                    continue
+                digest = self.fingerprint(record)
+                entry = table.get(str(rid))
+                if entry is not None and entry.get("hash") == digest:
+                    continue
+                changed[str(rid)] = {"hash": digest, "campos": self.compute(record)}
+                self.stats["computed"] += 1
+            if changed:
+                self._store(changed)
+        except Exception as e:
+            self.stats["errors"] += 1
+            self.last_error = str(e)
+
+    def snapshot_stats(self):
+        with self._lock:
+            size = len(self._entries) if self._entries is not None else None
+        return {**self.stats, "records": size, "last_error": self.last_error}
+
+    # ============================================================
+    # SIDECAR EM DISCO
+    # ============================================================
+    def _table(self):
+        # Chamado com self._lock
+        if self._entries is None:
+            self._entries = self._read()
+        return self._entries
+
+    def _read(self):
+        if not self.path:
+            return {}
+        try:
+            with open(self.path, "rb") as f:
+                data = json_codec.decode(f.read())
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _store(self, entries):
+        with self._lock:
+            table = self._table()
+            table.update(entries)
+            if not self.path:
+                return
+            snapshot = dict(table)
+        try:
+            atomic_write_bytes(self.path, json_codec.encode(snapshot))
+            self.stats["writes"] += 1
+        except (OSError, TypeError, ValueError) as e:
+            # Sidecar é opcional: sem ele, só se recalcula mais
+            self.stats["errors"] += 1
+            self.last_error = str(e)
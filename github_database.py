@@ -1,15 +1,59 @@
-
 # github_database.py — Versão Premium Estável (robusta)
 # Seguro | Atômico | Anti-race | SHA locking real | Timeouts | Auto-healing JSON
 
-import requests
-import base64
 import json
+import os
+import re
+import tempfile
+import threading
 import time
 import random
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import json_codec
+import metrics
+import stream_codec
+from circuit_breaker import get_circuit_breaker
+from http_session import DEFAULT_TIMEOUT, get_session
+from rate_budget import get_rate_budget
+from record_merge import MergeConflict, merge_records
+from shared_store import SharedStore, StoreEntry
+from write_queue import get_write_queue
+
+def atomic_write_bytes(path, data):
+    """
+    Grava em arquivo temporário na mesma pasta e troca com os.replace():
+    um crash no meio nunca deixa o destino pela metade.
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=folder, prefix=".tmp-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+# A contents API só devolve "content" (base64) para arquivos de até 1 MB;
+# acima disso vem vazio ("encoding": "none") e é preciso ler o blob cru.
+LARGE_FILE_BYTES = 1024 * 1024
+RAW_MEDIA_TYPE = "application/vnd.github.raw"
+
 
 class GitHubJSON:
-    API_URL = "https://api.github.com/repos/{owner}/{repo}/contents/{path}"
+    API_BASE = "https://api.github.com"
+    API_URL = "{base}/repos/{owner}/{repo}/contents/{path}"
+    GIT_API_URL = "{base}/repos/{owner}/{repo}/git/{endpoint}"
+    DEFAULT_COMMIT_MESSAGE = "Atualização Manual Faturamento — GABMA"
 
     def __init__(
         self,
@@ -19,7 +63,20 @@ class GitHubJSON:
         path="dados.json",
         branch="main",
         max_bytes=None,               # opcional: limite de tamanho do JSON
-        user_agent="GABMA-Manual/1.0" # User-Agent p/ diagnósticos
+        user_agent="GABMA-Manual/1.0",# User-Agent p/ diagnósticos
+        store=None,                   # opcional: SharedStore do processo
+        cache_dir=None,               # opcional: pasta do snapshot em disco
+        blob_store=None,              # opcional: BlobStore p/ tirar imagens do JSON
+        write_behind=False,           # opcional: junta gravações concorrentes
+        write_window=0.5,             # janela (s) de coalescência do write-behind
+        timeout=None,                 # (connect, read) em segundos
+        session=None,                 # opcional: requests.Session (padrão: do processo)
+        api_base=None,                # opcional: GitHub Enterprise / github_stub local
+        compression=None,             # opcional: "gzip" | "zstd" (load detecta sozinho)
+        bus=None,                     # opcional: InvalidationBus (vários workers)
+        read_deadline=None,           # opcional: espera máx. (s) do load() c/ cópia em mãos
+        breaker=None,                 # opcional: CircuitBreaker (padrão: um por API base)
+        derived=None,                 # opcional: DerivedFields (derivados calculados na gravação)
     ):
         self.token = token
         self.owner = owner
@@ -28,11 +85,33 @@ class GitHubJSON:
         self.branch = branch
         self.max_bytes = max_bytes
         self.user_agent = user_agent
-
-        # Cache ultra-curto para evitar GET múltiplos desnecessários
-        self._cache_data = None
-        self._cache_sha = None
-        self._cache_time = 0.0
+        self.api_base = (api_base or self.API_BASE).rstrip("/")
+        if compression not in json_codec.COMPRESSIONS:
+            raise ValueError(f"compression inválida: {compression!r}")
+        self.compression = compression
+
+        # Sem store compartilhado: cache ultra-curto (200ms) só desta instância
+        self.store = store if store is not None else SharedStore(ttl=0.2)
+        self.cache_key = f"{owner}/{repo}@{branch}:{path}"
+        self.cache_dir = cache_dir
+        self.blob_store = blob_store
+        self.derived = derived
+        self.write_behind = write_behind
+        self.write_window = write_window
+        self.bus = bus
+
+        # Conexões keep-alive compartilhadas por todas as instâncias
+        self.session = session if session is not None else get_session()
+        self.timeout = tuple(timeout) if timeout else DEFAULT_TIMEOUT
+
+        # Leitura com prazo: estourou (ou disjuntor aberto) -> serve a cópia
+        self.read_deadline = read_deadline
+        self.breaker = breaker if breaker is not None else get_circuit_breaker(self.api_base)
+        self.stale = None               # motivo se o último load() serviu cópia antiga
+        self.stale_fetched_at = None    # quando essa cópia foi lida do GitHub
+
+        # Contadores de diagnóstico
+        self.stats = {"requests": 0, "not_modified": 0, "conflicts": 0, "merges": 0, "stale_served": 0}
 
     # ============================================================
     # HEADERS
@@ -46,127 +125,307 @@ class GitHubJSON:
         }
 
     # ============================================================
-    # LOAD — Leitura segura do JSON (Cache 200ms) + Auto-healing
+    # LOAD — Leitura segura do JSON (Store + ETag) + Auto-healing
     # ============================================================
-    def load(self, force=False):
-        now = time.time()
-        if not force and self._cache_data is not None:
-            if (now - self._cache_time) < 0.2:  # cache curtíssimo
-                return self._cache_data, self._cache_sha
+    @metrics.timed("github.load")
+    def load(self, force=False, deadline=None):
+        """
+        Retorna (lista, sha). A lista é compartilhada pelo store: copie
+        antes de alterar.
 
-        url = self.API_URL.format(owner=self.owner, repo=self.repo, path=self.path)
-        r = requests.get(
-            url,
-            headers=self.headers,
-            params={"ref": self.branch},
-            timeout=(6, 30),
-        )
+        deadline: espera máxima em segundos (padrão: read_deadline). Se
+        estourar, se o GitHub falhar ou se o disjuntor estiver aberto, e já
+        houver uma cópia, ela é devolvida na hora (self.stale diz o motivo)
+        e a busca segue em segundo plano. force=True sempre espera.
+        """
+        self.stale = None
+        self.stale_fetched_at = None
+        if not force and self.cache_dir:
+            snap = self._seed_from_snapshot()
+            if snap is not None:
+                return snap.data, snap.sha
+
+        if deadline is None:
+            deadline = self.read_deadline
+        entry = self._get_entry(force, deadline)
+        return entry.data, entry.sha
+
+    def _get_entry(self, force, deadline):
+        prev = self.store.peek(self.cache_key)
+        if force or prev is None or self.store.is_fresh(prev):
+            # Sem cópia p/ servir, ou gravação que precisa da versão atual
+            return self.store.get(self.cache_key, self._guarded_fetch, force=force)
+        if not self.breaker.allow():
+            return self._serve_stale(prev, "circuit_open")
+        if not deadline:
+            return self._probed_get()
+
+        # Busca numa thread: se passar do prazo, ela termina sozinha e
+        # atualiza o store p/ o próximo rerun
+        done = threading.Event()
+        result = {}
+
+        def _run():
+            try:
+                result["entry"] = self._probed_get()
+            except Exception as e:
+                result["error"] = e
+            finally:
+                done.set()
+
+        threading.Thread(target=_run, daemon=True).start()
+        if not done.wait(deadline):
+            return self._serve_stale(prev, "deadline")
+        if "error" in result:
+            return self._serve_stale(prev, "error")
+        return result["entry"]
+
+    def _probed_get(self):
+        """store.get; se allow() liberou um teste, o resultado dele é registrado."""
+        try:
+            entry = self.store.get(self.cache_key, self._guarded_fetch)
+        except ValueError:
+            self.breaker.record_probe()     # o GitHub respondeu
+            raise
+        except Exception as e:
+            self.breaker.record_probe(e)
+            raise
+        self.breaker.record_probe()
+        return entry
+
+    def _guarded_fetch(self, prev):
+        """_fetch com o resultado registrado no disjuntor."""
+        try:
+            entry = self._fetch(prev)
+        except ValueError:
+            # Dados, não rede: o GitHub respondeu
+            self.breaker.record_success()
+            raise
+        except Exception as e:
+            self.breaker.record_failure(e)
+            raise
+        self.breaker.record_success()
+        return entry
+
+    def _serve_stale(self, prev, reason):
+        self.stale = reason
+        self.stale_fetched_at = prev.fetched_at
+        self.stats["stale_served"] += 1
+        metrics.inc("github.stale_served")
+        return prev
+
+    @metrics.timed("github.fetch")
+    def _fetch(self, prev):
+        # GET condicional: 304 não consome rate limit nem traz o conteúdo
+        r = self._get_contents(etag=prev.etag if prev is not None else None, stream=True)
+        etag = r.headers.get("ETag")
+
+        if r.status_code == 304:
+            # Nada mudou — reaproveita a lista já parseada
+            r.close()
+            self.stats["not_modified"] += 1
+            return StoreEntry(prev.data, prev.sha, prev.etag)
 
         if r.status_code == 404:
             # Arquivo não existe — retorna base vazia
-            self._cache_data = []
-            self._cache_sha = None
-            self._cache_time = now
-            return [], None
+            r.close()
+            return StoreEntry([], None)
 
         if r.status_code != 200:
             raise Exception(f"GitHub GET error: {r.status_code} - {r.text}")
 
-        body = r.json()
+        # Envelope lido direto do socket; o base64 é decodificado dos bytes
+        # recebidos (sem r.content/r.text, sem a string base64 inteira)
+        body, raw = self._read_contents(r)
         sha = body.get("sha")
-        content_b64 = body.get("content") or ""
+        if prev is not None and sha and sha == prev.sha:
+            # Mesmo blob que já temos parseado (ex.: snapshot sem ETag)
+            return StoreEntry(prev.data, sha, etag)
+
+        if body.get("encoding") == "none" or (not raw and (body.get("size") or 0) > 0):
+            # Arquivo > 1 MB: nunca tratar como vazio (um save depois apagaria a base)
+            entry = StoreEntry(self._load_large(sha, body.get("size")), sha, etag)
+            self._write_snapshot(entry)
+            return entry
+
+        # Auto-healing p/ arquivo vazio/ inválido (formato detectado sozinho:
+        # JSON puro, gzip ou zstd)
+        text = None
         try:
-            decoded = base64.b64decode(content_b64).decode("utf-8")
-        except Exception:
-            # Conteúdo ilegível: assume base vazia
-            decoded = ""
-
-        # Auto-healing p/ arquivo vazio/ inválido
-        parsed = []
-        if decoded.strip():
-            try:
-                parsed = json.loads(decoded)
-            except json.JSONDecodeError:
-                # Remove BOM, tenta de novo
-                decoded2 = decoded.lstrip("\ufeff").strip()
-                try:
-                    parsed = json.loads(decoded2)
-                except json.JSONDecodeError:
-                    # Não deu: mantém como lista vazia (auto-healing na memória)
-                    parsed = []
+            text = json_codec.decode_text(raw)
+            parsed = json_codec.loads(text)
+        except ValueError:
+            # Não deu: mantém como lista vazia (auto-healing na memória)
+            parsed = []
+        # Bytes e texto soltos aqui: só a lista parseada segue em memória
+        del raw, text
 
         if not isinstance(parsed, list):
             parsed = []
 
-        if self.max_bytes is not None:
+        entry = StoreEntry(parsed, sha, etag)
+        self._write_snapshot(entry)
+        return entry
+
+    def _load_large(self, sha, size=None):
+        """
+        Lê o blob cru (sem base64) em streaming direto para o parser JSON.
+        """
+        if self.max_bytes is not None and size and size > self.max_bytes:
+            raise Exception("Arquivo JSON excede o limite configurado.")
+
+        r = self._get_raw_blob(sha)
+        if r.status_code != 200:
+            raise Exception(f"GitHub blob error: {r.status_code} - {r.text}")
+        try:
+            r.raw.decode_content = True
+            parsed = json_codec.load_stream(r.raw)
+        except ValueError as e:
+            # Arquivo grande e ilegível NÃO vira [] (evita sobrescrever a base)
+            raise Exception(f"JSON inválido em {self.path} ({size} bytes): {e}")
+        finally:
+            r.close()
+
+        if not isinstance(parsed, list):
+            raise Exception(f"{self.path} não contém uma lista JSON.")
+        return parsed
+
+    # ============================================================
+    # SNAPSHOT EM DISCO — cold start sem esperar o GitHub
+    # ============================================================
+    def _snapshot_path(self):
+        name = re.sub(r"[^A-Za-z0-9._-]+", "_", self.cache_key)
+        return os.path.join(self.cache_dir, f"{name}.snapshot.json")
+
+    def _read_snapshot(self):
+        try:
+            with open(self._snapshot_path(), "r", encoding="utf-8") as f:
+                snap = json.load(f)
+            data = snap["data"]
+            if not isinstance(data, list):
+                return None
+            return StoreEntry(data, snap.get("sha"), snap.get("etag"), snap.get("fetched_at"))
+        except (OSError, ValueError, KeyError, TypeError):
+            # Sem snapshot (ou corrompido): segue pelo caminho normal
+            return None
+
+    def _write_snapshot(self, entry):
+        if not self.cache_dir or entry.sha is None:
+            return
+        snap = {
+            "sha": entry.sha,
+            "etag": entry.etag,
+            "fetched_at": entry.fetched_at,
+            "data": entry.data,
+        }
+        try:
+            atomic_write_bytes(
+                self._snapshot_path(),
+                json.dumps(snap, ensure_ascii=False).encode("utf-8"),
+            )
+        except OSError:
+            # Cache em disco é opcional: falha aqui nunca derruba o load/save
+            pass
+
+    def _seed_from_snapshot(self):
+        """
+        Se o processo ainda não tem cópia deste arquivo, serve o snapshot
+        local na hora e revalida contra o GitHub em segundo plano.
+        """
+        if self.store.peek(self.cache_key) is not None:
+            return None
+        snap = self._read_snapshot()
+        if snap is None:
+            return None
+
+        # Vale como "fresco" enquanto a revalidação (GET condicional) roda
+        seeded = StoreEntry(snap.data, snap.sha, snap.etag)
+        if not self.store.seed(self.cache_key, seeded):
+            return None
+
+        def _revalidate():
+            if not get_rate_budget().allow("background", consumer=f"revalidate {self.path}"):
+                # Orçamento na reserva: o snapshot serve até o próximo load
+                return
             try:
-                if len(decoded.encode("utf-8")) > self.max_bytes:
-                    raise Exception("Arquivo JSON excede o limite configurado.")
+                self.store.get(self.cache_key, self._guarded_fetch, force=True)
             except Exception:
-                # Se não conseguimos medir, seguimos, mas é raro
+                # GitHub fora/lento: o snapshot continua servindo
                 pass
 
-        # Atualiza cache
-        self._cache_data = parsed
-        self._cache_sha = sha
-        self._cache_time = now
-        return parsed, sha
+        threading.Thread(target=_revalidate, daemon=True).start()
+        return seeded
 
     # ============================================================
-    # SAVE — Salvamento 100% atômico com SHA locking real
+    # SAVE — SHA locking real + merge de três vias em conflito
     # ============================================================
-    def save(self, new_data, retries=8, commit_message=None):
+    @metrics.timed("github.save")
+    def save(self, new_data, retries=8, commit_message=None, base=None):
+        """
+        base: (lista, sha) que o CHAMADOR leu e de onde new_data partiu. Se o
+        arquivo mudou nesse meio tempo (409), os registros são mesclados por
+        "id" com a versão atual e o PUT é refeito na hora. Mesmo registro
+        alterado dos dois lados levanta MergeConflict (nada é sobrescrito).
+        Sem base, new_data substitui a versão lida agora.
+        """
         if not isinstance(new_data, list):
             raise ValueError("new_data deve ser uma lista JSON serializável.")
 
-        # Serializa já no início (para detectar erros cedo)
-        encoded_json_bytes = json.dumps(new_data, indent=2, ensure_ascii=False).encode("utf-8")
-        if self.max_bytes is not None and len(encoded_json_bytes) > self.max_bytes:
-            raise ValueError("new_data excede o limite de tamanho configurado.")
+        if base is None:
+            base = self.load(force=True)
+        base_data, sha = base
+
+        # Imagens inline viram referências (upload único por hash)
+        new_data = self._externalize(new_data)
 
-        encoded_b64 = base64.b64encode(encoded_json_bytes).decode("utf-8")
-        msg = commit_message or "Atualização Manual Faturamento — GABMA"
+        msg = commit_message or self.DEFAULT_COMMIT_MESSAGE
 
         for attempt in range(retries):
-            # SHA sempre atualizado (evita cache sujo)
-            _, sha = self.load(force=True)
+            # Janela do rate limit esgotada: espera o reset antes do PUT
+            delay = get_rate_budget().write_delay()
+            if delay:
+                time.sleep(min(delay + 1.0, 10.0))
 
-            url = self.API_URL.format(owner=self.owner, repo=self.repo, path=self.path)
-            payload = {
-                "message": msg,
-                "content": encoded_b64,
-                "sha": sha,           # None cria arquivo; SHA válido atualiza
-                "branch": self.branch,
-            }
+            # Serializa antes do PUT (detecta erros e o limite cedo)
+            encoded_json_bytes = self._encode(new_data)
+            if len(encoded_json_bytes) > LARGE_FILE_BYTES:
+                return self._save_large(new_data, base_data, msg, retries)
 
-            r = requests.put(url, headers=self.headers, json=payload, timeout=(6, 30))
+            # sha=None cria arquivo; SHA da base atualiza (409 se mudou).
+            # O base64 é gerado em pedaços durante o envio.
+            r = self._put_contents(encoded_json_bytes, sha, msg)
+            del encoded_json_bytes
 
             if r.status_code in (200, 201):
                 body = r.json()
                 new_sha = body["content"]["sha"]
 
-                # Atualiza cache local
-                self._cache_data = new_data
-                self._cache_sha = new_sha
-                self._cache_time = time.time()
+                # Substitui a cópia compartilhada (ETag antigo não vale mais)
+                entry = StoreEntry(json_codec.canonical_records(new_data), new_sha)
+                self.store.put(self.cache_key, entry)
+                self._write_snapshot(entry)
+                self._publish(new_sha)
                 return True
 
-            # Conflito (arquivo mudou no GitHub) — backoff exponencial com jitter
-            if r.status_code == 409:
-                time.sleep((2 ** attempt) * 0.2 + random.random() * 0.3)
+            # 409 = SHA mudou; 422 sem SHA = alguém criou o arquivo antes
+            if r.status_code == 409 or (r.status_code == 422 and sha is None):
+                # Outra sessão gravou: mescla com a versão atual e tenta já
+                self.stats["conflicts"] += 1
+                theirs, theirs_sha = self.load(force=True)
+                if theirs_sha == sha:
+                    # Leitura ainda não enxerga o commit novo: espera um pouco
+                    self._retry_wait(r, attempt)
+                    continue
+                new_data = merge_records(base_data, new_data, theirs, path=self.path)
+                base_data, sha = theirs, theirs_sha
+                self.stats["merges"] += 1
+                if attempt:
+                    # Contenção contínua: espalha os escritores (jitter cheio)
+                    time.sleep(random.random() * min(1.0, 0.05 * (2 ** attempt)))
                 continue
 
-            # Rate limit — se tiver reset, aguarda (fallback 3s)
-            if r.status_code == 403 and "rate" in r.text.lower():
-                reset = r.headers.get("X-RateLimit-Reset")
-                if reset:
-                    try:
-                        wait = max(0.0, float(reset) - time.time()) + 1.0
-                        time.sleep(min(wait, 10.0))
-                    except Exception:
-                        time.sleep(3 + random.random())
-                else:
-                    time.sleep(3 + random.random())
+            # Rate limit: espera e tenta de novo
+            if self._retry_wait(r, attempt):
                 continue
 
             # Demais erros: levanta exceção com detalhes
@@ -174,20 +433,188 @@ class GitHubJSON:
 
         raise TimeoutError("Falha ao salvar após múltiplas tentativas.")
 
+    def _encode(self, data):
+        # Canônico: mesmos dados -> mesmos bytes (e diffs só dos registros alterados)
+        raw = json_codec.encode(data, self.compression)
+        if self.max_bytes is not None and len(raw) > self.max_bytes:
+            raise ValueError("new_data excede o limite de tamanho configurado.")
+        return raw
+
+    def _save_large(self, new_data, base_data, message, retries=8):
+        """
+        Arquivo > 1 MB: blob + tree + commit (Git Data API) em vez da
+        contents API. O merge roda sobre o conteúdo do HEAD de cada tentativa.
+        """
+        result = {}
+
+        def _merge_at_head(raw):
+            theirs = json_codec.decode(raw) if raw else []
+            data = new_data
+            if theirs != base_data:
+                data = merge_records(base_data, new_data, theirs, path=self.path)
+                self.stats["merges"] += 1
+            result["data"] = data
+            return self._encode(data)
+
+        tx = self.transaction(message).update(self.path, _merge_at_head)
+        tx.commit(retries=retries)
+
+        entry = StoreEntry(json_codec.canonical_records(result["data"]), tx.blob_shas[self.path])
+        self.store.put(self.cache_key, entry)
+        self._write_snapshot(entry)
+        self._publish(entry.sha)
+        return True
+
+    def _externalize(self, records, tx=None):
+        if self.blob_store is not None:
+            records = [self.blob_store.extract_record(r, tx=tx) for r in records]
+        if self.derived is not None:
+            # Derivados do que vai ser gravado (sidecar chaveado por hash)
+            self.derived.refresh(records)
+        return records
+
+    # ============================================================
+    # CONTENTS API — chamadas HTTP de baixo nível
+    # ============================================================
+    def _contents_url(self, path=None):
+        return self.API_URL.format(
+            base=self.api_base, owner=self.owner, repo=self.repo, path=path or self.path
+        )
+
+    def _get_contents(self, path=None, etag=None, ref=None, stream=False):
+        headers = self.headers
+        if etag:
+            headers["If-None-Match"] = etag
+        self.stats["requests"] += 1
+        return self.session.get(
+            self._contents_url(path),
+            headers=headers,
+            params={"ref": ref or self.branch},
+            stream=stream,
+            timeout=self.timeout,
+        )
+
+    def _read_contents(self, r):
+        """(metadados, bytes) de uma resposta stream=True da contents API."""
+        try:
+            r.raw.decode_content = True
+            return stream_codec.read_contents(r.raw)
+        finally:
+            r.close()
+
+    @property
+    def _large_timeout(self):
+        # Arquivos grandes: mesma conexão, leitura com folga maior
+        return (self.timeout[0], max(self.timeout[1], 60))
+
+    def _get_raw(self, path=None, ref=None, stream=False):
+        """GET de conteúdo cru (qualquer tamanho até 100 MB, sem base64)."""
+        self.stats["requests"] += 1
+        return self.session.get(
+            self._contents_url(path),
+            headers={**self.headers, "Accept": RAW_MEDIA_TYPE},
+            params={"ref": ref or self.branch},
+            stream=stream,
+            timeout=self._large_timeout,
+        )
+
+    def _get_raw_blob(self, sha):
+        """Blob cru por SHA (imutável), em streaming."""
+        self.stats["requests"] += 1
+        return self.session.get(
+            self._git_url(f"blobs/{sha}"),
+            headers={**self.headers, "Accept": RAW_MEDIA_TYPE},
+            stream=True,
+            timeout=self._large_timeout,
+        )
+
+    def _put_contents(self, raw, sha, message, path=None):
+        """PUT da contents API; raw (bytes) vira base64 em pedaços no envio."""
+        fields = {"message": message, "sha": sha, "branch": self.branch}
+        return self.session.put(
+            self._contents_url(path),
+            headers={**self.headers, "Content-Type": "application/json"},
+            data=stream_codec.Base64JSONBody(fields, raw),
+            timeout=self.timeout,
+        )
+
+    def _delete_contents(self, sha, message, path=None):
+        payload = {"message": message, "sha": sha, "branch": self.branch}
+        return self.session.delete(self._contents_url(path), headers=self.headers, json=payload, timeout=self.timeout)
+
+    def _git_url(self, endpoint):
+        return self.GIT_API_URL.format(
+            base=self.api_base, owner=self.owner, repo=self.repo, endpoint=endpoint
+        )
+
+    def _git_request(self, method, endpoint, payload=None, data=None):
+        headers = self.headers
+        if data is not None:
+            headers["Content-Type"] = "application/json"
+        return self.session.request(
+            method, self._git_url(endpoint), headers=headers, json=payload, data=data,
+            timeout=self.timeout,
+        )
+
+    def transaction(self, commit_message=None):
+        """
+        Commit atômico de vários arquivos (Git Data API). Uso:
+
+            with db.transaction("msg") as tx:
+                tx.put("a.json", b"...")
+                tx.delete("b.json")
+                tx.update("c.json", lambda raw: novo_raw)
+        """
+        return GitTransaction(self, commit_message or self.DEFAULT_COMMIT_MESSAGE)
+
+    def _retry_wait(self, r, attempt, conflict_codes=(409,)):
+        """
+        Conflito (409) ou rate limit (403): dorme o tempo adequado e retorna
+        True (pode tentar de novo). Qualquer outro status retorna False.
+        """
+        # Conflito (arquivo mudou no GitHub) — backoff exponencial com jitter
+        if r.status_code in conflict_codes:
+            time.sleep((2 ** attempt) * 0.2 + random.random() * 0.3)
+            return True
+
+        # Rate limit — se tiver reset, aguarda (fallback 3s)
+        if r.status_code == 403 and "rate" in r.text.lower():
+            reset = r.headers.get("X-RateLimit-Reset")
+            if reset:
+                try:
+                    wait = max(0.0, float(reset) - time.time()) + 1.0
+                    time.sleep(min(wait, 10.0))
+                except Exception:
+                    time.sleep(3 + random.random())
+            else:
+                time.sleep(3 + random.random())
+            return True
+
+        return False
+
     # ============================================================
     # UPDATE — Carregar, alterar e salvar com atomicidade real
     # ============================================================
+    @metrics.timed("github.update")
     def update(self, update_fn, retries=8, commit_message=None):
         """
         update_fn: função que recebe (list) e retorna (list) o novo conteúdo.
+        Em modo write-behind, entra na fila e espera o commit do lote.
         """
         if not callable(update_fn):
             raise ValueError("update_fn deve ser uma função (callable).")
 
+        if self.write_behind:
+            return self.submit(update_fn, commit_message=commit_message).result()
+        return self._update_direct(update_fn, retries=retries, commit_message=commit_message)
+
+    def _update_direct(self, update_fn, retries=8, commit_message=None):
         for attempt in range(retries):
-            data, _ = self.load(force=True)
+            data, sha = self.load(force=True)
             try:
                 new_data = update_fn(list(data) if isinstance(data, list) else [])
+            except MergeConflict:
+                raise
             except Exception as e:
                 raise Exception(f"update_fn falhou: {e}")
 
@@ -195,8 +622,11 @@ class GitHubJSON:
                 raise ValueError("update_fn deve retornar uma lista JSON serializável.")
 
             try:
-                self.save(new_data, commit_message=commit_message)
+                self.save(new_data, commit_message=commit_message, base=(data, sha))
                 return True
+            except MergeConflict:
+                # Mesmo registro alterado por outra sessão: não sobrescreve
+                raise
             except TimeoutError:
                 # tenta novamente
                 continue
@@ -206,9 +636,92 @@ class GitHubJSON:
 
         raise Exception("Falha ao atualizar após múltiplas tentativas.")
 
+    # ============================================================
+    # WRITE-BEHIND — mutações enfileiradas e gravadas em lote
+    # ============================================================
+    def submit(self, update_fn, commit_message=None):
+        """
+        Enfileira update_fn na fila do arquivo (compartilhada no processo) e
+        retorna um Future que resolve quando a alteração estiver gravada.
+        """
+        return get_write_queue(self, window=self.write_window).submit(
+            update_fn, commit_message=commit_message
+        )
+
+    def write_stats(self):
+        """
+        Profundidade da fila e tamanhos dos lotes já gravados.
+        """
+        return get_write_queue(self, window=self.write_window).snapshot_stats()
+
+    # ============================================================
+    # UPSERT / DELETE — Operações por registro (chave "id")
+    # ============================================================
+    def upsert(self, record, commit_message=None, expected=None, create=False):
+        """
+        Insere ou substitui o registro com o mesmo "id".
+        expected: o registro como o chamador o leu (ex.: ao abrir o
+        formulário). Se outra sessão o alterou depois, levanta MergeConflict.
+        create: registro novo (id gerado pelo chamador). Se outra sessão já
+        criou esse id, levanta MergeConflict em vez de substituí-lo.
+        """
+        if not isinstance(record, dict) or record.get("id") in (None, ""):
+            raise ValueError("record deve ser um dict com 'id'.")
+        rid = str(record.get("id"))
+
+        def _apply(data):
+            if expected is not None or create:
+                current = next((r for r in data if str(r.get("id")) == rid), None)
+                self._check_expected(record, expected, current)
+            if any(str(r.get("id")) == rid for r in data):
+                return [record if str(r.get("id")) == rid else r for r in data]
+            return data + [record]
+
+        return self.update(_apply, commit_message=commit_message)
+
+    def delete(self, record_id, commit_message=None):
+        """
+        Remove o registro cujo "id" == record_id (sem erro se não existir).
+        """
+        rid = str(record_id)
+
+        def _apply(data):
+            return [r for r in data if str(r.get("id")) != rid]
+
+        return self.update(_apply, commit_message=commit_message)
+
+    def _check_expected(self, record, expected, current):
+        if current != expected and current != record:
+            raise MergeConflict(
+                [{"id": record.get("id"), "base": expected, "ours": record, "theirs": current}],
+                path=self.path,
+            )
+
     # ============================================================
     # UTILITÁRIOS
     # ============================================================
+    def invalidate(self):
+        """
+        Descarta a cópia deste arquivo no store (dados, SHA e ETag).
+        """
+        self.store.invalidate(self.cache_key)
+
+    def _publish(self, sha):
+        """Avisa os outros workers (bus opcional; falha nunca derruba o save)."""
+        if self.bus is None:
+            return
+        try:
+            self.bus.publish(self.cache_key, sha)
+        except OSError:
+            pass
+
+    def cache_stats(self):
+        """
+        Contadores de leitura: GETs/304s desta instância + acertos, buscas
+        e leituras coalescidas do store.
+        """
+        return {**self.stats, **self.store.stats}
+
     def init_if_missing(self, initial=None):
         """
         Cria o arquivo com base vazia ([]) se não existir.
@@ -230,3 +743,149 @@ class GitHubJSON:
             return True
         except Exception:
             return self.save([])
+
+
+# ============================================================
+# TRANSAÇÃO — vários arquivos em UM commit (blobs -> tree -> commit -> ref)
+# ============================================================
+class GitTransaction:
+    """
+    Acumula alterações de caminhos e publica tudo num único commit:
+    blobs criados em paralelo, uma tree, um commit e fast-forward da branch.
+    Se a branch andar no meio (422/409 no PATCH da ref), refaz a partir da
+    nova cabeça — nada fica visível pela metade.
+    """
+
+    def __init__(self, gh, message, max_workers=8):
+        self.gh = gh
+        self.message = message
+        self.max_workers = max_workers
+        self._puts = OrderedDict()      # caminho -> bytes
+        self._deletes = set()           # caminhos removidos
+        self._updates = OrderedDict()   # caminho -> fn(bytes | None) -> bytes | None
+        self.blob_shas = {}             # caminho -> blob SHA (após o commit)
+        self.commit_sha = None
+
+    def put(self, path, raw):
+        self._deletes.discard(path)
+        self._updates.pop(path, None)
+        self._puts[path] = raw
+        return self
+
+    def delete(self, path):
+        """Remove um caminho que EXISTE na branch (senão use update -> None)."""
+        self._puts.pop(path, None)
+        self._updates.pop(path, None)
+        self._deletes.add(path)
+        return self
+
+    def update(self, path, update_fn):
+        """
+        update_fn recebe o conteúdo atual (bytes, ou None se não existe) NA
+        CABEÇA usada pelo commit e retorna o novo (None remove o arquivo).
+        """
+        self._puts.pop(path, None)
+        self._deletes.discard(path)
+        self._updates[path] = update_fn
+        return self
+
+    def __bool__(self):
+        return bool(self._puts or self._deletes or self._updates)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None and self:
+            self.commit()
+        return False
+
+    # ------------------------------------------------------------
+    def _create_blob(self, raw):
+        body = stream_codec.Base64JSONBody({"encoding": "base64"}, raw)
+        r = self.gh._git_request("POST", "blobs", data=body)
+        if r.status_code != 201:
+            raise Exception(f"GitHub blob error: {r.status_code} - {r.text}")
+        return r.json()["sha"]
+
+    def _create_blobs(self, items):
+        """items: {caminho: bytes} -> {caminho: sha}, em paralelo."""
+        if not items:
+            return {}
+        paths = list(items)
+        workers = max(1, min(self.max_workers, len(paths)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            shas = list(pool.map(self._create_blob, [items[p] for p in paths]))
+        return dict(zip(paths, shas))
+
+    def _read_at(self, path, commit_sha):
+        # Conteúdo cru: funciona também para arquivos > 1 MB
+        r = self.gh._get_raw(path, ref=commit_sha)
+        if r.status_code == 404:
+            return None
+        if r.status_code != 200:
+            raise Exception(f"GitHub GET error ({path}): {r.status_code} - {r.text}")
+        return r.content
+
+    def commit(self, retries=8):
+        # Blobs fixos não dependem da cabeça: criados uma vez só
+        static_shas = self._create_blobs(self._puts)
+
+        for attempt in range(retries):
+            r = self.gh._git_request("GET", f"ref/heads/{self.gh.branch}")
+            if r.status_code != 200:
+                if self.gh._retry_wait(r, attempt):
+                    continue
+                raise Exception(f"GitHub ref error: {r.status_code} - {r.text}")
+            head_sha = r.json()["object"]["sha"]
+
+            r = self.gh._git_request("GET", f"commits/{head_sha}")
+            if r.status_code != 200:
+                raise Exception(f"GitHub commit error: {r.status_code} - {r.text}")
+            base_tree = r.json()["tree"]["sha"]
+
+            # Leitura-modificação-escrita sobre a cabeça exata deste commit
+            updated, removed = {}, set(self._deletes)
+            for path, fn in self._updates.items():
+                current = self._read_at(path, head_sha)
+                new_raw = fn(current)
+                if new_raw is None:
+                    if current is not None:
+                        removed.add(path)
+                else:
+                    updated[path] = new_raw
+            shas = {**static_shas, **self._create_blobs(updated)}
+
+            tree = [
+                {"path": p, "mode": "100644", "type": "blob", "sha": sha}
+                for p, sha in shas.items()
+            ] + [
+                {"path": p, "mode": "100644", "type": "blob", "sha": None}
+                for p in sorted(removed)
+            ]
+            r = self.gh._git_request("POST", "trees", {"base_tree": base_tree, "tree": tree})
+            if r.status_code != 201:
+                raise Exception(f"GitHub tree error: {r.status_code} - {r.text}")
+            tree_sha = r.json()["sha"]
+
+            r = self.gh._git_request(
+                "POST", "commits",
+                {"message": self.message, "tree": tree_sha, "parents": [head_sha]},
+            )
+            if r.status_code != 201:
+                raise Exception(f"GitHub commit error: {r.status_code} - {r.text}")
+            commit_sha = r.json()["sha"]
+
+            # Fast-forward apenas: se a branch andou, 422 -> refaz
+            r = self.gh._git_request(
+                "PATCH", f"refs/heads/{self.gh.branch}", {"sha": commit_sha, "force": False}
+            )
+            if r.status_code == 200:
+                self.blob_shas = shas
+                self.commit_sha = commit_sha
+                return commit_sha
+            if self.gh._retry_wait(r, attempt, conflict_codes=(409, 422)):
+                continue
+            raise Exception(f"GitHub ref update error: {r.status_code} - {r.text}")
+
+        raise TimeoutError("Falha ao publicar o commit após múltiplas tentativas.")
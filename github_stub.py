@@ -0,0 +1,509 @@
+# github_stub.py — Servidor local que imita a API do GitHub usada pelo app
+# Contents API (GET/PUT/DELETE com SHA) | Git Data API (blobs/trees/commits/refs)
+# Histórico: GET /commits?path=&sha=&per_page=&page= (com header Link)
+# 409 em SHA desatualizado | 403 de rate limit com X-RateLimit-Reset
+# Latência e falhas 5xx injetáveis | Tudo em memória, sem rede
+#
+# Uso (em processo, p/ testes/benchmarks):
+#     stub = GitHubStub(latency=0.02).start()
+#     db = GitHubJSON("tok", "o", "r", api_base=stub.url)
+#     ...
+#     stub.stop()
+#
+# Ou standalone:  python github_stub.py --port 8765 --latency 0.05
+# e no app:       GITHUB_API_URL = "http://127.0.0.1:8765"
+
+import argparse
+import base64
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# Acima disso a contents API devolve "encoding": "none" (igual ao GitHub)
+LARGE_FILE_BYTES = 1024 * 1024
+RAW_MEDIA_TYPE = "application/vnd.github.raw"
+
+_CONTENTS_RE = re.compile(r"^/repos/[^/]+/[^/]+/contents/(?P<path>.*)$")
+_GIT_RE = re.compile(r"^/repos/[^/]+/[^/]+/git/(?P<endpoint>.+)$")
+_COMMITS_RE = re.compile(r"^/repos/[^/]+/[^/]+/commits$")
+
+
+def git_blob_sha(raw):
+    return hashlib.sha1(b"blob %d\0" % len(raw) + raw).hexdigest()
+
+
+class GitHubStub:
+    """
+    Repositório em memória: commits = {sha: {"files": {path: blob_sha}, ...}}
+    e blobs = {blob_sha: bytes}. Uma branch por nome (refs).
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,                 # 0 = porta livre escolhida pelo sistema
+        latency=0.0,            # atraso fixo (s) por requisição
+        jitter=0.0,             # atraso aleatório extra (s), uniforme [0, jitter]
+        rate_limit=0,           # requisições por janela (0 = sem limite)
+        rate_window=60.0,       # janela (s) do rate limit
+        error_rate=0.0,         # fração de respostas 502 (falha transitória)
+        seed=None,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = float(latency)
+        self.jitter = float(jitter)
+        self.rate_limit = int(rate_limit)
+        self.rate_window = float(rate_window)
+        self.error_rate = float(error_rate)
+        self._random = random.Random(seed)
+
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.blobs = {}
+        self.trees = {}         # tree_sha -> {path: blob_sha}
+        self.commits = {"c0": {"files": {}, "tree": "t0", "parents": []}}
+        self.trees["t0"] = {}
+        self.refs = {}          # branch -> commit_sha (criada no 1º acesso)
+
+        self._window_start = time.time()
+        self._window_count = 0
+
+        self.counters = {
+            "requests": 0, "get": 0, "put": 0, "delete": 0, "git": 0,
+            "put_ok": 0, "conflicts": 0, "not_modified": 0,
+            "rate_limited": 0, "injected_errors": 0,
+        }
+        self._server = None
+        self._thread = None
+
+    # ============================================================
+    # CICLO DE VIDA
+    # ============================================================
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        stub = self
+
+        class _Handler(_StubHandler):
+            pass
+
+        _Handler.stub = stub
+        self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def reset_counters(self):
+        with self._lock:
+            for k in self.counters:
+                self.counters[k] = 0
+
+    # ============================================================
+    # ESTADO DO REPOSITÓRIO
+    # ============================================================
+    def _head(self, branch):
+        return self.refs.setdefault(branch, "c0")
+
+    def files_at(self, ref):
+        """{path: blob_sha} no commit (ou branch) informado."""
+        commit = self.commits.get(ref) or self.commits[self._head(ref)]
+        return commit["files"]
+
+    def read_file(self, path, ref="main"):
+        with self._lock:
+            sha = self.files_at(ref).get(path)
+            return None if sha is None else self.blobs[sha]
+
+    def write_file(self, path, raw, branch="main", message="stub"):
+        """Grava direto (sem checagem) — p/ montar o estado inicial."""
+        with self._lock:
+            self._commit_files(branch, {path: raw}, set(), message)
+
+    def _commit_files(self, branch, writes, removes, message=""):
+        files = dict(self.files_at(self._head(branch)))
+        for path, raw in writes.items():
+            sha = git_blob_sha(raw)
+            self.blobs[sha] = raw
+            files[path] = sha
+        for path in removes:
+            files.pop(path, None)
+        tree = f"t{next(self._ids)}"
+        self.trees[tree] = files
+        commit = f"c{next(self._ids)}"
+        self.commits[commit] = {"files": files, "tree": tree, "parents": [self._head(branch)],
+                                "message": message, "date": time.time()}
+        self.refs[branch] = commit
+        return commit
+
+    # ============================================================
+    # POLÍTICAS — latência, 5xx e rate limit
+    # ============================================================
+    def _delay(self):
+        delay = self.latency + (self._random.random() * self.jitter if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _admit(self):
+        """Retorna (status, headers) se a requisição deve falhar, senão (None, headers)."""
+        with self._lock:
+            self.counters["requests"] += 1
+            now = time.time()
+            if now - self._window_start >= self.rate_window:
+                self._window_start, self._window_count = now, 0
+            reset = int(self._window_start + self.rate_window) + 1
+
+            headers = {}
+            if self.rate_limit:
+                remaining = max(0, self.rate_limit - self._window_count)
+                headers = {
+                    "X-RateLimit-Limit": str(self.rate_limit),
+                    "X-RateLimit-Remaining": str(max(0, remaining - 1)),
+                    "X-RateLimit-Reset": str(reset),
+                }
+                if remaining <= 0:
+                    self.counters["rate_limited"] += 1
+                    headers["X-RateLimit-Remaining"] = "0"
+                    return 403, headers
+                self._window_count += 1
+
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.counters["injected_errors"] += 1
+                return 502, headers
+            return None, headers
+
+    # ============================================================
+    # CONTENTS API
+    # ============================================================
+    def contents_get(self, path, ref, headers):
+        with self._lock:
+            self.counters["get"] += 1
+            files = self.files_at(ref)
+            sha = files.get(path)
+
+            if sha is None:
+                prefix = path.rstrip("/") + "/"
+                listing = [
+                    {"type": "file", "name": p[len(prefix):], "path": p, "sha": s,
+                     "size": len(self.blobs[s])}
+                    for p, s in sorted(files.items())
+                    if p.startswith(prefix) and "/" not in p[len(prefix):]
+                ]
+                if not listing:
+                    return 404, {"message": "Not Found"}, {}
+                etag = '"%s"' % hashlib.sha1(json.dumps(listing).encode("utf-8")).hexdigest()
+                if headers.get("If-None-Match") == etag:
+                    self.counters["not_modified"] += 1
+                    return 304, None, {"ETag": etag}
+                return 200, listing, {"ETag": etag}
+
+            raw = self.blobs[sha]
+
+        if headers.get("Accept") == RAW_MEDIA_TYPE:
+            return 200, raw, {}
+
+        etag = f'"{sha}"'
+        if headers.get("If-None-Match") == etag:
+            with self._lock:
+                self.counters["not_modified"] += 1
+            return 304, None, {"ETag": etag}
+
+        large = len(raw) > LARGE_FILE_BYTES
+        body = {
+            "type": "file",
+            "name": path.rsplit("/", 1)[-1],
+            "path": path,
+            "sha": sha,
+            "size": len(raw),
+            "encoding": "none" if large else "base64",
+            "content": "" if large else base64.b64encode(raw).decode("ascii"),
+        }
+        return 200, body, {"ETag": etag}
+
+    def contents_put(self, path, payload):
+        branch = payload.get("branch") or "main"
+        try:
+            raw = base64.b64decode(payload.get("content") or "")
+        except ValueError:
+            return 422, {"message": "content is not valid Base64"}
+        with self._lock:
+            self.counters["put"] += 1
+            current = self.files_at(self._head(branch)).get(path)
+            sent = payload.get("sha")
+            if current is not None and not sent:
+                self.counters["conflicts"] += 1
+                return 422, {"message": "Invalid request.\n\n\"sha\" wasn't supplied."}
+            if sent and sent != current:
+                self.counters["conflicts"] += 1
+                return 409, {"message": f"{path} does not match {sent}"}
+            commit = self._commit_files(branch, {path: raw}, set(), payload.get("message") or "")
+            self.counters["put_ok"] += 1
+            sha = self.commits[commit]["files"][path]
+        return (201 if current is None else 200), {
+            "content": {"path": path, "sha": sha, "size": len(raw)},
+            "commit": {"sha": commit},
+        }
+
+    def contents_delete(self, path, payload):
+        branch = payload.get("branch") or "main"
+        with self._lock:
+            self.counters["delete"] += 1
+            current = self.files_at(self._head(branch)).get(path)
+            if current is None:
+                return 404, {"message": "Not Found"}
+            if payload.get("sha") != current:
+                self.counters["conflicts"] += 1
+                return 409, {"message": f"{path} does not match {payload.get('sha')}"}
+            commit = self._commit_files(branch, {}, {path}, payload.get("message") or "")
+        return 200, {"content": None, "commit": {"sha": commit}}
+
+    # ============================================================
+    # HISTÓRICO — commits que alteraram um caminho (mais novo primeiro)
+    # ============================================================
+    def commits_list(self, ref, path, per_page, page):
+        with self._lock:
+            self.counters["get"] += 1
+            out = []
+            sha = ref if ref in self.commits else self._head(ref)
+            while sha in self.commits and sha != "c0":
+                commit = self.commits[sha]
+                parent = commit["parents"][0] if commit["parents"] else None
+                before = self.commits[parent]["files"].get(path) if parent in self.commits else None
+                if not path or commit["files"].get(path) != before:
+                    out.append({
+                        "sha": sha,
+                        "commit": {
+                            "message": commit.get("message", ""),
+                            "author": {
+                                "name": "stub",
+                                "date": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(commit.get("date", 0))),
+                            },
+                        },
+                    })
+                sha = parent
+        start = (page - 1) * per_page
+        return out[start:start + per_page], len(out) > start + per_page
+
+    # ============================================================
+    # GIT DATA API — blobs, trees, commits, refs
+    # ============================================================
+    def git(self, method, endpoint, payload, headers):
+        with self._lock:
+            self.counters["git"] += 1
+
+            if method == "GET" and endpoint.startswith("ref/heads/"):
+                return 200, {"object": {"sha": self._head(endpoint[len("ref/heads/"):])}}
+
+            if method == "GET" and endpoint.startswith("commits/"):
+                commit = self.commits.get(endpoint[len("commits/"):])
+                if commit is None:
+                    return 404, {"message": "Not Found"}
+                return 200, {"sha": endpoint[len("commits/"):], "tree": {"sha": commit["tree"]},
+                             "parents": [{"sha": p} for p in commit["parents"]]}
+
+            if method == "GET" and endpoint.startswith("blobs/"):
+                raw = self.blobs.get(endpoint[len("blobs/"):])
+                if raw is None:
+                    return 404, {"message": "Not Found"}
+                if headers.get("Accept") == RAW_MEDIA_TYPE:
+                    return 200, raw
+                return 200, {"sha": git_blob_sha(raw), "size": len(raw), "encoding": "base64",
+                             "content": base64.b64encode(raw).decode("ascii")}
+
+            if method == "POST" and endpoint == "blobs":
+                raw = base64.b64decode(payload.get("content") or "")
+                sha = git_blob_sha(raw)
+                self.blobs[sha] = raw
+                return 201, {"sha": sha}
+
+            if method == "POST" and endpoint == "trees":
+                files = dict(self.trees.get(payload.get("base_tree"), {}))
+                for item in payload.get("tree") or []:
+                    if item.get("sha") is None:
+                        files.pop(item["path"], None)
+                    elif item["sha"] not in self.blobs:
+                        return 422, {"message": f"Invalid sha {item['sha']}"}
+                    else:
+                        files[item["path"]] = item["sha"]
+                tree = f"t{next(self._ids)}"
+                self.trees[tree] = files
+                return 201, {"sha": tree}
+
+            if method == "POST" and endpoint == "commits":
+                tree = payload.get("tree")
+                if tree not in self.trees:
+                    return 422, {"message": "Tree not found"}
+                commit = f"c{next(self._ids)}"
+                self.commits[commit] = {"files": self.trees[tree], "tree": tree,
+                                        "parents": list(payload.get("parents") or []),
+                                        "message": payload.get("message") or "", "date": time.time()}
+                return 201, {"sha": commit}
+
+            if method == "PATCH" and endpoint.startswith("refs/heads/"):
+                branch = endpoint[len("refs/heads/"):]
+                commit = self.commits.get(payload.get("sha"))
+                if commit is None:
+                    return 422, {"message": "Object does not exist"}
+                head = self._head(branch)
+                if not payload.get("force") and head not in commit["parents"]:
+                    self.counters["conflicts"] += 1
+                    return 422, {"message": "Update is not a fast forward"}
+                self.refs[branch] = payload["sha"]
+                return 200, {"object": {"sha": payload["sha"]}}
+
+        return 404, {"message": "Not Found"}
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    stub = None
+    protocol_version = "HTTP/1.1"     # keep-alive, como o GitHub
+
+    def log_message(self, *args):
+        pass
+
+    def _payload(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+        except ValueError:
+            return {}
+
+    def _send(self, status, body, headers=None):
+        if isinstance(body, bytes):
+            data, ctype = body, "application/octet-stream"
+        elif body is None:
+            data, ctype = b"", "application/json"
+        else:
+            data, ctype = json.dumps(body).encode("utf-8"), "application/json; charset=utf-8"
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if data:
+            self.wfile.write(data)
+
+    def _handle(self, method):
+        payload = self._payload() if method in ("PUT", "DELETE", "POST", "PATCH") else {}
+        stub = self.stub
+        stub._delay()
+
+        failure, limit_headers = stub._admit()
+        if failure == 403:
+            return self._send(403, {"message": "API rate limit exceeded"}, limit_headers)
+        if failure == 502:
+            return self._send(502, {"message": "Server Error"}, limit_headers)
+
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        path = unquote(parts.path)
+        headers = {k: v for k, v in self.headers.items()}
+
+        m = _CONTENTS_RE.match(path)
+        if m:
+            file_path = m.group("path")
+            if method == "GET":
+                status, body, extra = stub.contents_get(
+                    file_path, (query.get("ref") or ["main"])[0], headers
+                )
+                return self._send(status, body, {**limit_headers, **extra})
+            if method == "PUT":
+                status, body = stub.contents_put(file_path, payload)
+                return self._send(status, body, limit_headers)
+            if method == "DELETE":
+                status, body = stub.contents_delete(file_path, payload)
+                return self._send(status, body, limit_headers)
+
+        if method == "GET" and _COMMITS_RE.match(path):
+            page = int((query.get("page") or ["1"])[0])
+            per_page = int((query.get("per_page") or ["30"])[0])
+            items, more = stub.commits_list(
+                (query.get("sha") or ["main"])[0], (query.get("path") or [""])[0], per_page, page
+            )
+            extra = {}
+            if more:
+                extra["Link"] = f'<{stub.url}{parts.path}?page={page + 1}>; rel="next"'
+            return self._send(200, items, {**limit_headers, **extra})
+
+        m = _GIT_RE.match(path)
+        if m:
+            status, body = stub.git(method, m.group("endpoint"), payload, headers)
+            return self._send(status, body, limit_headers)
+
+        return self._send(404, {"message": "Not Found"}, limit_headers)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in local da API do GitHub.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=0)
+    parser.add_argument("--rate-window", type=float, default=60.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed-file", action="append", default=[],
+                        metavar="REPO_PATH=LOCAL_FILE",
+                        help="carrega um arquivo local no repositório (ex.: dados.json=dados.json)")
+    args = parser.parse_args()
+
+    stub = GitHubStub(
+        host=args.host, port=args.port, latency=args.latency, jitter=args.jitter,
+        rate_limit=args.rate_limit, rate_window=args.rate_window, error_rate=args.error_rate,
+    )
+    for item in args.seed_file:
+        repo_path, _, local = item.partition("=")
+        with open(local or repo_path, "rb") as f:
+            stub.write_file(repo_path, f.read())
+
+    stub.start()
+    print(f"github_stub em {stub.url} (Ctrl+C para sair)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# http_session.py — Sessão HTTP única por processo (keep-alive + retry)
+# Pool de conexões | Retry urllib3 p/ 5xx e conexões resetadas | Timeouts
+# Latência por chamada: conexão (TCP+TLS) x espera do servidor x transferência
+#
+# Sem isso, cada requests.get/put abre uma conexão TLS nova com
+# api.github.com. Com a sessão compartilhada, db, db_rotinas e o BlobStore
+# reaproveitam as mesmas conexões.
+
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from rate_budget import get_rate_budget
+
+DEFAULT_TIMEOUT = (6, 30)   # (connect, read) em segundos
+
+_tls = threading.local()
+
+
+# ============================================================
+# CONEXÕES INSTRUMENTADAS — mede o handshake de cada conexão nova
+# ============================================================
+def _note_connect(started):
+    _tls.connect_time = getattr(_tls, "connect_time", 0.0) + (time.perf_counter() - started)
+    _tls.new_connections = getattr(_tls, "new_connections", 0) + 1
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        _note_connect(started)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        _note_connect(started)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+# ============================================================
+# SESSÃO
+# ============================================================
+class TimedSession(requests.Session):
+    """
+    requests.Session que registra, por chamada: tempo total, tempo de
+    conexão (0 quando reaproveita keep-alive), espera até os headers e
+    transferência do corpo.
+    """
+
+    def __init__(self, log_size=500):
+        super().__init__()
+        self._log_lock = threading.Lock()
+        self.calls = deque(maxlen=log_size)
+        self.totals = {"calls": 0, "new_connections": 0, "connect_s": 0.0, "total_s": 0.0}
+
+    def request(self, method, url, *args, **kwargs):
+        _tls.connect_time = 0.0
+        _tls.new_connections = 0
+        started = time.perf_counter()
+        r = super().request(method, url, *args, **kwargs)
+        # Em stream=True o corpo ainda não foi lido: total ~= até os headers
+        self._record(method, url, r, time.perf_counter() - started)
+        return r
+
+    def _record(self, method, url, r, total):
+        connect = getattr(_tls, "connect_time", 0.0)
+        new_conns = getattr(_tls, "new_connections", 0)
+        headers_at = r.elapsed.total_seconds() if r.elapsed else total
+        entry = {
+            "at": time.time(),
+            "method": method,
+            "path": urlsplit(url).path,
+            "status": r.status_code,
+            "new_connection": new_conns > 0,
+            "connect_ms": connect * 1000.0,
+            "wait_ms": max(0.0, headers_at - connect) * 1000.0,
+            "transfer_ms": max(0.0, total - headers_at) * 1000.0,
+            "total_ms": total * 1000.0,
+        }
+        with self._log_lock:
+            self.calls.append(entry)
+            self.totals["calls"] += 1
+            self.totals["new_connections"] += new_conns
+            self.totals["connect_s"] += connect
+            self.totals["total_s"] += total
+
+    def latency_summary(self):
+        with self._log_lock:
+            calls = list(self.calls)
+            totals = dict(self.totals)
+        reused = [c for c in calls if not c["new_connection"]]
+        fresh = [c for c in calls if c["new_connection"]]
+
+        def _avg(items, key):
+            return (sum(c[key] for c in items) / len(items)) if items else 0.0
+
+        return {
+            **totals,
+            "reuse_ratio": (len(reused) / len(calls)) if calls else 0.0,
+            "avg_connect_ms_new": _avg(fresh, "connect_ms"),
+            "avg_total_ms_new": _avg(fresh, "total_ms"),
+            "avg_total_ms_reused": _avg(reused, "total_ms"),
+            "avg_transfer_ms": _avg(calls, "transfer_ms"),
+        }
+
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def get_session(pool_maxsize=32, max_retries=3):
+    """
+    Sessão do processo (criada na primeira chamada). Retry automático em
+    falhas de conexão e em 500/502/503/504 para métodos idempotentes.
+    Toda resposta alimenta o orçamento de rate limit (rate_budget).
+    """
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            retry = Retry(
+                total=max_retries,
+                connect=max_retries,
+                read=max_retries,
+                status=max_retries,
+                backoff_factor=0.3,
+                status_forcelist=(500, 502, 503, 504),
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = _TimedAdapter(
+                pool_connections=4,
+                pool_maxsize=pool_maxsize,
+                max_retries=retry,
+            )
+            session = TimedSession()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.hooks["response"].append(get_rate_budget().observe)
+            _SESSION = session
+        return _SESSION
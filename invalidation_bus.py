@@ -0,0 +1,186 @@
+# invalidation_bus.py — Invalidação de cache entre processos (vários workers)
+# Pasta compartilhada + fcntl.flock | Um arquivo por chave com o último SHA
+# Sem serviço externo (nada de Redis): basta os workers verem a mesma pasta
+#
+# Com vários servidores Streamlit atrás de um balanceador, o save de um worker
+# deixava os outros servindo a cópia velha até o TTL vencer (e gerando 409 em
+# quem salvasse em cima dela). Aqui o save publica {chave, SHA novo} e uma
+# thread em cada worker varre a pasta: se o SHA do store local for outro, a
+# chave é descartada e o próximo load busca a versão nova.
+#
+# Só o estado mais recente de cada chave importa, então a pasta nunca cresce
+# além de um arquivo por base (sem log p/ compactar).
+
+import contextlib
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+from github_database import atomic_write_bytes
+
+try:
+    import fcntl
+except ImportError:           # Windows: só o lock entre threads
+    fcntl = None
+
+LOCK_NAME = ".lock"
+
+
+class InvalidationBus:
+    def __init__(self, directory, interval=0.5):
+        self.directory = directory
+        self.interval = float(interval)
+        # Identifica este processo: eventos próprios são ignorados
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._lock = threading.Lock()
+        self._stores = []
+        self._seen = {}          # nome do arquivo -> (inode, mtime_ns)
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.stats = {"published": 0, "received": 0, "invalidated": 0, "errors": 0}
+        self.last_error = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        # Estado já existente na pasta não é "novo": só o que vier depois
+        self._scan(apply=False)
+
+    # ============================================================
+    # API PÚBLICA
+    # ============================================================
+    def subscribe(self, store):
+        """Passa a aplicar os eventos de outros processos neste SharedStore."""
+        with self._lock:
+            if all(s is not store for s in self._stores):
+                self._stores.append(store)
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        return self
+
+    def publish(self, key, sha=None):
+        """
+        Anuncia a versão nova de uma chave. sha=None: os demais processos
+        descartam a chave sem comparar (ex.: layout em shards).
+        """
+        event = {
+            "key": key,
+            "sha": sha,
+            "origin": self.origin,
+            "ts": time.time(),
+        }
+        name = self._file_name(key)
+        path = os.path.join(self.directory, name)
+        with self._locked():
+            atomic_write_bytes(path, json.dumps(event, ensure_ascii=False).encode("utf-8"))
+            st = os.stat(path)
+        with self._lock:
+            # O próprio arquivo não volta como evento p/ este processo
+            self._seen[name] = (st.st_ino, st.st_mtime_ns)
+            self.stats["published"] += 1
+
+    def snapshot_stats(self):
+        with self._lock:
+            return {
+                **self.stats,
+                "directory": self.directory,
+                "subscribers": len(self._stores),
+                "last_error": self.last_error,
+            }
+
+    def stop(self):
+        self._stop.set()
+
+    # ============================================================
+    # WORKER
+    # ============================================================
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll_once()
+            except Exception as e:
+                with self._lock:
+                    self.stats["errors"] += 1
+                    self.last_error = str(e)
+
+    def poll_once(self):
+        """Uma varredura da pasta; retorna quantas chaves foram descartadas."""
+        return self._scan(apply=True)
+
+    def _scan(self, apply):
+        changed = []
+        with os.scandir(self.directory) as it:
+            for item in it:
+                if not item.name.endswith(".json"):
+                    continue         # .lock e temporários (.tmp-*.part)
+                try:
+                    st = item.stat()
+                except FileNotFoundError:
+                    continue
+                stamp = (st.st_ino, st.st_mtime_ns)
+                with self._lock:
+                    if self._seen.get(item.name) == stamp:
+                        continue
+                    self._seen[item.name] = stamp
+                changed.append(item.path)
+
+        if not apply:
+            return 0
+
+        dropped = 0
+        for path in changed:
+            try:
+                with open(path, "rb") as f:
+                    event = json.loads(f.read())
+            except (OSError, ValueError):
+                continue             # removido no meio: uma versão nova volta na próxima varredura
+            if event.get("origin") == self.origin:
+                continue
+            dropped += self._apply(event)
+        return dropped
+
+    def _apply(self, event):
+        key, sha = event.get("key"), event.get("sha")
+        with self._lock:
+            self.stats["received"] += 1
+            stores = list(self._stores)
+
+        dropped = 0
+        for store in stores:
+            entry = store.peek(key)
+            if entry is None:
+                continue
+            if sha is None or entry.sha != sha:
+                store.invalidate(key)
+                dropped += 1
+        if dropped:
+            with self._lock:
+                self.stats["invalidated"] += dropped
+        return dropped
+
+    # ============================================================
+    # UTILITÁRIOS
+    # ============================================================
+    @staticmethod
+    def _file_name(key):
+        return hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json"
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Lock exclusivo entre processos (fcntl.flock) p/ as publicações."""
+        if fcntl is None:
+            with self._lock:
+                yield
+            return
+        with open(os.path.join(self.directory, LOCK_NAME), "a+b") as fh:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
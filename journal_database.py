@@ -0,0 +1,405 @@
+# journal_database.py — Modo diário (event sourcing): snapshot + eventos
+# upsert/delete viram UM arquivo pequeno no diário | Compactação periódica
+#
+#   dados.json                        snapshot compactado (mesmo formato de sempre)
+#   dados.journal/0000000042.json     evento {"seq", "at", "ops": [...]}
+#   dados.journal/compacted.json      {"format", "seq"}: último seq já no snapshot
+#
+# Um save custa o tamanho da ALTERAÇÃO, não do banco. A leitura é o snapshot
+# + os eventos da cauda, aplicados em ordem de seq; eventos são imutáveis e
+# ficam em cache por blob SHA. Quando a cauda passa do limite, um commit
+# único reescreve o snapshot e apaga os eventos incorporados. Cada evento é
+# um commit próprio: o git log do diário é o histórico por registro.
+#
+# Mesmo contrato do GitHubJSON. Não misture com o modo monolítico no mesmo
+# arquivo: quem grava direto no snapshot não enxerga a cauda do diário.
+
+import base64
+import hashlib
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import json_codec
+import metrics
+from github_database import GitHubJSON
+from record_merge import merge_records
+from shared_store import StoreEntry
+
+JOURNAL_FORMAT = "journal-v1"
+CURSOR_NAME = "compacted.json"
+
+# Eventos já parseados, por blob SHA (imutável) — compartilhado no processo
+_EVENT_CACHE = OrderedDict()
+_EVENT_CACHE_MAX = 5000
+_EVENT_CACHE_LOCK = threading.Lock()
+
+# Cauda vista na última leitura de cada diário (cache_key -> _Tail)
+_TAILS = {}
+_TAILS_LOCK = threading.Lock()
+
+
+def _cache_event(sha, event):
+    with _EVENT_CACHE_LOCK:
+        _EVENT_CACHE[sha] = event
+        _EVENT_CACHE.move_to_end(sha)
+        while len(_EVENT_CACHE) > _EVENT_CACHE_MAX:
+            _EVENT_CACHE.popitem(last=False)
+
+
+def _cached_event(sha):
+    with _EVENT_CACHE_LOCK:
+        return _EVENT_CACHE.get(sha)
+
+
+class _Tail:
+    """Eventos ainda fora do snapshot (ordem de seq) + cursor da compactação."""
+
+    __slots__ = ("items", "compacted_seq", "size")
+
+    def __init__(self, items=(), compacted_seq=0):
+        self.items = list(items)            # [{"seq", "path", "sha", "size"}]
+        self.compacted_seq = compacted_seq
+        self.size = sum(i["size"] for i in self.items)
+
+    @property
+    def last_seq(self):
+        return max([self.compacted_seq] + [i["seq"] for i in self.items])
+
+
+class _AlreadyCompacted(Exception):
+    """Outro processo incorporou os eventos antes: nada a fazer."""
+
+
+class JournaledGitHubJSON(GitHubJSON):
+    def __init__(
+        self,
+        token,
+        owner,
+        repo,
+        path="dados.json",
+        branch="main",
+        journal_dir=None,          # padrão: "<nome>.journal" ao lado do snapshot
+        compact_entries=50,        # compacta com esta quantidade de eventos...
+        compact_bytes=256 * 1024,  # ... ou com este tamanho de cauda
+        max_workers=8,             # GETs paralelos de eventos
+        **kwargs,
+    ):
+        super().__init__(token, owner, repo, path=path, branch=branch, **kwargs)
+        self.journal_dir = journal_dir or f"{os.path.splitext(path)[0]}.journal"
+        self.cursor_path = f"{self.journal_dir}/{CURSOR_NAME}"
+        self.compact_entries = compact_entries
+        self.compact_bytes = compact_bytes
+        self.max_workers = max_workers
+        # Estado montado (snapshot + cauda) tem chave própria; o snapshot
+        # sozinho usa a chave de sempre (GET condicional via self._snapshot_db)
+        snapshot_key = self.cache_key
+        self.cache_key = f"{snapshot_key}+journal"
+        self._snapshot_db = GitHubJSON(
+            token, owner, repo, path=path, branch=branch,
+            store=self.store, timeout=self.timeout, session=self.session,
+            api_base=self.api_base,
+        )
+        self.stats.update({"events": 0, "compactions": 0, "compaction_errors": 0})
+
+    def _event_path(self, seq):
+        return f"{self.journal_dir}/{seq:010d}.json"
+
+    # ============================================================
+    # LOAD — snapshot (GET condicional) + eventos da cauda
+    # ============================================================
+    @metrics.timed("github.fetch")
+    def _fetch(self, prev):
+        # Cauda deste processo desconhecida (ex.: snapshot de disco): lista inteira
+        with _TAILS_LOCK:
+            known = self.cache_key in _TAILS
+        etag = prev.etag if prev is not None and known else None
+        r = self._get_contents(self.journal_dir, etag=etag)
+        if r.status_code == 304:
+            listing_changed, etag = False, prev.etag
+        elif r.status_code == 404:
+            listing_changed, etag = True, None
+            self._set_tail(_Tail())
+        elif r.status_code == 200:
+            listing_changed, etag = True, r.headers.get("ETag")
+            self._set_tail(self._read_tail(r.json()))
+        else:
+            raise Exception(f"GitHub GET error ({self.journal_dir}): {r.status_code} - {r.text}")
+
+        snap_data, snap_sha = self._snapshot_db.load(force=True)
+        tail = self._tail()
+        version = hashlib.sha1(
+            "\n".join([str(snap_sha)] + [f"{i['seq']}:{i['sha']}" for i in tail.items]).encode("utf-8")
+        ).hexdigest()
+
+        if not listing_changed:
+            self.stats["not_modified"] += 1
+            if prev.sha == version:
+                return StoreEntry(prev.data, prev.sha, prev.etag)
+
+        events = [_cached_event(i["sha"]) for i in tail.items]
+        entry = StoreEntry(self._replay(snap_data, events), version, etag)
+        self._write_snapshot(entry)
+        return entry
+
+    def _read_tail(self, listing):
+        items, cursor = [], None
+        for item in listing:
+            name = item.get("name", "")
+            if item.get("type") != "file" or not name.endswith(".json"):
+                continue
+            if name == CURSOR_NAME:
+                cursor = item
+                continue
+            try:
+                seq = int(name[:-5])
+            except ValueError:
+                continue
+            items.append({"seq": seq, "path": item["path"], "sha": item["sha"], "size": item.get("size") or 0})
+        items.sort(key=lambda i: i["seq"])
+
+        missing = [i for i in items + ([cursor] if cursor else []) if _cached_event(i["sha"]) is None]
+        if missing:
+            workers = max(1, min(self.max_workers, len(missing)))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(self._fetch_event, missing))
+
+        compacted_seq = 0
+        if cursor is not None:
+            compacted_seq = int((_cached_event(cursor["sha"]) or {}).get("seq") or 0)
+        return _Tail(items, compacted_seq)
+
+    def _fetch_event(self, item):
+        r = self._get_contents(item["path"])
+        if r.status_code != 200:
+            raise Exception(f"GitHub GET error ({item['path']}): {r.status_code} - {r.text}")
+        body = r.json()
+        try:
+            event = json_codec.decode(base64.b64decode(body.get("content") or ""))
+        except ValueError:
+            event = None
+        # Evento ilegível vira {} (sem ops): não derruba a leitura
+        _cache_event(body.get("sha") or item["sha"], event if isinstance(event, dict) else {})
+
+    @staticmethod
+    def _replay(snapshot, events):
+        """Aplica as ops dos eventos (em ordem) sobre a lista do snapshot."""
+        by_id, loose = {}, []
+        for rec in snapshot if isinstance(snapshot, list) else []:
+            if isinstance(rec, dict) and rec.get("id") not in (None, ""):
+                by_id[str(rec["id"])] = rec
+            else:
+                loose.append(rec)
+        for event in events:
+            for op in (event or {}).get("ops") or []:
+                rid = str(op.get("id"))
+                if op.get("op") == "upsert" and isinstance(op.get("record"), dict):
+                    by_id[rid] = op["record"]
+                elif op.get("op") == "delete":
+                    by_id.pop(rid, None)
+        return json_codec.canonical_records(list(by_id.values()) + loose)
+
+    def _tail(self):
+        with _TAILS_LOCK:
+            return _TAILS.get(self.cache_key) or _Tail()
+
+    def _set_tail(self, tail):
+        with _TAILS_LOCK:
+            _TAILS[self.cache_key] = tail
+
+    # ============================================================
+    # ESCRITA — um evento (arquivo novo) por operação/lote
+    # ============================================================
+    @metrics.timed("github.save")
+    def save(self, new_data, retries=8, commit_message=None, base=None):
+        if not isinstance(new_data, list):
+            raise ValueError("new_data deve ser uma lista JSON serializável.")
+        new_data = self._externalize(new_data)
+        for rec in new_data:
+            if not isinstance(rec, dict) or rec.get("id") in (None, ""):
+                raise ValueError("Cada registro precisa ser um dict com 'id'.")
+
+        def _ops(current):
+            data = new_data
+            if base is not None and current != base[0]:
+                # Edições feitas por outras sessões desde o load() do chamador
+                data = merge_records(base[0], new_data, current, path=self.path)
+                self.stats["merges"] += 1
+            current_by_id = {str(r.get("id")): r for r in current if isinstance(r, dict)}
+            new_by_id = {str(r.get("id")): r for r in data}
+            ops = [
+                {"op": "upsert", "id": rid, "record": rec}
+                for rid, rec in new_by_id.items() if current_by_id.get(rid) != rec
+            ]
+            ops += [{"op": "delete", "id": rid} for rid in current_by_id if rid not in new_by_id]
+            return ops
+
+        return self._append(_ops, commit_message, retries)
+
+    def upsert(self, record, commit_message=None, expected=None, create=False):
+        if self.write_behind:
+            return super().upsert(record, commit_message=commit_message, expected=expected, create=create)
+        if not isinstance(record, dict) or record.get("id") in (None, ""):
+            raise ValueError("record deve ser um dict com 'id'.")
+        rid = str(record.get("id"))
+        record = self._externalize([record])[0]
+
+        def _ops(current):
+            found = next((r for r in current if str(r.get("id")) == rid), None)
+            if expected is not None or create:
+                self._check_expected(record, expected, found)
+            if found == record:
+                return []
+            return [{"op": "upsert", "id": rid, "record": record}]
+
+        return self._append(_ops, commit_message)
+
+    def delete(self, record_id, commit_message=None):
+        if self.write_behind:
+            return super().delete(record_id, commit_message=commit_message)
+        rid = str(record_id)
+
+        def _ops(current):
+            if not any(str(r.get("id")) == rid for r in current):
+                return []
+            return [{"op": "delete", "id": rid}]
+
+        return self._append(_ops, commit_message)
+
+    def _append(self, build_ops, commit_message=None, retries=8):
+        """
+        Cria o próximo arquivo de evento (sha=None: 422 se o seq já foi
+        usado por outro escritor -> relê a cauda e tenta o seq seguinte).
+        """
+        msg = commit_message or self.DEFAULT_COMMIT_MESSAGE
+        for attempt in range(retries):
+            current, _ = self.load(force=True)
+            ops = build_ops(current)
+            if not ops:
+                return True
+
+            seq = self._tail().last_seq + 1
+            event = {"seq": seq, "at": time.time(), "ops": ops}
+            raw = json_codec.encode(event)
+            r = self._put_contents(raw, None, msg, path=self._event_path(seq))
+
+            if r.status_code in (200, 201):
+                sha = r.json()["content"]["sha"]
+                _cache_event(sha, event)
+                # Cauda local já inclui o evento novo (limite de compactação)
+                tail = self._tail()
+                item = {"seq": seq, "path": self._event_path(seq), "sha": sha, "size": len(raw)}
+                self._set_tail(_Tail(tail.items + [item], tail.compacted_seq))
+                self.stats["events"] += 1
+                self.invalidate()
+                # Versão do conjunto sai da listagem: os outros workers descartam
+                self._publish(None)
+                self._maybe_compact()
+                return True
+
+            if r.status_code == 422:
+                # Seq ocupado: outro escritor chegou antes
+                self.stats["conflicts"] += 1
+                time.sleep(random.random() * min(1.0, 0.05 * (2 ** attempt)))
+                continue
+
+            if self._retry_wait(r, attempt):
+                continue
+            raise Exception(f"GitHub PUT error: {r.status_code} - {r.text}")
+
+        raise TimeoutError("Falha ao gravar o evento após múltiplas tentativas.")
+
+    # ============================================================
+    # COMPACTAÇÃO — snapshot novo + remoção dos eventos, em UM commit
+    # ============================================================
+    def _maybe_compact(self):
+        tail = self._tail()
+        if len(tail.items) < self.compact_entries and tail.size < self.compact_bytes:
+            return
+        try:
+            self.compact()
+        except Exception:
+            # O evento já está gravado: compactação fica p/ a próxima escrita
+            self.stats["compaction_errors"] += 1
+
+    def compact(self, commit_message=None):
+        """
+        Incorpora a cauda atual ao snapshot. Retorna False se não havia o
+        que compactar (ou se outro processo já compactou esses eventos).
+        """
+        self.load(force=True)
+        tail = self._tail()
+        if not tail.items:
+            return False
+        events = [_cached_event(i["sha"]) for i in tail.items]
+        last_seq = tail.items[-1]["seq"]
+
+        def _fold(raw):
+            try:
+                snapshot = json_codec.decode(raw) if raw else []
+            except ValueError:
+                # Snapshot ilegível: não recompacta por cima (perderia a base)
+                raise Exception(f"Snapshot ilegível em {self.path}: compactação abortada.")
+            return json_codec.encode(self._replay(snapshot, events), self.compression)
+
+        def _drop(raw):
+            if raw is None:
+                raise _AlreadyCompacted()
+            return None
+
+        msg = commit_message or f"Compactação do diário {self.journal_dir} (até seq {last_seq})"
+        tx = self.transaction(msg)
+        tx.update(self.path, _fold)
+        for item in tail.items:
+            tx.update(item["path"], _drop)
+        tx.update(
+            self.cursor_path,
+            lambda raw: json_codec.encode({"format": JOURNAL_FORMAT, "seq": last_seq}),
+        )
+        try:
+            tx.commit()
+        except _AlreadyCompacted:
+            return False
+        finally:
+            self.invalidate()
+            with _TAILS_LOCK:
+                _TAILS.pop(self.cache_key, None)
+        self.stats["compactions"] += 1
+        self._publish(None)
+        return True
+
+    # ============================================================
+    # HISTÓRICO — eventos da cauda por registro
+    # ============================================================
+    def history(self, record_id):
+        """
+        Alterações do registro ainda no diário (mais recente primeiro):
+        [{"seq", "at", "op", "record"}]. As já compactadas estão no git log
+        de <journal_dir>/.
+        """
+        self.load()
+        rid = str(record_id)
+        out = []
+        for item in self._tail().items:
+            event = _cached_event(item["sha"]) or {}
+            for op in event.get("ops") or []:
+                if str(op.get("id")) == rid:
+                    out.append({
+                        "seq": event.get("seq", item["seq"]),
+                        "at": event.get("at"),
+                        "op": op.get("op"),
+                        "record": op.get("record"),
+                    })
+        return out[::-1]
+
+    def journal_stats(self):
+        tail = self._tail()
+        return {
+            "tail_events": len(tail.items),
+            "tail_bytes": tail.size,
+            "compacted_seq": tail.compacted_seq,
+            "last_seq": tail.last_seq,
+        }
@@ -0,0 +1,130 @@
+# json_codec.py — Serialização canônica (e opcionalmente comprimida) das bases
+# Chaves ordenadas | Separadores compactos | Registros ordenados por "id"
+# Um registro por linha: diff do git mostra só os registros que mudaram
+#
+# Os mesmos dados geram SEMPRE os mesmos bytes, venham de qual caminho vierem
+# (save, update, migração, backend local). Compressão opcional (gzip/zstd):
+# o load reconhece o formato pelos bytes mágicos, sem configuração.
+
+import gzip
+import io
+import json
+
+try:
+    import zstandard
+except ImportError:          # opcional: só necessário p/ compression="zstd"
+    zstandard = None
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+COMPRESSIONS = (None, "gzip", "zstd")
+
+
+def record_sort_key(record):
+    """Ids numéricos em ordem numérica; demais ids depois, como texto."""
+    rid = record.get("id") if isinstance(record, dict) else None
+    try:
+        return (0, int(rid), "")
+    except (TypeError, ValueError):
+        return (1 if rid not in (None, "") else 2, 0, str(rid))
+
+
+def canonical_records(records):
+    """Cópia da lista na ordem canônica (estável p/ ids repetidos/ausentes)."""
+    return sorted(records, key=record_sort_key)
+
+
+def dumps_compact(value):
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+# ============================================================
+# ENCODE — bytes canônicos (+ compressão opcional)
+# ============================================================
+def encode(data, compression=None):
+    if isinstance(data, list):
+        if data:
+            # Bytes por registro + um único join: sem str intermediária do arquivo
+            parts = [b"[\n"]
+            for i, rec in enumerate(canonical_records(data)):
+                if i:
+                    parts.append(b",\n")
+                parts.append(dumps_compact(rec).encode("utf-8"))
+            parts.append(b"\n]\n")
+            raw = b"".join(parts)
+            del parts
+        else:
+            raw = b"[]\n"
+    else:
+        raw = (dumps_compact(data) + "\n").encode("utf-8")
+    return compress(raw, compression)
+
+
+def compress(raw, compression=None):
+    if compression in (None, "", "none"):
+        return raw
+    if compression == "gzip":
+        # mtime=0: mesmo conteúdo -> mesmos bytes (e mesmo blob SHA)
+        return gzip.compress(raw, compresslevel=9, mtime=0)
+    if compression == "zstd":
+        if zstandard is None:
+            raise Exception("compression='zstd' requer o pacote zstandard (pip install zstandard).")
+        return zstandard.ZstdCompressor(level=19).compress(raw)
+    raise ValueError(f"Compressão desconhecida: {compression!r} (use None, 'gzip' ou 'zstd').")
+
+
+# ============================================================
+# DECODE — detecta o formato pelos bytes mágicos
+# ============================================================
+def detect(raw):
+    if raw[:2] == GZIP_MAGIC:
+        return "gzip"
+    if raw[:4] == ZSTD_MAGIC:
+        return "zstd"
+    return None
+
+
+def decompress(raw):
+    kind = detect(raw)
+    if kind == "gzip":
+        return gzip.decompress(raw)
+    if kind == "zstd":
+        if zstandard is None:
+            # Não é "JSON inválido": nunca deixar o auto-healing zerar a base
+            raise Exception("Arquivo comprimido com zstd: instale o pacote zstandard.")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(raw)
+    return raw
+
+
+def decode_text(raw):
+    """bytes (puros ou comprimidos) -> str. ValueError se ilegível."""
+    try:
+        return decompress(raw).decode("utf-8-sig")
+    except (OSError, EOFError, UnicodeDecodeError) as e:
+        raise ValueError(f"conteúdo ilegível: {e}")
+
+
+def loads(text):
+    return json.loads(text) if text.strip() else []
+
+
+def decode(raw):
+    """
+    bytes -> objeto JSON. ValueError se o conteúdo não for JSON válido.
+    Bytes vazios/só espaços -> [].
+    """
+    return loads(decode_text(raw))
+
+
+def load_stream(fp):
+    """Como decode(), mas lendo de um arquivo/stream (ex.: resposta HTTP crua)."""
+    if not hasattr(fp, "peek"):
+        fp = io.BufferedReader(fp)
+    kind = detect(fp.peek(4)[:4])
+    if kind == "gzip":
+        fp = gzip.GzipFile(fileobj=fp)
+    elif kind == "zstd":
+        if zstandard is None:
+            raise Exception("Arquivo comprimido com zstd: instale o pacote zstandard.")
+        fp = zstandard.ZstdDecompressor().stream_reader(fp)
+    return json.load(io.TextIOWrapper(fp, encoding="utf-8-sig"))
@@ -0,0 +1,435 @@
+# local_database.py — Backends locais com o mesmo contrato do GitHubJSON
+# load/save/update/upsert/delete/init_if_missing/repair_if_invalid/invalidate
+#
+#   LocalJSON   -> arquivo JSON em disco (troca atômica + lock de arquivo)
+#   SQLiteJSON  -> SQLite em modo WAL, uma linha por registro
+#
+# Servem p/ instalação local (on-prem), desenvolvimento sem token e testes /
+# benchmarks sem rede. Leituras repetidas custam um stat() (arquivo) ou um
+# SELECT da versão (SQLite): a lista parseada fica em cache no processo.
+
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+import json_codec
+from github_database import atomic_write_bytes
+from record_merge import MergeConflict, merge_records
+
+try:
+    import fcntl
+except ImportError:           # Windows: só o lock entre threads
+    fcntl = None
+
+# Listas já parseadas — compartilhadas no processo (não mutar no lugar)
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+# Lock entre threads do processo, por arquivo (o fcntl cobre outros processos)
+_PATH_LOCKS = {}
+
+
+def _path_lock(path):
+    with _CACHE_LOCK:
+        return _PATH_LOCKS.setdefault(path, threading.RLock())
+
+
+class _LocalJSONBase:
+    """Operações por registro comuns aos backends locais."""
+
+    def __init__(self, blob_store=None, derived=None):
+        self.blob_store = blob_store
+        self.derived = derived
+        self.stats = {"reads": 0, "cache_hits": 0, "writes": 0, "merges": 0}
+
+    # ============================================================
+    # UPSERT / DELETE — mesma semântica do GitHubJSON
+    # ============================================================
+    def upsert(self, record, commit_message=None, expected=None, create=False):
+        """
+        Insere ou substitui o registro com o mesmo "id".
+        expected: o registro como o chamador o leu (MergeConflict se mudou).
+        create: registro novo (MergeConflict se o id já existe).
+        """
+        if not isinstance(record, dict) or record.get("id") in (None, ""):
+            raise ValueError("record deve ser um dict com 'id'.")
+        rid = str(record.get("id"))
+        record = self._externalize([record])[0]
+
+        def _apply(data):
+            if expected is not None or create:
+                current = next((r for r in data if str(r.get("id")) == rid), None)
+                self._check_expected(record, expected, current)
+            if any(str(r.get("id")) == rid for r in data):
+                return [record if str(r.get("id")) == rid else r for r in data]
+            return data + [record]
+
+        return self.update(_apply, commit_message=commit_message)
+
+    def delete(self, record_id, commit_message=None):
+        """
+        Remove o registro cujo "id" == record_id (sem erro se não existir).
+        """
+        rid = str(record_id)
+
+        def _apply(data):
+            return [r for r in data if str(r.get("id")) != rid]
+
+        return self.update(_apply, commit_message=commit_message)
+
+    def _check_expected(self, record, expected, current):
+        if current != expected and current != record:
+            raise MergeConflict(
+                [{"id": record.get("id"), "base": expected, "ours": record, "theirs": current}],
+                path=self.path,
+            )
+
+    def _merge_base(self, new_data, base, current, current_sha):
+        """Mescla new_data com o que mudou desde base (ou devolve new_data)."""
+        if base is None or base[1] == current_sha:
+            return new_data
+        self.stats["merges"] += 1
+        return merge_records(base[0], new_data, current, path=self.path)
+
+    def _externalize(self, records):
+        if self.blob_store is not None:
+            records = [self.blob_store.extract_record(r) for r in records]
+        if self.derived is not None:
+            self.derived.refresh(records)
+        return records
+
+    # ============================================================
+    # UTILITÁRIOS
+    # ============================================================
+    def invalidate(self):
+        """Descarta a lista em cache (a próxima leitura vai ao disco)."""
+        with _CACHE_LOCK:
+            _CACHE.pop(self.cache_key, None)
+
+    def cache_stats(self):
+        return dict(self.stats)
+
+    def init_if_missing(self, initial=None):
+        """
+        Cria a base vazia ([]) se não existir.
+        """
+        _, sha = self.load(force=True)
+        if sha is None:
+            return self.save(initial if isinstance(initial, list) else [])
+        return True
+
+    def repair_if_invalid(self):
+        """
+        Se a base existir mas estiver inválida, salva [].
+        """
+        try:
+            data, _ = self.load(force=True)
+            if not isinstance(data, list):
+                return self.save([])
+            return True
+        except Exception:
+            return self.save([])
+
+
+# ============================================================
+# ARQUIVO JSON LOCAL
+# ============================================================
+class LocalJSON(_LocalJSONBase):
+    def __init__(self, root, path="dados.json", blob_store=None, compression=None, derived=None):
+        super().__init__(blob_store=blob_store, derived=derived)
+        if compression not in json_codec.COMPRESSIONS:
+            raise ValueError(f"compression inválida: {compression!r}")
+        self.compression = compression
+        self.root = root
+        self.path = path
+        self.file_path = os.path.abspath(os.path.join(root, path))
+        self.lock_path = self.file_path + ".lock"
+        self.cache_key = f"file:{self.file_path}"
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Lock exclusivo entre threads e entre processos (fcntl.flock)."""
+        with _path_lock(self.file_path):
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+            with open(self.lock_path, "a+b") as fh:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+    # ============================================================
+    # LOAD — stat() decide se o cache ainda vale
+    # ============================================================
+    def load(self, force=False):
+        """
+        Retorna (lista, sha). sha = SHA-1 do conteúdo (None se não existe).
+        """
+        try:
+            st = os.stat(self.file_path)
+        except FileNotFoundError:
+            return [], None
+        stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+
+        with _CACHE_LOCK:
+            cached = _CACHE.get(self.cache_key)
+        if cached is not None and cached[0] == stamp:
+            self.stats["cache_hits"] += 1
+            return cached[1], cached[2]
+
+        with open(self.file_path, "rb") as f:
+            raw = f.read()
+        self.stats["reads"] += 1
+        try:
+            data = json_codec.decode(raw)
+        except ValueError:
+            data = []   # Auto-healing: arquivo ilegível vira base vazia
+        if not isinstance(data, list):
+            data = []
+        sha = hashlib.sha1(raw).hexdigest()
+
+        with _CACHE_LOCK:
+            _CACHE[self.cache_key] = (stamp, data, sha)
+        return data, sha
+
+    # ============================================================
+    # SAVE / UPDATE — sob lock, com troca atômica do arquivo
+    # ============================================================
+    def save(self, new_data, retries=8, commit_message=None, base=None):
+        if not isinstance(new_data, list):
+            raise ValueError("new_data deve ser uma lista JSON serializável.")
+        new_data = self._externalize(new_data)
+
+        with self._locked():
+            current, current_sha = self.load()
+            self._write(self._merge_base(new_data, base, current, current_sha))
+        return True
+
+    def update(self, update_fn, retries=8, commit_message=None):
+        if not callable(update_fn):
+            raise ValueError("update_fn deve ser uma função (callable).")
+
+        with self._locked():
+            data, _ = self.load()
+            try:
+                new_data = update_fn(list(data))
+            except MergeConflict:
+                raise
+            except Exception as e:
+                raise Exception(f"update_fn falhou: {e}")
+            if not isinstance(new_data, list):
+                raise ValueError("update_fn deve retornar uma lista JSON serializável.")
+            self._write(new_data)
+        return True
+
+    def _write(self, data):
+        raw = json_codec.encode(data, self.compression)
+        atomic_write_bytes(self.file_path, raw)
+        st = os.stat(self.file_path)
+        sha = hashlib.sha1(raw).hexdigest()
+        data = json_codec.canonical_records(data)
+        with _CACHE_LOCK:
+            _CACHE[self.cache_key] = ((st.st_mtime_ns, st.st_size, st.st_ino), data, sha)
+        self.stats["writes"] += 1
+
+
+# ============================================================
+# SQLITE — uma linha por registro (WAL: leitores não bloqueiam escrita)
+# ============================================================
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    collection TEXT NOT NULL,
+    id         TEXT NOT NULL,
+    pos        INTEGER NOT NULL,
+    body       TEXT NOT NULL,
+    PRIMARY KEY (collection, id)
+);
+CREATE TABLE IF NOT EXISTS versions (
+    collection TEXT PRIMARY KEY,
+    version    INTEGER NOT NULL
+);
+"""
+
+# Uma conexão por thread e por arquivo (sqlite3 não compartilha entre threads)
+_CONNS = threading.local()
+
+
+class SQLiteJSON(_LocalJSONBase):
+    def __init__(self, db_file, path="dados.json", blob_store=None, busy_timeout=10.0, derived=None):
+        super().__init__(blob_store=blob_store, derived=derived)
+        self.db_file = os.path.abspath(db_file)
+        self.path = path                      # nome da coleção (ex.: "dados.json")
+        self.busy_timeout = float(busy_timeout)
+        self.cache_key = f"sqlite:{self.db_file}:{path}"
+
+    def _conn(self):
+        conns = getattr(_CONNS, "by_file", None)
+        if conns is None:
+            conns = _CONNS.by_file = {}
+        conn = conns.get(self.db_file)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+            # isolation_level=None: transações explícitas (BEGIN IMMEDIATE)
+            conn = sqlite3.connect(self.db_file, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            conns[self.db_file] = conn
+        return conn
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _version(self, conn):
+        row = conn.execute(
+            "SELECT version FROM versions WHERE collection = ?", (self.path,)
+        ).fetchone()
+        return str(row[0]) if row else None
+
+    def _bump(self, conn):
+        conn.execute(
+            "INSERT INTO versions (collection, version) VALUES (?, 1) "
+            "ON CONFLICT(collection) DO UPDATE SET version = version + 1",
+            (self.path,),
+        )
+        self.stats["writes"] += 1
+
+    def _rows(self, conn):
+        return conn.execute(
+            "SELECT id, pos, body FROM records WHERE collection = ? ORDER BY pos",
+            (self.path,),
+        ).fetchall()
+
+    # ============================================================
+    # LOAD — versão da coleção decide se o cache ainda vale
+    # ============================================================
+    def load(self, force=False):
+        """
+        Retorna (lista, sha). sha = versão da coleção (None se não existe).
+        """
+        conn = self._conn()
+        version = self._version(conn)
+
+        with _CACHE_LOCK:
+            cached = _CACHE.get(self.cache_key)
+        if cached is not None and cached[0] == version:
+            self.stats["cache_hits"] += 1
+            return cached[1], version
+
+        data = self._read_all(conn)
+        with _CACHE_LOCK:
+            _CACHE[self.cache_key] = (version, data)
+        return data, version
+
+    def _read_all(self, conn):
+        self.stats["reads"] += 1
+        data = []
+        for _, _, body in self._rows(conn):
+            try:
+                data.append(json.loads(body))
+            except ValueError:
+                continue    # Linha ilegível: ignorada (não derruba a base)
+        return data
+
+    # ============================================================
+    # SAVE / UPDATE — grava só as linhas que mudaram
+    # ============================================================
+    def save(self, new_data, retries=8, commit_message=None, base=None):
+        if not isinstance(new_data, list):
+            raise ValueError("new_data deve ser uma lista JSON serializável.")
+        new_data = self._externalize(new_data)
+
+        with self._transaction() as conn:
+            version = self._version(conn)
+            current = self._read_all(conn) if base is not None and base[1] != version else None
+            if current is not None:
+                new_data = self._merge_base(new_data, base, current, version)
+            self._write_rows(conn, new_data)
+        return True
+
+    def update(self, update_fn, retries=8, commit_message=None):
+        if not callable(update_fn):
+            raise ValueError("update_fn deve ser uma função (callable).")
+
+        with self._transaction() as conn:
+            data = self._read_all(conn)
+            try:
+                new_data = update_fn(list(data))
+            except MergeConflict:
+                raise
+            except Exception as e:
+                raise Exception(f"update_fn falhou: {e}")
+            if not isinstance(new_data, list):
+                raise ValueError("update_fn deve retornar uma lista JSON serializável.")
+            self._write_rows(conn, new_data)
+        return True
+
+    def upsert(self, record, commit_message=None, expected=None, create=False):
+        """
+        Uma linha só: não lê nem regrava a coleção inteira.
+        """
+        if not isinstance(record, dict) or record.get("id") in (None, ""):
+            raise ValueError("record deve ser um dict com 'id'.")
+        rid = str(record.get("id"))
+        record = self._externalize([record])[0]
+        body = json_codec.dumps_compact(record)
+
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT body FROM records WHERE collection = ? AND id = ?", (self.path, rid)
+            ).fetchone()
+            if expected is not None or create:
+                self._check_expected(record, expected, json.loads(row[0]) if row else None)
+            if row is not None:
+                conn.execute(
+                    "UPDATE records SET body = ? WHERE collection = ? AND id = ?",
+                    (body, self.path, rid),
+                )
+            else:
+                conn.execute(
+                    "INSERT INTO records (collection, id, pos, body) VALUES "
+                    "(?, ?, (SELECT COALESCE(MAX(pos), -1) + 1 FROM records WHERE collection = ?), ?)",
+                    (self.path, rid, self.path, body),
+                )
+            self._bump(conn)
+        return True
+
+    def delete(self, record_id, commit_message=None):
+        with self._transaction() as conn:
+            conn.execute(
+                "DELETE FROM records WHERE collection = ? AND id = ?", (self.path, str(record_id))
+            )
+            self._bump(conn)
+        return True
+
+    def _write_rows(self, conn, data):
+        existing = {rid: (pos, body) for rid, pos, body in self._rows(conn)}
+        seen = set()
+        for pos, rec in enumerate(data):
+            if not isinstance(rec, dict) or rec.get("id") in (None, ""):
+                raise ValueError("Cada registro precisa ser um dict com 'id'.")
+            rid = str(rec.get("id"))
+            seen.add(rid)
+            body = json_codec.dumps_compact(rec)
+            if existing.get(rid) != (pos, body):
+                conn.execute(
+                    "INSERT OR REPLACE INTO records (collection, id, pos, body) VALUES (?, ?, ?, ?)",
+                    (self.path, rid, pos, body),
+                )
+        for rid in existing.keys() - seen:
+            conn.execute("DELETE FROM records WHERE collection = ? AND id = ?", (self.path, rid))
+        self._bump(conn)
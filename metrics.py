@@ -0,0 +1,228 @@
+# metrics.py — Timers/contadores dos caminhos quentes (por processo)
+# Histogramas com buckets fixos | Exportação no formato texto do Prometheus
+# Desligado por padrão: o custo é um "if" por chamada instrumentada
+#
+# Responde "a página está lenta por quê?": I/O do GitHub, sanitize_text,
+# wrap_text ou a renderização do fpdf. Cada função decorada com @timed
+# entra num histograma próprio; o painel do app e o arquivo .prom leem daqui.
+
+import functools
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "faturamento"
+
+# Limites superiores (s) dos buckets — de 0,1 ms a 30 s
+BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+_enabled = False
+_lock = threading.Lock()
+_histograms = {}     # nome -> Histogram
+_counters = {}       # nome -> int
+_exporter = None
+
+
+class Histogram:
+    """Contagem cumulativa por bucket + soma, como no Prometheus."""
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)   # último = +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Estimativa pelo limite superior do bucket (como histogram_quantile)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        acc = 0
+        for i, n in enumerate(self.counts):
+            acc += n
+            if acc >= target:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+        return self.max
+
+
+# ============================================================
+# LIGA / DESLIGA
+# ============================================================
+def enable(flag=True):
+    global _enabled
+    _enabled = bool(flag)
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+# ============================================================
+# COLETA
+# ============================================================
+def observe(name, seconds):
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = Histogram()
+        hist.observe(seconds)
+
+
+def inc(name, n=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def timed(name):
+    """Decorator: mede cada chamada em `name` (erros também contam)."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def timer(name):
+    if not _enabled:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+
+# ============================================================
+# LEITURA / EXPORTAÇÃO
+# ============================================================
+def snapshot():
+    """Uma linha por métrica (ms), ordenada pelo tempo total gasto."""
+    with _lock:
+        rows = [
+            {
+                "operacao": name,
+                "chamadas": h.count,
+                "total_ms": h.sum * 1000.0,
+                "media_ms": (h.sum / h.count) * 1000.0 if h.count else 0.0,
+                "p50_ms": h.quantile(0.5) * 1000.0,
+                "p90_ms": h.quantile(0.9) * 1000.0,
+                "p99_ms": h.quantile(0.99) * 1000.0,
+                "max_ms": h.max * 1000.0,
+            }
+            for name, h in _histograms.items()
+        ]
+        counters = dict(_counters)
+    rows.sort(key=lambda row: row["total_ms"], reverse=True)
+    return rows, counters
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def to_prometheus():
+    """Texto no formato de exposição do Prometheus (version 0.0.4)."""
+    with _lock:
+        hists = {name: (list(h.counts), h.count, h.sum) for name, h in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    if hists:
+        metric = f"{PREFIX}_duration_seconds"
+        lines.append(f"# HELP {metric} Duração das operações instrumentadas.")
+        lines.append(f"# TYPE {metric} histogram")
+        for name in sorted(hists):
+            counts, count, total = hists[name]
+            op = _label(name)
+            acc = 0
+            for bound, n in zip(BUCKETS, counts):
+                acc += n
+                lines.append(f'{metric}_bucket{{op="{op}",le="{bound}"}} {acc}')
+            lines.append(f'{metric}_bucket{{op="{op}",le="+Inf"}} {count}')
+            lines.append(f'{metric}_sum{{op="{op}"}} {total}')
+            lines.append(f'{metric}_count{{op="{op}"}} {count}')
+    if counters:
+        metric = f"{PREFIX}_events_total"
+        lines.append(f"# HELP {metric} Contadores de eventos.")
+        lines.append(f"# TYPE {metric} counter")
+        for name in sorted(counters):
+            lines.append(f'{metric}{{name="{_label(name)}"}} {counters[name]}')
+    return "\n".join(lines) + "\n"
+
+
+def dump(path):
+    """Grava o texto Prometheus (troca atômica: o coletor nunca lê pela metade)."""
+    # Sem importar github_database (que é instrumentado com este módulo)
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=folder, prefix=".tmp-", suffix=".prom")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(to_prometheus().encode("utf-8"))
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def start_exporter(path, interval=15.0):
+    """
+    Thread que regrava `path` a cada intervalo (uma por processo).
+    "{pid}" no caminho separa os arquivos de vários workers.
+    """
+    global _exporter
+    path = path.format(pid=os.getpid())
+    with _lock:
+        if _exporter is not None and _exporter.is_alive():
+            return path
+
+        def _run():
+            while True:
+                time.sleep(interval)
+                if not _enabled:
+                    continue
+                try:
+                    dump(path)
+                except OSError:
+                    pass    # pasta sumiu/sem permissão: tenta no próximo ciclo
+
+        _exporter = threading.Thread(target=_run, daemon=True)
+        _exporter.start()
+    return path
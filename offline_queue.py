@@ -0,0 +1,380 @@
+# offline_queue.py — Write-ahead log local p/ upsert/delete (GitHub fora do ar)
+# Grava em disco ANTES do commit remoto | Replayer em ordem, em segundo plano
+# Leituras já enxergam o que está pendente | Conflitos ficam guardados
+#
+# Antes, com o GitHub fora/limitado, o save() levantava exceção depois dos
+# retries e o usuário perdia o formulário inteiro (inclusive Observações
+# longas do Quill). Aqui cada mutação vira um arquivo em <pasta>/; uma thread
+# publica os arquivos em ordem pelo upsert/delete normal do banco (que já
+# mescla com a versão remota mais recente e confere `expected`). O chamador
+# espera no máximo `sync_wait` segundos: se não deu, a edição segue na fila.
+#
+#   <pasta>/<ns>-<pid>-<n>.json     mutação pendente {"op", "record"|"id", ...}
+#   <pasta>/conflicts/<nome>.json   mutação recusada (conflito/erro de dados)
+#
+# Falha de rede/servidor (conexão, timeout, 5xx, rate limit esgotado) mantém
+# a mutação na fila. Falha que nunca vai passar (4xx, dado inválido) é
+# guardada em conflicts/ na hora; erro desconhecido, após MAX_ATTEMPTS
+# tentativas — uma mutação ruim não trava as de trás para sempre.
+
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import json_codec
+from github_database import atomic_write_bytes
+from record_merge import MergeConflict
+
+try:
+    import fcntl
+except ImportError:           # Windows: só o lock entre threads
+    fcntl = None
+
+QUEUED = "queued"   # retorno de upsert/delete quando a mutação ficou na fila
+
+# Erro desconhecido: quantas tentativas antes de guardar a mutação em conflicts/
+MAX_ATTEMPTS = 8
+
+# Status HTTP nas mensagens dos bancos ("GitHub PUT error (<caminho>): 401 - ...")
+_HTTP_STATUS = re.compile(r"error(?: \([^)]*\))?: (\d{3}) - ")
+
+# Uma fila por arquivo (cache_key do banco), compartilhada no processo
+_QUEUES = {}
+_QUEUES_LOCK = threading.Lock()
+
+
+class RejectedMutation(ValueError):
+    """Mutação da fila inválida em si (operação/registro): nunca vai passar."""
+
+
+def classify_error(error):
+    """
+    "rejected" (nunca vai passar), "transient" (rede/servidor: tenta de
+    novo) ou "unknown". 409/422/rate limit já são tratados pelo banco: um
+    4xx que chega aqui é definitivo (credencial, repositório, caminho...).
+    """
+    if isinstance(error, (MergeConflict, RejectedMutation, TypeError)):
+        return "rejected"
+    if isinstance(error, json.JSONDecodeError):
+        return "transient"      # resposta truncada
+    if isinstance(error, ValueError):
+        return "rejected"       # limite de tamanho, registro inválido
+    if isinstance(error, (TimeoutError, OSError)):
+        return "transient"      # inclui requests.RequestException
+    match = _HTTP_STATUS.search(str(error))
+    if match:
+        return "rejected" if 400 <= int(match.group(1)) < 500 else "transient"
+    return "unknown"
+
+
+def get_offline_queue(db, directory, retry_interval=5.0):
+    with _QUEUES_LOCK:
+        queue = _QUEUES.get(db.cache_key)
+        if queue is None:
+            folder = os.path.join(directory, re.sub(r"[^A-Za-z0-9._-]+", "_", db.cache_key))
+            queue = OfflineQueue(db, folder, retry_interval=retry_interval)
+            _QUEUES[db.cache_key] = queue
+        else:
+            # Instâncias novas a cada rerun: usa a mais recente p/ gravar
+            queue.db = db
+        return queue
+
+
+class OfflineQueue:
+    def __init__(self, db, directory, retry_interval=5.0, max_interval=300.0):
+        self.db = db
+        self.directory = directory
+        self.conflicts_dir = os.path.join(directory, "conflicts")
+        self.retry_interval = float(retry_interval)
+        self.max_interval = float(max_interval)
+        os.makedirs(self.conflicts_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._futures = {}          # nome -> Future (só as criadas neste processo)
+        self._seq = 0
+        self._failures = 0
+        self._attempts = {}         # nome -> falhas "unknown" seguidas
+        self._wake = threading.Event()
+
+        self.stats = {"queued": 0, "pushed": 0, "conflicts": 0, "failed_attempts": 0}
+        self.last_error = None
+        self.next_attempt = None
+
+        # Sobras de uma execução anterior são publicadas logo na subida
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # ============================================================
+    # API PÚBLICA
+    # ============================================================
+    def submit(self, op):
+        """
+        Grava a mutação no disco (fsync) e acorda o replayer.
+        Retorna (nome, Future) — o Future resolve quando ela for publicada.
+        """
+        future = Future()
+        with self._lock:
+            self._seq += 1
+            name = f"{time.time_ns():020d}-{os.getpid()}-{self._seq}.json"
+            entry = {**op, "name": name, "at": time.time()}
+            atomic_write_bytes(os.path.join(self.directory, name), json_codec.encode(entry))
+            self._futures[name] = future
+            self.stats["queued"] += 1
+        self._wake.set()
+        return name, future
+
+    def pending(self):
+        """Mutações ainda não publicadas, em ordem."""
+        return [e for e in (self._read(n) for n in self._names()) if e is not None]
+
+    def depth(self):
+        return len(self._names())
+
+    def conflicts(self):
+        out = []
+        for name in sorted(os.listdir(self.conflicts_dir)):
+            entry = self._read(name, folder=self.conflicts_dir)
+            if entry is not None:
+                out.append(entry)
+        return out
+
+    def discard_conflict(self, name):
+        with contextlib.suppress(OSError):
+            os.unlink(os.path.join(self.conflicts_dir, name))
+
+    def discard_pending(self, name):
+        """
+        Tira da fila uma mutação ainda não publicada. False se o replayer
+        está publicando agora (tente de novo) ou se ela já saiu da fila.
+        """
+        with self._replay_lock() as acquired:
+            if not acquired:
+                return False
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except OSError:
+                return False
+        with self._lock:
+            self._attempts.pop(name, None)
+        self._resolve(name, error=RejectedMutation("Alteração descartada antes do envio."))
+        return True
+
+    def overlay(self, data):
+        """Lista remota + mutações pendentes (o que o usuário acabou de salvar)."""
+        pending = self.pending()
+        if not pending:
+            return data
+        by_id = {str(r.get("id")): r for r in data if isinstance(r, dict)}
+        for entry in pending:
+            if entry.get("op") == "upsert":
+                rec = entry.get("record") or {}
+                by_id[str(rec.get("id"))] = rec
+            elif entry.get("op") == "delete":
+                by_id.pop(str(entry.get("id")), None)
+        return json_codec.canonical_records(list(by_id.values()))
+
+    def flush(self):
+        """
+        Publica as pendentes em ordem. Retorna True se a fila esvaziou;
+        False se o remoto falhou (ou outro processo está publicando).
+        """
+        with self._replay_lock() as acquired:
+            if not acquired:
+                return False
+            self._settle_foreign()
+            for name in self._names():
+                entry = self._read(name)
+                if entry is None:
+                    continue
+                try:
+                    self._push(entry)
+                except Exception as e:
+                    kind = classify_error(e)
+                    with self._lock:
+                        attempts = self._attempts.get(name, 0) + (kind == "unknown")
+                        self._attempts[name] = attempts
+                    if kind == "rejected" or attempts >= MAX_ATTEMPTS:
+                        # Não vai passar: guarda p/ o usuário e segue a fila
+                        if not isinstance(e, (MergeConflict, RejectedMutation)):
+                            e = RejectedMutation(f"Recusada após {max(attempts, 1)} tentativa(s): {e}")
+                        self._park(name, entry, e)
+                        continue
+                    # Fora do ar / rate limit / timeout / resposta truncada:
+                    # tenta de novo depois
+                    with self._lock:
+                        self._failures += 1
+                        self.stats["failed_attempts"] += 1
+                        self.last_error = str(e)
+                    return False
+                with contextlib.suppress(OSError):
+                    os.unlink(os.path.join(self.directory, name))
+                self._resolve(name, result=True)
+                with self._lock:
+                    self._attempts.pop(name, None)
+                    self._failures = 0
+                    self.stats["pushed"] += 1
+                    self.last_error = None
+            return True
+
+    def snapshot_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            last_error, next_attempt = self.last_error, self.next_attempt
+        return {
+            **stats,
+            "pending": self.depth(),
+            "parked": len(os.listdir(self.conflicts_dir)),
+            "last_error": last_error,
+            "next_attempt_in_s": round(max(0.0, next_attempt - time.time()), 1) if next_attempt else None,
+        }
+
+    # ============================================================
+    # WORKER
+    # ============================================================
+    def _run(self):
+        while True:
+            with self._lock:
+                delay = min(self.max_interval, self.retry_interval * (2 ** self._failures))
+                self.next_attempt = time.time() + delay
+            self._wake.wait(delay)
+            self._wake.clear()
+            with self._lock:
+                self.next_attempt = None
+            try:
+                self.flush()
+            except Exception as e:
+                with self._lock:
+                    self.last_error = str(e)
+
+    def _push(self, entry):
+        op = entry.get("op")
+        msg = entry.get("commit_message")
+        if op == "upsert":
+            record = entry.get("record")
+            if not isinstance(record, dict) or record.get("id") in (None, ""):
+                raise RejectedMutation("record deve ser um dict com 'id'.")
+            self.db.upsert(record, commit_message=msg, expected=entry.get("expected"),
+                           create=bool(entry.get("create")))
+        elif op == "delete":
+            if entry.get("id") in (None, ""):
+                raise RejectedMutation("delete sem 'id'.")
+            self.db.delete(entry["id"], commit_message=msg)
+        else:
+            raise RejectedMutation(f"Operação desconhecida na fila: {op!r}")
+
+    def _park(self, name, entry, error):
+        with self._lock:
+            self._attempts.pop(name, None)
+        entry = {**entry, "error": str(error)}
+        atomic_write_bytes(os.path.join(self.conflicts_dir, name), json_codec.encode(entry))
+        with contextlib.suppress(OSError):
+            os.unlink(os.path.join(self.directory, name))
+        with self._lock:
+            self.stats["conflicts"] += 1
+        self._resolve(name, error=error)
+
+    def _resolve(self, name, result=None, error=None):
+        with self._lock:
+            future = self._futures.pop(name, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _settle_foreign(self):
+        """Mutações deste processo publicadas por OUTRO processo (arquivo sumiu)."""
+        names = set(self._names())
+        parked = set(os.listdir(self.conflicts_dir))
+        with self._lock:
+            gone = [n for n in self._futures if n not in names]
+        for name in gone:
+            if name in parked:
+                self._resolve(name, error=MergeConflict([], path=getattr(self.db, "path", None)))
+            else:
+                self._resolve(name, result=True)
+
+    # ============================================================
+    # UTILITÁRIOS
+    # ============================================================
+    def _names(self):
+        try:
+            return sorted(n for n in os.listdir(self.directory) if n.endswith(".json"))
+        except OSError:
+            return []
+
+    def _read(self, name, folder=None):
+        try:
+            with open(os.path.join(folder or self.directory, name), "rb") as f:
+                return json_codec.decode(f.read())
+        except (OSError, ValueError):
+            return None
+
+    @contextlib.contextmanager
+    def _replay_lock(self):
+        """Um replayer por pasta entre processos (flock sem bloquear)."""
+        if fcntl is None:
+            yield True
+            return
+        with open(os.path.join(self.directory, ".lock"), "a+b") as fh:
+            try:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+class OfflineJSON:
+    """
+    Banco (GitHubJSON e derivados) com upsert/delete passando pela fila
+    local. O resto (save/update/invalidate/...) vai direto ao banco.
+    """
+
+    def __init__(self, db, directory, sync_wait=3.0, retry_interval=5.0):
+        self.db = db
+        self.sync_wait = float(sync_wait)
+        self.queue = get_offline_queue(db, directory, retry_interval=retry_interval)
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    def load(self, force=False, deadline=None):
+        data, sha = self.db.load(force=force, deadline=deadline)
+        if self.queue.depth():
+            data = self.queue.overlay(data)
+        return data, sha
+
+    def upsert(self, record, commit_message=None, expected=None, create=False):
+        if not isinstance(record, dict) or record.get("id") in (None, ""):
+            raise ValueError("record deve ser um dict com 'id'.")
+        return self._submit({
+            "op": "upsert", "record": record, "expected": expected, "create": create,
+            "commit_message": commit_message,
+        })
+
+    def delete(self, record_id, commit_message=None):
+        return self._submit({"op": "delete", "id": str(record_id), "commit_message": commit_message})
+
+    def pending_count(self):
+        return self.queue.depth()
+
+    def _submit(self, op):
+        """True se publicou dentro de sync_wait; QUEUED se ficou na fila."""
+        name, future = self.queue.submit(op)
+        try:
+            return future.result(timeout=self.sync_wait)
+        except FutureTimeout:
+            return QUEUED
+        except (MergeConflict, RejectedMutation):
+            # O chamador vê a recusa agora: não fica guardada na fila
+            self.queue.discard_conflict(name)
+            raise
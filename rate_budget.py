@@ -0,0 +1,143 @@
+# rate_budget.py — Orçamento do rate limit do GitHub, compartilhado no processo
+# Lê X-RateLimit-* de TODA resposta (hook da sessão HTTP) | Prioridades
+# Leituras de fundo (poller, revalidação) param antes; saves nunca esperam
+#
+# Antes o app só reagia ao 403 (dormindo até 10 s dentro do save do
+# usuário). Agora o restante da janela é conhecido a cada resposta: quando
+# ele cai abaixo da reserva, o trabalho de fundo é adiado até o reset e o
+# que sobra fica p/ as leituras e gravações dos usuários.
+
+import threading
+import time
+from collections import deque
+
+# Abaixo desta fração do limite, leituras de fundo esperam o reset
+DEFAULT_RESERVE_RATIO = 0.2
+
+PRIORITIES = ("write", "read", "background")
+
+
+class RateBudget:
+    def __init__(self, reserve_ratio=DEFAULT_RESERVE_RATIO, log_size=50):
+        self.reserve_ratio = float(reserve_ratio)
+        self._lock = threading.Lock()
+        self.limit = None
+        self.remaining = None
+        self.reset = None         # epoch em que a janela recomeça
+        self.observed_at = None
+
+        self.stats = {"responses": 0, "rate_limited": 0, "background_allowed": 0, "background_deferred": 0}
+        self.decisions = deque(maxlen=log_size)
+
+    # ============================================================
+    # OBSERVAÇÃO — hook de resposta do requests
+    # ============================================================
+    def observe(self, r, *args, **kwargs):
+        """Hook "response" da sessão: atualiza o orçamento (nunca falha)."""
+        try:
+            h = r.headers
+            if h.get("X-RateLimit-Resource", "core") != "core":
+                return r            # search/graphql têm janelas próprias
+            remaining = h.get("X-RateLimit-Remaining")
+            reset = h.get("X-RateLimit-Reset")
+            if remaining is None or reset is None:
+                return r
+            remaining, reset = int(remaining), float(reset)
+            limit = h.get("X-RateLimit-Limit")
+
+            with self._lock:
+                self.stats["responses"] += 1
+                if r.status_code in (403, 429) and remaining == 0:
+                    self.stats["rate_limited"] += 1
+                # Respostas chegam fora de ordem: janela mais nova vence;
+                # na mesma janela, o menor restante é o mais recente
+                if self.reset is None or reset > self.reset:
+                    self.remaining, self.reset = remaining, reset
+                elif reset == self.reset:
+                    self.remaining = min(self.remaining, remaining)
+                else:
+                    return r
+                if limit is not None:
+                    self.limit = int(limit)
+                self.observed_at = time.time()
+        except (TypeError, ValueError):
+            pass
+        return r
+
+    # ============================================================
+    # DECISÃO
+    # ============================================================
+    def allow(self, priority="read", consumer=None):
+        """
+        True se a chamada pode ir agora. Gravações e leituras do usuário
+        sempre vão (é p/ elas que a reserva existe); as de fundo são
+        adiadas enquanto o restante estiver abaixo da reserva.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Prioridade desconhecida: {priority!r}")
+        with self._lock:
+            if priority != "background":
+                return True
+            if self._low():
+                self.stats["background_deferred"] += 1
+                self.decisions.append({
+                    "at": time.time(),
+                    "consumer": consumer,
+                    "remaining": self.remaining,
+                    "reserve": self._reserve(),
+                    "retry_in_s": round(max(0.0, self.reset - time.time()), 1),
+                })
+                return False
+            self.stats["background_allowed"] += 1
+            return True
+
+    def write_delay(self):
+        """
+        Segundos até o reset se a janela já acabou (restante 0), senão 0.
+        Quem grava espera aqui em vez de gastar uma chamada num 403.
+        """
+        with self._lock:
+            if self.remaining != 0 or self.reset is None:
+                return 0.0
+            return max(0.0, self.reset - time.time())
+
+    def snapshot(self):
+        with self._lock:
+            now = time.time()
+            return {
+                "limit": self.limit,
+                "remaining": self.remaining,
+                "reserve": self._reserve(),
+                "reset_in_s": round(self.reset - now, 1) if self.reset else None,
+                "throttling_background": self._low(),
+                **self.stats,
+                "recent_deferrals": list(self.decisions)[-5:],
+            }
+
+    # ============================================================
+    # UTILITÁRIOS (chamados com o lock)
+    # ============================================================
+    def _reserve(self):
+        if self.limit is None:
+            return None
+        return int(self.limit * self.reserve_ratio)
+
+    def _low(self):
+        if self.remaining is None or self.limit is None:
+            return False            # sem informação: não segura nada
+        if self.reset is not None and time.time() >= self.reset:
+            return False            # janela nova: orçamento cheio de novo
+        return self.remaining < self._reserve()
+
+
+_BUDGET = None
+_BUDGET_LOCK = threading.Lock()
+
+
+def get_rate_budget():
+    """Orçamento do processo (o token do app é um só)."""
+    global _BUDGET
+    with _BUDGET_LOCK:
+        if _BUDGET is None:
+            _BUDGET = RateBudget()
+        return _BUDGET
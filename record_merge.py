@@ -0,0 +1,70 @@
+# record_merge.py — Merge de três vias por registro (chave "id")
+# base = versão que o chamador leu | ours = o que ele quer gravar
+# theirs = versão atual no GitHub (gravada por outra sessão nesse meio tempo)
+#
+# Edições em registros diferentes se juntam sem perda. Se o MESMO registro
+# mudou dos dois lados (de formas diferentes), nada é sobrescrito: levanta
+# MergeConflict com os detalhes de cada registro em conflito.
+
+import json
+
+
+class MergeConflict(Exception):
+    """
+    Mesmo registro alterado por duas sessões. conflicts é uma lista de
+    {"id", "base", "ours", "theirs"} (None = registro ausente/excluído).
+    """
+
+    def __init__(self, conflicts, path=None):
+        self.conflicts = conflicts
+        self.path = path
+        ids = ", ".join(str(c["id"]) for c in conflicts)
+        where = f" em {path}" if path else ""
+        super().__init__(
+            f"Conflito de edição{where}: registro(s) {ids} alterado(s) por outra sessão."
+        )
+
+    @property
+    def ids(self):
+        return [c["id"] for c in self.conflicts]
+
+
+def _record_key(record):
+    if isinstance(record, dict) and record.get("id") not in (None, ""):
+        return str(record.get("id"))
+    # Sem id: o próprio conteúdo é a chave (só entra/sai, nunca "muda")
+    return "~" + json.dumps(record, sort_keys=True, ensure_ascii=False)
+
+
+def _index(records):
+    out = {}
+    for rec in records or []:
+        out.setdefault(_record_key(rec), rec)
+    return out
+
+
+def merge_records(base, ours, theirs, path=None):
+    """
+    Junta ours e theirs a partir de base. Retorna a lista mesclada na ordem
+    de theirs (registros novos de ours vão ao final, na ordem de ours).
+    Levanta MergeConflict se algum registro divergiu dos dois lados.
+    """
+    b, o, t = _index(base), _index(ours), _index(theirs)
+
+    merged, conflicts = {}, []
+    for key in list(t) + [k for k in o if k not in t]:
+        rb, ro, rt = b.get(key), o.get(key), t.get(key)
+        if ro == rt or ro == rb:
+            merged[key] = rt       # iguais, ou só o outro lado mudou
+        elif rt == rb:
+            merged[key] = ro       # só nós mudamos
+        else:
+            sample = next((r for r in (rb, ro, rt) if isinstance(r, dict)), {})
+            conflicts.append({
+                "id": sample.get("id", key),
+                "base": rb, "ours": ro, "theirs": rt,
+            })
+
+    if conflicts:
+        raise MergeConflict(conflicts, path=path)
+    return [rec for rec in merged.values() if rec is not None]
@@ -0,0 +1,262 @@
+# revision_history.py — Revisões anteriores de um registro (commits API)
+# Paginação preguiçosa: 1 GET por página de commits (condicional, com ETag)
+# Versões antigas em cache por blob SHA (imutável): cada uma é baixada 1 vez
+#
+# Antes, desfazer uma edição ruim nas "Observações Críticas" era garimpar
+# commits no GitHub à mão. Aqui o app lista os commits que tocaram o arquivo
+# do registro, mostra o registro em cada um e restaura pelo update() normal
+# (atômico, com checagem de edição concorrente).
+#
+# Modo diário (journal): o snapshot só muda nas compactações, então as
+# revisões vêm dos eventos do diário (db.history) — já em memória, sem
+# requisição extra. Alterações já compactadas não aparecem.
+#
+#   <cache_dir>/history/blobs/<blob_sha>        conteúdo cru da versão
+#   <cache_dir>/history/refs/<commit>-<hash>    blob SHA do arquivo no commit
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import json_codec
+from github_database import atomic_write_bytes
+from record_merge import MergeConflict
+
+# Páginas de commits já lidas: (repo, caminho, página, por_página) -> (etag, itens, tem_mais)
+_PAGES = {}
+_PAGES_LOCK = threading.Lock()
+
+# (caminho, commit) -> blob SHA (ou MISSING): imutável, nunca expira
+_REFS = {}
+
+# Versões parseadas por blob SHA — compartilhado no processo
+_PARSED = OrderedDict()
+_PARSED_MAX = 64
+_PARSED_LOCK = threading.Lock()
+
+MISSING = "-"   # marcador: arquivo não existia naquele commit
+EVENT_PREFIX = "seq:"   # "sha" das revisões do modo diário (seq do evento)
+
+
+def git_blob_sha(raw):
+    """SHA que o git daria a estes bytes (dispensa pedir o SHA à API)."""
+    return hashlib.sha1(b"blob %d\0" % len(raw) + raw).hexdigest()
+
+
+class RevisionHistory:
+    """Histórico de um GitHubJSON (monolítico, shards ou diário)."""
+
+    def __init__(self, db, cache_dir=None, per_page=20):
+        self.db = db
+        self.cache_dir = os.path.join(cache_dir, "history") if cache_dir else None
+        self.per_page = per_page
+        self.stats = {"pages": 0, "pages_not_modified": 0, "versions_fetched": 0, "versions_cached": 0}
+
+    @staticmethod
+    def journaled(db):
+        """Modo diário: revisões = eventos do diário, não commits do snapshot."""
+        return hasattr(db, "journal_dir") and hasattr(db, "history")
+
+    def path_for(self, record_id):
+        """Arquivo cujo histórico contém o registro."""
+        if self.journaled(self.db):
+            raise ValueError("Modo diário: o histórico vem dos eventos (history()), não de um arquivo.")
+        if hasattr(self.db, "_shard_path"):
+            return self.db._shard_path(str(record_id))
+        return self.db.path
+
+    # ============================================================
+    # COMMITS — uma página por chamada
+    # ============================================================
+    def page(self, record_id, page=1):
+        """
+        ([{"sha", "date", "author", "message"}], tem_mais) dos commits
+        que alteraram o arquivo do registro, mais novos primeiro.
+        """
+        if self.journaled(self.db):
+            return self._event_page(record_id, page)
+        db = self.db
+        path = self.path_for(record_id)
+        key = (db.owner, db.repo, db.branch, path, page, self.per_page)
+        with _PAGES_LOCK:
+            cached = _PAGES.get(key)
+
+        headers = db.headers
+        if cached is not None and cached[0]:
+            headers["If-None-Match"] = cached[0]
+        r = db.session.get(
+            f"{db.api_base}/repos/{db.owner}/{db.repo}/commits",
+            headers=headers,
+            params={"sha": db.branch, "path": path, "per_page": self.per_page, "page": page},
+            timeout=db.timeout,
+        )
+        self.stats["pages"] += 1
+        if r.status_code == 304 and cached is not None:
+            self.stats["pages_not_modified"] += 1
+            return cached[1], cached[2]
+        if r.status_code != 200:
+            raise Exception(f"GitHub commits error: {r.status_code} - {r.text}")
+
+        items = [
+            {
+                "sha": c["sha"],
+                "date": ((c.get("commit") or {}).get("author") or {}).get("date"),
+                "author": ((c.get("commit") or {}).get("author") or {}).get("name"),
+                "message": ((c.get("commit") or {}).get("message") or "").split("\n", 1)[0],
+            }
+            for c in r.json()
+        ]
+        more = 'rel="next"' in (r.headers.get("Link") or "")
+        with _PAGES_LOCK:
+            _PAGES[key] = (r.headers.get("ETag"), items, more)
+        return items, more
+
+    # ============================================================
+    # VERSÕES — arquivo/registro num commit
+    # ============================================================
+    def _event_page(self, record_id, page):
+        events = self.db.history(record_id)
+        start = (page - 1) * self.per_page
+        items = [
+            {
+                "sha": f"{EVENT_PREFIX}{e['seq']}",
+                "date": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(e["at"])) if e.get("at") else None,
+                "author": None,
+                "message": f"{e['op']} (evento {e['seq']} do diário)",
+            }
+            for e in events[start:start + self.per_page]
+        ]
+        return items, len(events) > start + self.per_page
+
+    def record_at(self, record_id, commit_sha):
+        """O registro como estava no commit (None se não existia)."""
+        rid = str(record_id)
+        if commit_sha.startswith(EVENT_PREFIX):
+            seq = commit_sha[len(EVENT_PREFIX):]
+            event = next((e for e in self.db.history(rid) if str(e["seq"]) == seq), None)
+            # delete (ou evento já compactado): sem registro nesta revisão
+            return event.get("record") if event is not None else None
+        data = self._version(self.path_for(rid), commit_sha)
+        if hasattr(self.db, "_shard_path"):
+            return data if isinstance(data, dict) else None
+        if not isinstance(data, list):
+            return None
+        return next((r for r in data if isinstance(r, dict) and str(r.get("id")) == rid), None)
+
+    def _version(self, path, commit_sha):
+        blob_sha = self._read_ref(path, commit_sha)
+        if blob_sha == MISSING:
+            return None
+        if blob_sha is not None:
+            data = self._parsed(blob_sha)
+            if data is not None:
+                self.stats["versions_cached"] += 1
+                return data
+
+        r = self.db._get_raw(path, ref=commit_sha)
+        self.stats["versions_fetched"] += 1
+        if r.status_code == 404:
+            self._write_ref(path, commit_sha, MISSING)
+            return None
+        if r.status_code != 200:
+            raise Exception(f"GitHub GET error ({path}@{commit_sha[:7]}): {r.status_code} - {r.text}")
+        raw = r.content
+        blob_sha = git_blob_sha(raw)
+        self._write_blob(blob_sha, raw)
+        self._write_ref(path, commit_sha, blob_sha)
+        return self._remember(blob_sha, raw)
+
+    def _parsed(self, blob_sha):
+        with _PARSED_LOCK:
+            if blob_sha in _PARSED:
+                _PARSED.move_to_end(blob_sha)
+                return _PARSED[blob_sha]
+        raw = self._read_blob(blob_sha)
+        if raw is None:
+            return None
+        return self._remember(blob_sha, raw)
+
+    def _remember(self, blob_sha, raw):
+        try:
+            data = json_codec.decode(raw)
+        except ValueError:
+            data = []
+        with _PARSED_LOCK:
+            _PARSED[blob_sha] = data
+            _PARSED.move_to_end(blob_sha)
+            while len(_PARSED) > _PARSED_MAX:
+                _PARSED.popitem(last=False)
+        return data
+
+    # ============================================================
+    # RESTAURAÇÃO — pelo update() normal
+    # ============================================================
+    def restore(self, record_id, record, expected, commit_sha=""):
+        """
+        Grava `record` (versão antiga) no lugar do atual. expected: o
+        registro atual como o usuário o viu; se mudou, MergeConflict.
+        """
+        if not isinstance(record, dict):
+            raise ValueError("Revisão sem este registro: nada a restaurar.")
+        rid = str(record_id)
+
+        def _apply(data):
+            current = next((r for r in data if str(r.get("id")) == rid), None)
+            if current != expected and current != record:
+                raise MergeConflict(
+                    [{"id": record.get("id"), "base": expected, "ours": record, "theirs": current}],
+                    path=self.db.path,
+                )
+            return [r for r in data if str(r.get("id")) != rid] + [record]
+
+        msg = f"Restaura registro {rid} (revisão {commit_sha[:7]})" if commit_sha else None
+        return self.db.update(_apply, commit_message=msg)
+
+    # ============================================================
+    # CACHE EM DISCO (opcional; falhas nunca derrubam a leitura)
+    # ============================================================
+    def _ref_file(self, path, commit_sha):
+        tag = hashlib.sha1(path.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.cache_dir, "refs", f"{commit_sha}-{tag}")
+
+    def _read_ref(self, path, commit_sha):
+        with _PARSED_LOCK:
+            known = _REFS.get((path, commit_sha))
+        if known is not None or not self.cache_dir:
+            return known
+        try:
+            with open(self._ref_file(path, commit_sha), "r", encoding="ascii") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _write_ref(self, path, commit_sha, blob_sha):
+        with _PARSED_LOCK:
+            _REFS[(path, commit_sha)] = blob_sha
+        if not self.cache_dir:
+            return
+        try:
+            atomic_write_bytes(self._ref_file(path, commit_sha), blob_sha.encode("ascii"))
+        except OSError:
+            pass
+
+    def _read_blob(self, blob_sha):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(os.path.join(self.cache_dir, "blobs", blob_sha), "rb") as f:
+                raw = f.read()
+        except OSError:
+            return None
+        # Arquivo truncado/corrompido: baixa de novo
+        return raw if git_blob_sha(raw) == blob_sha else None
+
+    def _write_blob(self, blob_sha, raw):
+        if not self.cache_dir:
+            return
+        try:
+            atomic_write_bytes(os.path.join(self.cache_dir, "blobs", blob_sha), raw)
+        except OSError:
+            pass
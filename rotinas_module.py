@@ -10,6 +10,10 @@ import pandas as pd
 import time
 import re
 
+import metrics
+from offline_queue import QUEUED
+from record_merge import MergeConflict
+
 # Import do editor
 from streamlit_quill import st_quill
 # (Opcional) Import do botão de colar imagem — ainda não usado aqui
@@ -29,6 +33,7 @@ class RotinasModule:
       - safe_get: função(dict, str, default) -> str
       - primary_color: str (hex)
       - setores_opcoes: List[str]
+      - blob_store: BlobStore opcional (imagens da descrição por referência)
     """
 
     def __init__(
@@ -41,6 +46,7 @@ class RotinasModule:
         safe_get: Callable[[dict, str, str], str],
         primary_color: str = "#1F497D",
         setores_opcoes: List[str] = None,
+        blob_store: Any = None,
     ):
         self.db = db_rotinas
         self.sanitize_text = sanitize_text
@@ -50,6 +56,7 @@ class RotinasModule:
         self.safe_get = safe_get
         self.primary_color = primary_color
         self.setores_opcoes = list(setores_opcoes or [])
+        self.blob_store = blob_store
 
     # ============================================================
     # LIMPEZA DE HTML (igual ao módulo principal)
@@ -65,6 +72,7 @@ class RotinasModule:
     # ============================================================
     # PDF PREMIUM DA ROTINA
     # ============================================================
+    @metrics.timed("pdf.gerar_pdf_rotina")
     def gerar_pdf_rotina(self, dados: dict) -> bytes:
         pdf = FPDF(orientation="P", unit="mm", format="A4")
         pdf.set_margins(15, 12, 15)
@@ -166,12 +174,17 @@ class RotinasModule:
     # ============================================================
     # PÁGINA DO MÓDULO (COM EDITOR QUILL)
     # ============================================================
+    @metrics.timed("pagina.rotinas")
     def page(self):
         try:
-            rotinas_atuais, _ = self.db.load(force=True)
+            rotinas_atuais, _ = self.db.load()
         except Exception:
             rotinas_atuais = []
 
+        if getattr(self.db, "stale", None):
+            # Leitura com prazo serviu a cópia anterior (GitHub lento/fora)
+            st.warning("⏳ Exibindo a última cópia das rotinas: o GitHub está lento ou fora do ar.")
+
         if not isinstance(rotinas_atuais, list):
             rotinas_atuais = []
         rotinas_atuais = list(rotinas_atuais)
@@ -198,6 +211,10 @@ class RotinasModule:
                 {}
             )
 
+        # Rotina como estava ao abrir a edição (detecta edição concorrente)
+        if rotina_id != "novo":
+            st.session_state.setdefault(f"base_rotina_{rotina_id}", dados_rotina or None)
+
         st.markdown("</div>", unsafe_allow_html=True)
 
         # ============================================================
@@ -227,6 +244,9 @@ class RotinasModule:
 
         # Garante string (nunca None)
         desc_inicial = str(self.safe_get(dados_rotina, "descricao", ""))
+        if self.blob_store is not None:
+            # Imagens salvas como referência voltam como data URI só p/ o editor
+            desc_inicial = self.blob_store.inline_html(desc_inicial)
 
         descricao_html = st_quill(
             value=desc_inicial,
@@ -253,17 +273,40 @@ class RotinasModule:
                     "descricao": descricao_html,  # HTML salvo no JSON
                 }
 
-                if rotina_id == "novo":
-                    rotinas_atuais.append(novo_registro)
-                else:
-                    for i, r in enumerate(rotinas_atuais):
-                        if str(r.get("id")) == str(rotina_id):
-                            rotinas_atuais[i] = novo_registro
-                            break
-
-                if self.db.save(rotinas_atuais):
+                # Grava só este registro (insere ou substitui pelo id)
+                base_key = f"base_rotina_{rotina_id}"
+                try:
+                    salvo = self.db.upsert(
+                        novo_registro, expected=st.session_state.get(base_key),
+                        create=rotina_id == "novo",
+                    )
+                except MergeConflict:
+                    st.session_state.pop(base_key, None)
+                    if rotina_id == "novo":
+                        # Próximo rerun relê o banco e gera outro id
+                        self.db.invalidate()
+                        st.error(
+                            "⚠️ Outra pessoa cadastrou uma rotina com o mesmo ID agora há pouco. "
+                            "Nada foi sobrescrito: clique em salvar novamente para usar um novo ID."
+                        )
+                    else:
+                        st.error(
+                            "⚠️ Esta rotina foi alterada por outra pessoa enquanto você editava. "
+                            "Nada foi sobrescrito: confira a versão atual e salve novamente."
+                        )
+                    salvo = False
+                if salvo == QUEUED:
+                    st.session_state.pop(base_key, None)
+                    st.warning(
+                        "📤 GitHub indisponível: rotina salva localmente e será "
+                        "enviada automaticamente assim que ele responder."
+                    )
+                    time.sleep(1.5)
+                    st.rerun()
+                elif salvo:
+                    st.session_state.pop(base_key, None)
                     st.success("✔ Rotina salva com sucesso!")
-                    self.db._cache_data = None
+                    self.db.invalidate()
                     time.sleep(1)
                     st.rerun()
 
@@ -317,19 +360,11 @@ class RotinasModule:
                     disabled=not can_delete,
                 ):
                     try:
-                        def _update(data):
-                            return [
-                                r for r in (data or [])
-                                if str(r.get("id")) != rotina_id_str
-                            ]
-
-                        self.db.update(_update)
+                        self.db.delete(rotina_id_str)
 
                         st.success(f"✔ Rotina {rotina_id_str} excluída com sucesso!")
 
-                        self.db._cache_data = None
-                        self.db._cache_sha = None
-                        self.db._cache_time = 0.0
+                        self.db.invalidate()
                         st.session_state.clear()
                         time.sleep(1)
                         st.rerun()
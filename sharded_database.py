@@ -0,0 +1,459 @@
+# sharded_database.py — Layout fragmentado: 1 arquivo por registro
+# Salvar custa o tamanho do REGISTRO, não do banco | Conflito só no mesmo registro
+#
+#   <pasta>/manifest.json         marcador do layout: {"format", "migrated_from"}
+#   <pasta>/records/<nome>.json   um registro por arquivo
+#
+# upsert/delete: um PUT/DELETE da contents API condicionado ao SHA do shard
+# (escritas em registros diferentes não disputam nada). save() e update()
+# que mexem em vários registros (ex.: lote do write-behind) gravam todos
+# num único commit (GitTransaction): ou entra tudo, ou nada. O índice sai
+# da listagem da pasta — nada compartilhado é regravado a cada escrita.
+#
+# <nome> = o id quando ele é só [A-Za-z0-9_-]; senão "~" + base64 url-safe do
+# id (ids de texto livre, ex.: correcoes.json). O id real fica no corpo.
+#
+# Mesmo contrato do GitHubJSON (load/save/update/upsert/delete/init_if_missing).
+# Na primeira leitura, o dados.json/rotinas.json monolítico é migrado sozinho
+# (o arquivo antigo é mantido intacto no repositório).
+
+import base64
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import json_codec
+import metrics
+from github_database import GitHubJSON
+from json_codec import record_sort_key
+from record_merge import MergeConflict, merge_records
+from shared_store import StoreEntry
+
+MANIFEST_FORMAT = "sharded-v1"
+
+# Registros já parseados, por blob SHA (imutável) — compartilhado no processo
+_SHARD_CACHE = OrderedDict()
+_SHARD_CACHE_MAX = 5000
+_SHARD_CACHE_LOCK = threading.Lock()
+
+# Blob SHA atual de cada shard (cache_key -> {id: sha}), da última listagem
+# ou escrita deste processo: base do PUT condicional
+_SHARD_SHAS = {}
+
+# Layouts já verificados/migrados neste processo (chave = cache_key)
+_MIGRATED = set()
+_MIGRATION_LOCK = threading.Lock()
+
+_PLAIN_ID = re.compile(r"[A-Za-z0-9_-]+")
+
+
+def shard_name(record_id):
+    """Nome de arquivo do registro (sem "/", espaços, ":" ou não-ASCII)."""
+    rid = str(record_id)
+    if _PLAIN_ID.fullmatch(rid):
+        return rid
+    return "~" + base64.urlsafe_b64encode(rid.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+class _AlreadyMigrated(Exception):
+    """Outro worker publicou a migração antes deste commit."""
+
+
+def _cache_shard(sha, record):
+    with _SHARD_CACHE_LOCK:
+        _SHARD_CACHE[sha] = record
+        _SHARD_CACHE.move_to_end(sha)
+        while len(_SHARD_CACHE) > _SHARD_CACHE_MAX:
+            _SHARD_CACHE.popitem(last=False)
+
+
+def _cached_shard(sha):
+    with _SHARD_CACHE_LOCK:
+        return _SHARD_CACHE.get(sha)
+
+
+class ShardedGitHubJSON(GitHubJSON):
+    def __init__(
+        self,
+        token,
+        owner,
+        repo,
+        path="dados",
+        branch="main",
+        legacy_path=None,     # ex.: "dados.json" — migrado automaticamente
+        label_field="nome",   # campo exibido no índice (load_index)
+        max_workers=8,        # GETs paralelos de shards
+        **kwargs,
+    ):
+        super().__init__(token, owner, repo, path=path, branch=branch, **kwargs)
+        self.legacy_path = legacy_path
+        self.label_field = label_field
+        self.max_workers = max_workers
+        self.manifest_path = f"{path}/manifest.json"
+        self.records_dir = f"{path}/records"
+
+    def _shard_path(self, record_id):
+        return f"{self.records_dir}/{shard_name(record_id)}.json"
+
+    def _known_shas(self):
+        with _SHARD_CACHE_LOCK:
+            return _SHARD_SHAS.setdefault(self.cache_key, {})
+
+    def _remember_sha(self, rid, sha, record=None):
+        with _SHARD_CACHE_LOCK:
+            known = _SHARD_SHAS.setdefault(self.cache_key, {})
+            if sha is None:
+                known.pop(rid, None)
+            else:
+                known[rid] = sha
+        if sha is not None and record is not None:
+            _cache_shard(sha, record)
+
+    # ============================================================
+    # LOAD — listagem da pasta (ETag) + só os shards que mudaram
+    # ============================================================
+    @metrics.timed("github.fetch")
+    def _fetch(self, prev):
+        self._migrate_if_needed()
+
+        r = self._get_contents(self.records_dir, etag=prev.etag if prev is not None else None)
+
+        if r.status_code == 304:
+            self.stats["not_modified"] += 1
+            return StoreEntry(prev.data, prev.sha, prev.etag)
+
+        if r.status_code == 404:
+            return StoreEntry([], None)
+
+        if r.status_code != 200:
+            raise Exception(f"GitHub GET error: {r.status_code} - {r.text}")
+
+        listing = [
+            item for item in r.json()
+            if item.get("type") == "file" and item.get("name", "").endswith(".json")
+        ]
+
+        missing = [item for item in listing if _cached_shard(item["sha"]) is None]
+        if missing:
+            workers = max(1, min(self.max_workers, len(missing)))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(self._fetch_shard, missing))
+
+        records, shas = [], {}
+        for item in listing:
+            rec = _cached_shard(item["sha"])
+            if isinstance(rec, dict):
+                records.append(rec)
+                shas[str(rec.get("id"))] = item["sha"]
+        records.sort(key=record_sort_key)
+        with _SHARD_CACHE_LOCK:
+            _SHARD_SHAS[self.cache_key] = shas
+
+        # "SHA" do conjunto: muda sempre que qualquer shard muda
+        version = hashlib.sha1(
+            "\n".join(sorted(f"{i['name']}:{i['sha']}" for i in listing)).encode("utf-8")
+        ).hexdigest()
+
+        entry = StoreEntry(records, version, r.headers.get("ETag"))
+        self._write_snapshot(entry)
+        return entry
+
+    def _fetch_shard(self, item):
+        r = self._get_contents(item["path"])
+        if r.status_code != 200:
+            raise Exception(f"GitHub GET error ({item['path']}): {r.status_code} - {r.text}")
+        body = r.json()
+        try:
+            record = json_codec.decode(base64.b64decode(body.get("content") or ""))
+        except ValueError:
+            # Shard ilegível: ignorado na leitura (não derruba o banco inteiro)
+            record = None
+        _cache_shard(body.get("sha") or item["sha"], record)
+
+    def load_index(self):
+        """
+        {id: nome} a partir da listagem (shards já em cache não são relidos).
+        """
+        data, _ = self.load()
+        return {str(r.get("id")): self._label(r) for r in data}
+
+    # ============================================================
+    # SAVE — shards que mudaram (+ imagens) em UM commit
+    # ============================================================
+    @metrics.timed("github.save")
+    def save(self, new_data, retries=8, commit_message=None, base=None):
+        if not isinstance(new_data, list):
+            raise ValueError("new_data deve ser uma lista JSON serializável.")
+
+        current, _ = self.load(force=True)
+        current_by_id = {str(r.get("id")): r for r in current}
+
+        tx = self.transaction(commit_message)
+        new_data = self._externalize(new_data, tx)
+        for rec in new_data:
+            if not isinstance(rec, dict) or rec.get("id") in (None, ""):
+                raise ValueError("Cada registro precisa ser um dict com 'id'.")
+        if base is not None:
+            # Edições feitas por outras sessões desde o load() do chamador
+            new_data = merge_records(base[0], new_data, current, path=self.path)
+        new_by_id = {str(rec.get("id")): rec for rec in new_data}
+
+        # Cada shard alterado é conferido no HEAD do commit (sem lost update)
+        changed = {rid: rec for rid, rec in new_by_id.items() if current_by_id.get(rid) != rec}
+        removed = [rid for rid in current_by_id if rid not in new_by_id]
+        for rid, rec in changed.items():
+            tx.update(self._shard_path(rid), self._guarded(rec, current_by_id.get(rid)))
+        for rid in removed:
+            tx.update(self._shard_path(rid), self._guarded(None, current_by_id[rid], rid))
+
+        if not changed and not removed:
+            return True
+        self._commit(tx, changed, retries, removed=removed)
+        return True
+
+    def upsert(self, record, commit_message=None, expected=None, create=False):
+        if self.write_behind:
+            # Vai p/ a fila como update_fn: o lote vira um save() (1 commit)
+            return super().upsert(record, commit_message=commit_message, expected=expected, create=create)
+        if not isinstance(record, dict) or record.get("id") in (None, ""):
+            raise ValueError("record deve ser um dict com 'id'.")
+        self._migrate_if_needed()
+        record = self._externalize([record])[0]
+        return self._write_shard(str(record.get("id")), record, commit_message,
+                                 check=expected is not None or create, expected=expected)
+
+    def delete(self, record_id, commit_message=None):
+        if self.write_behind:
+            return super().delete(record_id, commit_message=commit_message)
+        self._migrate_if_needed()
+        return self._write_shard(str(record_id), None, commit_message)
+
+    def _update_direct(self, update_fn, retries=8, commit_message=None):
+        """
+        update() (e o lote do write-behind): um registro alterado vira um
+        PUT/DELETE condicionado; vários, um único commit. Em ambos, cada
+        shard só é gravado se ainda é o que update_fn viu (MergeConflict).
+        """
+        data, _ = self.load(force=True)
+        try:
+            new_data = update_fn(list(data))
+        except MergeConflict:
+            raise
+        except Exception as e:
+            raise Exception(f"update_fn falhou: {e}")
+        if not isinstance(new_data, list):
+            raise ValueError("update_fn deve retornar uma lista JSON serializável.")
+        for rec in new_data:
+            if not isinstance(rec, dict) or rec.get("id") in (None, ""):
+                raise ValueError("Cada registro precisa ser um dict com 'id'.")
+
+        seen = {str(r.get("id")): r for r in data}
+        new_by_id = {str(r.get("id")): r for r in new_data}
+        changed = [rid for rid, rec in new_by_id.items() if seen.get(rid) != rec]
+        removed = [rid for rid in seen if rid not in new_by_id]
+
+        if len(changed) + len(removed) == 1:
+            rid = (changed or removed)[0]
+            record = self._externalize([new_by_id[rid]])[0] if changed else None
+            return self._write_shard(rid, record, commit_message, check=True,
+                                     expected=seen.get(rid), retries=retries)
+        if not changed and not removed:
+            return True
+
+        tx = self.transaction(commit_message)
+        written = {}
+        for rid, rec in zip(changed, self._externalize([new_by_id[rid] for rid in changed], tx)):
+            tx.update(self._shard_path(rid), self._guarded(rec, seen.get(rid)))
+            written[rid] = rec
+        for rid in removed:
+            tx.update(self._shard_path(rid), self._guarded(None, seen[rid], rid))
+        self._commit(tx, written, retries, removed=removed)
+        return True
+
+    @metrics.timed("github.save")
+    def _write_shard(self, rid, record, commit_message=None, check=False, expected=None, retries=8):
+        """
+        PUT (ou DELETE, record=None) só do shard, condicionado ao blob SHA
+        dele. SHA desatualizado (409/422): relê o shard e tenta de novo.
+        check: confere `expected` contra o shard atual (MergeConflict).
+        """
+        path = self._shard_path(rid)
+        msg = commit_message or self.DEFAULT_COMMIT_MESSAGE
+        sha = self._known_shas().get(rid)
+        current = _cached_shard(sha) if sha else None
+        fresh = False   # sha/conteúdo lidos agora (não da última listagem)
+
+        for attempt in range(retries):
+            stale = attempt or (check and current is None) or (record is None and sha is None)
+            if stale and not fresh:
+                sha, current = self._read_shard(path)
+                fresh = True
+            if check and current != expected and current != record:
+                raise MergeConflict(
+                    [{"id": (record or expected or {}).get("id", rid),
+                      "base": expected, "ours": record, "theirs": current}],
+                    path=self.path,
+                )
+
+            if record is None:
+                if sha is None:
+                    return True     # já não existe
+                r = self._delete_contents(sha, msg, path=path)
+            else:
+                r = self._put_contents(self._encode_record(record), sha, msg, path=path)
+
+            if r.status_code in (200, 201):
+                new_sha = ((r.json() or {}).get("content") or {}).get("sha") if record is not None else None
+                self._remember_sha(rid, new_sha, record)
+                self.invalidate()
+                # Versão do conjunto só sai da listagem: os outros workers descartam
+                self._publish(None)
+                return True
+
+            if r.status_code in (409, 422) or (r.status_code == 404 and record is None):
+                # Shard mudou (ou sumiu) desde a listagem: relê só ele
+                self.stats["conflicts"] += 1
+                fresh = False
+                time.sleep(random.random() * min(1.0, 0.05 * (2 ** attempt)))
+                continue
+            if self._retry_wait(r, attempt):
+                continue
+            raise Exception(f"GitHub PUT error ({path}): {r.status_code} - {r.text}")
+
+        raise TimeoutError("Falha ao salvar após múltiplas tentativas.")
+
+    def _read_shard(self, path):
+        """(blob SHA, registro) do shard agora; (None, None) se não existe."""
+        r = self._get_contents(path)
+        if r.status_code == 404:
+            return None, None
+        if r.status_code != 200:
+            raise Exception(f"GitHub GET error ({path}): {r.status_code} - {r.text}")
+        body = r.json()
+        try:
+            record = json_codec.decode(base64.b64decode(body.get("content") or ""))
+        except ValueError:
+            record = None
+        _cache_shard(body.get("sha"), record)
+        return body.get("sha"), record
+
+    # ============================================================
+    # SHARDS — serialização + publicação da transação
+    # ============================================================
+    def _encode_record(self, record):
+        return json_codec.encode(record, self.compression)
+
+    def _guarded(self, record, seen, rid=None):
+        """
+        fn(bytes|None) p/ GitTransaction.update: grava record (None = exclui)
+        só se o shard no HEAD ainda é o que o chamador viu (ou já é record).
+        """
+        def _apply(raw):
+            try:
+                current = json_codec.decode(raw) if raw else None
+            except ValueError:
+                current = None
+            if current != seen and current != record:
+                sample = record or seen or {}
+                raise MergeConflict(
+                    [{"id": sample.get("id", rid), "base": seen, "ours": record, "theirs": current}],
+                    path=self.path,
+                )
+            return self._encode_record(record) if record is not None else None
+        return _apply
+
+    def _commit(self, tx, written, retries=8, removed=()):
+        tx.commit(retries=retries)
+        # Os shards recém-gravados já entram no cache pelo blob SHA novo
+        for rid, rec in written.items():
+            sha = tx.blob_shas.get(self._shard_path(rid))
+            if sha:
+                self._remember_sha(rid, sha, rec)
+        for rid in removed:
+            self._remember_sha(rid, None)
+        self.invalidate()
+        # Versão do conjunto só sai da listagem: os outros workers descartam
+        self._publish(None)
+
+    # ============================================================
+    # MANIFESTO — só marca o layout (criado pela migração)
+    # ============================================================
+    def _label(self, record):
+        return str(record.get(self.label_field) or "")
+
+    def _manifest_sha(self):
+        r = self._get_contents(self.manifest_path)
+        if r.status_code == 404:
+            return None
+        if r.status_code != 200:
+            raise Exception(f"GitHub GET error ({self.manifest_path}): {r.status_code} - {r.text}")
+        return r.json().get("sha")
+
+    # ============================================================
+    # MIGRAÇÃO — arquivo monolítico -> shards (um único commit)
+    # ============================================================
+    def _migrate_if_needed(self):
+        if self.cache_key in _MIGRATED:
+            return
+        with _MIGRATION_LOCK:
+            if self.cache_key in _MIGRATED:
+                return
+            if self._manifest_sha() is None:
+                try:
+                    self._migrate()
+                except _AlreadyMigrated:
+                    # Outro worker/processo migrou antes: vale o dele
+                    self.invalidate()
+            _MIGRATED.add(self.cache_key)
+
+    def _migrate(self):
+        msg = f"Migração {self.legacy_path or '(vazio)'} -> {self.path}/ (1 arquivo por registro)"
+        legacy_data = []
+        if self.legacy_path:
+            legacy = GitHubJSON(
+                self.token, self.owner, self.repo,
+                path=self.legacy_path, branch=self.branch,
+                timeout=self.timeout, session=self.session, api_base=self.api_base,
+            )
+            legacy_data, _ = legacy.load(force=True)
+
+        next_id = 1 + max(
+            [k[1] for k in map(record_sort_key, legacy_data) if k[0] == 0] or [0]
+        )
+        tx = self.transaction(msg)
+        written, duplicates = {}, set()
+        for rec in self._externalize(legacy_data, tx):
+            if not isinstance(rec, dict):
+                continue
+            if rec.get("id") in (None, ""):
+                rec = {**rec, "id": next_id}
+                next_id += 1
+            rid = str(rec["id"])
+            if rid in written:
+                # Dois registros viram o mesmo shard: um deles se perderia
+                duplicates.add(rid)
+                continue
+            encoded = self._encode_record(rec)
+            # Shard que já existe na cabeça (upsert concorrente) é mais novo
+            tx.update(self._shard_path(rid), lambda raw, encoded=encoded: raw if raw is not None else encoded)
+            written[rid] = rec
+        if duplicates:
+            raise ValueError(
+                f"IDs duplicados em {self.legacy_path}: {', '.join(sorted(duplicates))}. "
+                "Corrija o arquivo antes da migração para shards."
+            )
+
+        def _create_manifest(raw):
+            # Conferido na MESMA cabeça do commit: só migra se ninguém migrou
+            if raw is not None:
+                raise _AlreadyMigrated()
+            return json_codec.encode({"format": MANIFEST_FORMAT, "migrated_from": self.legacy_path})
+
+        tx.update(self.manifest_path, _create_manifest)
+        tx.commit()
+        self.invalidate()
+        self._publish(None)
@@ -0,0 +1,145 @@
+# shared_store.py — Cache de processo compartilhado entre sessões/reruns
+# Thread-safe | TTL configurável | Single-flight (1 GET para N leitores)
+#
+# O Streamlit reexecuta o script a cada interação, então qualquer cache
+# guardado na instância do GitHubJSON morre no rerun seguinte. Este store
+# vive no processo (via st.cache_resource no app) e guarda UMA cópia
+# parseada por arquivo para todas as sessões.
+#
+# IMPORTANTE: os dados devolvidos são compartilhados — quem for alterar
+# deve copiar a lista antes (list(dados)) e nunca mutar os dicts no lugar.
+
+import threading
+import time
+
+
+class StoreEntry:
+    """Cópia parseada de um arquivo + metadados de validação."""
+
+    __slots__ = ("data", "sha", "etag", "fetched_at")
+
+    def __init__(self, data, sha, etag=None, fetched_at=None):
+        self.data = data
+        self.sha = sha
+        self.etag = etag
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+
+
+class _Flight:
+    """Busca em andamento: os demais leitores esperam o resultado dela."""
+
+    __slots__ = ("event", "entry", "error", "generation")
+
+    def __init__(self, generation):
+        self.event = threading.Event()
+        self.entry = None
+        self.error = None
+        self.generation = generation
+
+
+class SharedStore:
+    def __init__(self, ttl=30.0):
+        self.ttl = float(ttl)
+        self._lock = threading.Lock()
+        self._entries = {}      # chave -> StoreEntry
+        self._inflight = {}     # chave -> _Flight
+        self._generation = {}   # chave -> int (muda a cada escrita/invalidação)
+
+        self.stats = {"cache_hits": 0, "fetches": 0, "coalesced": 0, "invalidations": 0}
+
+    # ============================================================
+    # LEITURA — TTL + single-flight
+    # ============================================================
+    def get(self, key, fetch, force=False):
+        """
+        Devolve o StoreEntry da chave.
+
+        fetch: função(StoreEntry | None) -> StoreEntry, chamada fora do lock
+               com a entrada anterior (útil p/ GET condicional com ETag).
+        force: ignora o TTL, mas ainda aproveita uma busca já em andamento.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if not force and entry is not None and self._is_fresh(entry):
+                self.stats["cache_hits"] += 1
+                return entry
+
+            gen = self._generation.get(key, 0)
+            flight = self._inflight.get(key)
+            if flight is not None and flight.generation == gen:
+                self.stats["coalesced"] += 1
+                leader = False
+            else:
+                flight = _Flight(gen)
+                if key not in self._inflight:
+                    self._inflight[key] = flight
+                self.stats["fetches"] += 1
+                leader = True
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.entry
+
+        try:
+            new_entry = fetch(entry)
+            flight.entry = new_entry
+            with self._lock:
+                # Só grava se ninguém escreveu/invalidou durante a busca
+                if self._generation.get(key, 0) == gen:
+                    self._entries[key] = new_entry
+            return new_entry
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+            flight.event.set()
+
+    def peek(self, key):
+        """Entrada atual (mesmo vencida) ou None — não dispara busca."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def is_fresh(self, entry):
+        """True se a entrada ainda está dentro do TTL (get() não buscaria)."""
+        return entry is not None and self._is_fresh(entry)
+
+    # ============================================================
+    # ESCRITA / INVALIDAÇÃO
+    # ============================================================
+    def seed(self, key, entry):
+        """
+        Grava a entrada somente se a chave nunca foi carregada, escrita ou
+        invalidada neste processo (ex.: snapshot de disco no cold start).
+        Retorna True se gravou.
+        """
+        with self._lock:
+            if key in self._entries or key in self._generation:
+                return False
+            self._entries[key] = entry
+            return True
+
+    def put(self, key, entry):
+        """Substitui a cópia após um save bem-sucedido."""
+        with self._lock:
+            self._generation[key] = self._generation.get(key, 0) + 1
+            self._entries[key] = entry
+
+    def invalidate(self, key=None):
+        """Descarta uma chave (ou todas, se key=None)."""
+        with self._lock:
+            keys = list(self._entries) if key is None else [key]
+            for k in keys:
+                self._generation[k] = self._generation.get(k, 0) + 1
+                self._entries.pop(k, None)
+            self.stats["invalidations"] += 1
+
+    # ============================================================
+    # UTILITÁRIOS
+    # ============================================================
+    def _is_fresh(self, entry):
+        return (time.time() - entry.fetched_at) < self.ttl
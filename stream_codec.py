@@ -0,0 +1,115 @@
+# stream_codec.py — base64 em pedaços p/ load/save sem cópias do payload inteiro
+# Decode: texto base64 (com quebras de linha) -> bytes, 64 KB por vez
+# Encode: corpo JSON {"content": "<base64>", ...} gerado sob demanda no envio
+#
+# Antes, um load segurava ao mesmo tempo: bytes da resposta, r.text, o dict
+# de r.json(), a string base64, os bytes decodificados, a str e a lista; um
+# save: lista, JSON, base64 (str) e o corpo da requisição (str + bytes).
+# Aqui só os bytes do arquivo existem inteiros; o resto passa em pedaços.
+
+import binascii
+import json
+import re
+
+# Múltiplos de 3 (encode) / 4 (decode): nenhum pedaço precisa de padding
+ENCODE_CHUNK = 48 * 1024
+DECODE_CHUNK = 64 * 1024
+
+
+_CONTENT_FIELD_RE = re.compile(rb'"content"\s*:\s*"')
+
+
+def b64decode(text, chunk=DECODE_CHUNK):
+    """
+    Decodifica base64 (ignora quebras de linha/espaços, como o GitHub manda)
+    sem criar uma cópia limpa do texto inteiro. Retorna bytearray.
+    """
+    out = bytearray()
+    carry = ""
+    for start in range(0, len(text), chunk):
+        piece = carry + "".join(text[start:start + chunk].split())
+        usable = len(piece) - (len(piece) % 4)
+        if usable:
+            out += binascii.a2b_base64(piece[:usable])
+        carry = piece[usable:]
+    if carry.strip("="):
+        raise ValueError("base64 truncado")
+    return out
+
+
+def _b64decode_escaped(buf, chunk=DECODE_CHUNK):
+    """
+    Base64 ainda dentro do JSON (com "\\n" escapados), direto dos bytes da
+    resposta: nem a string JSON nem o texto limpo existem inteiros.
+    """
+    out = bytearray()
+    carry = b""
+    for start in range(0, len(buf), chunk):
+        piece = carry + bytes(buf[start:start + chunk])
+        tail = b""
+        if piece.endswith(b"\\"):
+            # "\\" + "n" partidos entre dois pedaços
+            piece, tail = piece[:-1], b"\\"
+        piece = piece.replace(b"\\n", b"").replace(b"\\r", b"").replace(b"\\/", b"/")
+        piece = b"".join(piece.split())
+        usable = len(piece) - (len(piece) % 4)
+        if usable:
+            out += binascii.a2b_base64(piece[:usable])
+        carry = piece[usable:] + tail
+    if carry.strip(b"="):
+        raise ValueError("base64 truncado")
+    return out
+
+
+def read_contents(fp):
+    """
+    Lê a resposta JSON da contents API de um stream e devolve
+    (metadados sem "content", bytes do arquivo). O campo base64 é
+    decodificado direto dos bytes recebidos, sem passar pelo parser JSON.
+    """
+    data = fp.read()
+    m = _CONTENT_FIELD_RE.search(data)
+    if m is None:
+        return json.loads(data), bytearray()
+    start = m.end()
+    end = data.index(b'"', start)
+    view = memoryview(data)
+    try:
+        try:
+            raw = _b64decode_escaped(view[start:end])
+        except ValueError:
+            raw = bytearray()   # base64 ilegível: tratado como conteúdo vazio
+        meta = json.loads(bytes(view[:start]) + bytes(view[end:]))
+    finally:
+        view.release()
+    return meta, raw
+
+
+def b64_length(n):
+    return 4 * ((n + 2) // 3)
+
+
+class Base64JSONBody:
+    """
+    Corpo de requisição JSON com um campo base64 gerado em pedaços.
+    Tem __len__ (Content-Length, sem chunked encoding) e pode ser iterado
+    de novo a cada tentativa (retry do urllib3 reenvia o mesmo objeto).
+    """
+
+    def __init__(self, fields, raw, field="content"):
+        head = {k: v for k, v in fields.items() if k != field}
+        prefix = json.dumps(head, ensure_ascii=False)[:-1]
+        sep = ", " if head else ""
+        self._prefix = f'{prefix}{sep}"{field}": "'.encode("utf-8")
+        self._suffix = b'"}'
+        self._raw = memoryview(raw)
+
+    def __len__(self):
+        return len(self._prefix) + b64_length(len(self._raw)) + len(self._suffix)
+
+    def __iter__(self):
+        yield self._prefix
+        raw = self._raw
+        for start in range(0, len(raw), ENCODE_CHUNK):
+            yield binascii.b2a_base64(raw[start:start + ENCODE_CHUNK], newline=False)
+        yield self._suffix
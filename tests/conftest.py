@@ -0,0 +1,45 @@
+# conftest.py — Fixtures comuns: github_stub em processo + bancos apontados p/ ele
+# Roda offline:  python -m pytest -q
+
+import os
+import sys
+import time
+import uuid
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from github_stub import GitHubStub  # noqa: E402
+
+
+@pytest.fixture
+def stub():
+    with GitHubStub() as s:
+        yield s
+
+
+@pytest.fixture
+def gh(stub):
+    """
+    Argumentos dos bancos p/ o stub. Repositório único por teste: store,
+    filas e disjuntores do processo são chaveados por owner/repo/caminho.
+    Sessão sem o retry do urllib3 (falha de conexão aparece na hora).
+    """
+    session = requests.Session()
+    yield dict(
+        token="t", owner="o", repo=f"r{uuid.uuid4().hex[:8]}", branch="main",
+        api_base=stub.url, session=session, timeout=(2, 5),
+    )
+    session.close()
+
+
+def wait_until(condition, timeout=15.0, interval=0.05):
+    """Espera condition() ficar verdadeira (threads em segundo plano)."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(interval)
+    return condition()
@@ -0,0 +1,197 @@
+# test_backends.py — Bancos do GitHub contra o github_stub (sem rede)
+# Merge de três vias no 409 | Fila offline (replay/recusa) | Write-behind em
+# lote | Ida e volta nos layouts fragmentado e diário
+
+import json
+import threading
+
+import pytest
+
+from conftest import wait_until
+from github_database import GitHubJSON
+from journal_database import JournaledGitHubJSON
+from offline_queue import QUEUED, OfflineJSON, RejectedMutation, classify_error
+from record_merge import MergeConflict
+from sharded_database import ShardedGitHubJSON
+
+
+def ids(db):
+    data, _ = db.load(force=True)
+    return sorted(str(r.get("id")) for r in data)
+
+
+# ============================================================
+# 409 — MERGE DE TRÊS VIAS
+# ============================================================
+def test_save_409_mescla_registros_diferentes(stub, gh):
+    GitHubJSON(path="dados.json", **gh).save([{"id": 1, "nome": "a"}])
+    a = GitHubJSON(path="dados.json", **gh)
+    b = GitHubJSON(path="dados.json", **gh)
+    base_a = a.load(force=True)
+    base_b = b.load(force=True)
+
+    a.save(base_a[0] + [{"id": 2, "nome": "de a"}], base=base_a)
+    # SHA de b ficou velho: 409 -> mescla com a versão de a
+    b.save(base_b[0] + [{"id": 3, "nome": "de b"}], base=base_b)
+
+    assert ids(GitHubJSON(path="dados.json", **gh)) == ["1", "2", "3"]
+    assert stub.counters["conflicts"] >= 1
+
+
+def test_save_409_mesmo_registro_levanta_conflito(gh):
+    GitHubJSON(path="dados.json", **gh).save([{"id": 1, "nome": "a"}])
+    a = GitHubJSON(path="dados.json", **gh)
+    b = GitHubJSON(path="dados.json", **gh)
+    base_a = a.load(force=True)
+    base_b = b.load(force=True)
+
+    a.save([{"id": 1, "nome": "de a"}], base=base_a)
+    with pytest.raises(MergeConflict):
+        b.save([{"id": 1, "nome": "de b"}], base=base_b)
+
+    data, _ = GitHubJSON(path="dados.json", **gh).load(force=True)
+    assert data == [{"id": 1, "nome": "de a"}]
+
+
+def test_upsert_create_nao_sobrescreve_id_existente(gh):
+    a = GitHubJSON(path="dados.json", **gh)
+    a.upsert({"id": 5, "nome": "a"}, create=True)
+    a.upsert({"id": 5, "nome": "a"}, create=True)   # repetição idempotente
+    with pytest.raises(MergeConflict):
+        GitHubJSON(path="dados.json", **gh).upsert({"id": 5, "nome": "b"}, create=True)
+    assert a.load(force=True)[0] == [{"id": 5, "nome": "a"}]
+
+
+# ============================================================
+# FILA OFFLINE — replay e recusa
+# ============================================================
+def test_fila_offline_publica_quando_o_github_volta(stub, gh, tmp_path):
+    db = GitHubJSON(path="dados.json", **gh)
+    db.save([])
+    off = OfflineJSON(db, str(tmp_path), sync_wait=0.2, retry_interval=0.1)
+
+    stub.stop()
+    gh["session"].close()   # conexões keep-alive ainda falariam com o stub
+    assert off.upsert({"id": 1, "nome": "offline"}) == QUEUED
+    assert [e["record"]["id"] for e in off.queue.pending()] == [1]
+    assert off.queue.overlay([]) == [{"id": 1, "nome": "offline"}]
+
+    stub.start()    # mesma porta, mesmo conteúdo
+    assert wait_until(lambda: off.queue.depth() == 0)
+    assert ids(GitHubJSON(path="dados.json", **gh)) == ["1"]
+
+
+def test_fila_offline_guarda_recusadas_e_segue(gh, tmp_path):
+    db = GitHubJSON(path="dados.json", **gh)
+    db.save([{"id": 1, "nome": "atual"}])
+    off = OfflineJSON(db, str(tmp_path), sync_wait=5.0, retry_interval=0.1)
+    queue = off.queue
+
+    _, conflito = queue.submit({
+        "op": "upsert", "record": {"id": 1, "nome": "minha"},
+        "expected": {"id": 1, "nome": "lida antes"},
+    })
+    _, invalida = queue.submit({"op": "renomear", "id": 1})
+    _, boa = queue.submit({"op": "upsert", "record": {"id": 2, "nome": "nova"}})
+
+    assert isinstance(conflito.exception(timeout=10), MergeConflict)
+    assert isinstance(invalida.exception(timeout=10), RejectedMutation)
+    assert boa.result(timeout=10) is True
+    assert queue.depth() == 0
+    assert sorted(e.get("op") for e in queue.conflicts()) == ["renomear", "upsert"]
+    assert ids(GitHubJSON(path="dados.json", **gh)) == ["1", "2"]
+
+
+def test_fila_offline_descarta_recusa_sincrona(gh, tmp_path):
+    db = GitHubJSON(path="dados.json", **gh)
+    db.save([{"id": 1, "nome": "atual"}])
+    off = OfflineJSON(db, str(tmp_path), sync_wait=5.0, retry_interval=0.1)
+    with pytest.raises(MergeConflict):
+        off.upsert({"id": 1, "nome": "minha"}, expected={"id": 1, "nome": "lida antes"})
+    # O chamador já viu o conflito: nada fica guardado
+    assert off.queue.conflicts() == []
+
+
+@pytest.mark.parametrize("message, kind", [
+    ("GitHub PUT error (dados.json): 401 - Bad credentials", "rejected"),
+    ("GitHub GET error: 404 - Not Found", "rejected"),
+    ("GitHub PUT error: 502 - Bad Gateway", "transient"),
+    ("algo inesperado", "unknown"),
+])
+def test_classify_error(message, kind):
+    assert classify_error(Exception(message)) == kind
+
+
+def test_classify_error_json_truncado_e_transitorio():
+    with pytest.raises(json.JSONDecodeError) as info:
+        json.loads('{"id": 1')
+    assert classify_error(info.value) == "transient"
+    assert classify_error(ValueError("Arquivo JSON excede o limite")) == "rejected"
+
+
+# ============================================================
+# WRITE-BEHIND — upserts concorrentes viram poucos commits
+# ============================================================
+@pytest.mark.parametrize("layout", ["monolithic", "sharded"])
+def test_write_behind_junta_upserts_num_commit(stub, gh, layout):
+    def make(**kwargs):
+        if layout == "sharded":
+            return ShardedGitHubJSON(path="dados", **gh, **kwargs)
+        return GitHubJSON(path="dados.json", **gh, **kwargs)
+
+    make().save([{"id": 0, "nome": "semente"}])
+    db = make(write_behind=True, write_window=0.3)
+    commits_before = len(stub.commits)
+
+    threads = [
+        threading.Thread(target=db.upsert, args=({"id": i, "nome": f"r{i}"},))
+        for i in range(1, 7)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert ids(make()) == [str(i) for i in range(7)]
+    assert len(stub.commits) - commits_before <= 2
+
+
+# ============================================================
+# IDA E VOLTA — fragmentado e diário
+# ============================================================
+def test_sharded_migra_e_grava_por_registro(stub, gh):
+    legado = [{"id": 1, "nome": "a"}, {"id": "café/x: y", "nome": "b"}]
+    stub.write_file("dados.json", json.dumps(legado).encode("utf-8"))
+
+    db = ShardedGitHubJSON(path="dados", legacy_path="dados.json", **gh)
+    assert ids(db) == ["1", "café/x: y"]
+
+    db.upsert({"id": 3, "nome": "c"})
+    db.delete(1)
+    db.update(lambda data: data + [{"id": 4}, {"id": 5}])
+
+    fresh = ShardedGitHubJSON(path="dados", legacy_path="dados.json", **gh)
+    assert ids(fresh) == ["3", "4", "5", "café/x: y"]
+    assert fresh.load_index()["café/x: y"] == "b"
+    shards = [p for p in stub.files_at("main") if p.startswith("dados/records/")]
+    assert all(p.count("/") == 2 and " " not in p for p in shards)
+
+
+def test_sharded_migracao_recusa_ids_duplicados(stub, gh):
+    stub.write_file("dados.json", json.dumps([{"id": 1}, {"id": 1, "x": 2}]).encode("utf-8"))
+    with pytest.raises(ValueError):
+        ShardedGitHubJSON(path="dados", legacy_path="dados.json", **gh).load(force=True)
+
+
+def test_journal_compacta_e_relê(gh):
+    db = JournaledGitHubJSON(path="dados.json", compact_entries=3, **gh)
+    db.upsert({"id": 1, "nome": "a"})
+    db.upsert({"id": 2, "nome": "b"})
+    db.delete(1)
+    db.upsert({"id": 2, "nome": "b2"})
+    db.upsert({"id": 3, "nome": "c"})
+
+    fresh = JournaledGitHubJSON(path="dados.json", compact_entries=3, **gh)
+    data, _ = fresh.load(force=True)
+    assert sorted((r["id"], r["nome"]) for r in data) == [(2, "b2"), (3, "c")]
+    assert fresh.journal_stats()["compacted_seq"] > 0
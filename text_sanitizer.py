@@ -0,0 +1,242 @@
+# text_sanitizer.py — sanitize_text / fix_technical_spacing pré-compilados
+# Regex compiladas 1 vez | Correções numa única alternância | Cache LRU
+#
+# O sanitize_text roda para os mesmos campos a cada rerun (ui_info_line,
+# ui_block_info, build_wrapped_lines, table() do PDF). Antes eram ~15 re.sub
+# com padrões em texto (o cache interno do `re` não comporta todos) e uma
+# passada inteira por correção. Aqui cada padrão é compilado no import, as
+# correções viram UM regex (uma passada, qualquer que seja o tamanho da
+# tabela) e o resultado fica num LRU limitado, chaveado pela string de entrada.
+#
+# A tabela de correções é dado (correcoes.json no repositório, editável no
+# app): set_corrections() recompila o matcher só quando o SHA muda. O regex é
+# montado como uma trie (prefixos comuns fatorados), então o custo por
+# posição do texto acompanha o tamanho da palavra, não o número de entradas.
+#
+# Benchmark: python bench_sanitize.py [--correcoes 500]
+
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+
+import metrics
+
+# Correções específicas de colagem comuns em faturamento (literais, sem
+# diferenciar maiúsculas/minúsculas). Valem enquanto o correcoes.json não
+# existir no repositório.
+CORRECOES_PADRAO = {
+    "PELASMARTKIDS": "PELA SMARTKIDS",
+    "serpediatria": "ser pediatria",
+    "depacote": "de pacote",
+    "diasútil": "dias útil",
+    "às12:00": "às 12:00",
+    "sófechar": "só fechar",
+    "gera oXML": "gera o XML",
+    "noSisAmil": "no SisAmil",
+}
+
+# Entradas maiores que isso não entram no LRU (limita a memória do cache)
+CACHE_MAX_CHARS = 64 * 1024
+CACHE_SIZE = 4096
+
+_LETRA = "A-Za-zÁÉÍÓÚÂÊÔÃÕÀÇáéíóúâêôãõàç"
+
+_RE_INVISIVEIS = re.compile(r"[\u00A0\u200B-\u200F\uFEFF]")
+_RE_URL = re.compile(r"https?://[^\s<>\"']+")
+_RE_NUM_LETRA = re.compile(rf"(\d)([{_LETRA}])")
+_RE_LETRA_NUM = re.compile(rf"([{_LETRA}])(\d)")
+_RE_PONTO = re.compile(r"(?<!\d)\.(?=[^\s\d])")
+_RE_DOIS_PONTOS = re.compile(r":(?!\s)")
+_RE_PONTO_VIRGULA = re.compile(r";(?!\s)")
+_RE_MAIOR = re.compile(r"\s*>\s*")
+_RE_BARRA = re.compile(r"\s*/\s*")
+_RE_BULLET = re.compile(r"([•\-–—\*→])([^\s])")
+_RE_ESPACOS = re.compile(r"[ \t]+")
+
+
+# ============================================================
+# CORREÇÕES — tabela -> um único regex (trie)
+# ============================================================
+def _trie_pattern(words):
+    """
+    Regex equivalente a "w1|w2|..." com os prefixos comuns fatorados.
+    Na mesma posição vence a palavra mais longa (o "fim de palavra" de cada
+    nó é opcional e testado por último).
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def _build(node):
+        ends = "" in node
+        branches = [re.escape(ch) + _build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not ends:
+            return branches[0]
+        return f"(?:{'|'.join(branches)})" + ("?" if ends else "")
+
+    return _build(trie)
+
+
+class CompiledCorrections:
+    """Tabela {erro: certo} compilada num matcher de uma passada."""
+
+    def __init__(self, correcoes, version=None):
+        pares = [(str(e), str(c)) for e, c in dict(correcoes).items() if e]
+        self.version = version
+        self.size = len(pares)
+        self._table = {}
+        for erro, certo in pares:
+            self._table.setdefault(erro.lower(), certo)
+        self._literal = [(re.compile(re.escape(e), re.IGNORECASE), c) for e, c in pares]
+        pattern = _trie_pattern(self._table)
+        # Caminho rápido: regex sem IGNORECASE sobre o texto em minúsculas
+        self._lower = re.compile(pattern) if self._table else None
+        self._regex = re.compile(pattern, re.IGNORECASE) if self._table else None
+
+    def _replace(self, match):
+        found = match.group(0)
+        certo = self._table.get(found.lower())
+        if certo is not None:
+            return certo
+        # Caixa que lower() não reproduz (casos raros do IGNORECASE Unicode)
+        for pattern, certo in self._literal:
+            if pattern.fullmatch(found):
+                return certo
+        return found
+
+    def apply(self, txt):
+        if self._regex is None:
+            return txt
+        low = txt.lower()
+        if len(low) != len(txt):
+            # lower() mudou o tamanho (ex.: "İ"): posições não batem
+            return self._regex.sub(self._replace, txt)
+        out = []
+        last = 0
+        for match in self._lower.finditer(low):
+            out.append(txt[last:match.start()])
+            out.append(self._table[match.group(0)])
+            last = match.end()
+        if not out:
+            return txt
+        out.append(txt[last:])
+        return "".join(out)
+
+
+_correcoes = CompiledCorrections(CORRECOES_PADRAO)
+_correcoes_lock = threading.Lock()
+
+
+def corrections_from_records(records):
+    """Registros do correcoes.json ({"id", "erro", "certo"}) -> {erro: certo}."""
+    out = {}
+    for rec in records or []:
+        if isinstance(rec, dict) and rec.get("erro"):
+            out[str(rec["erro"])] = str(rec.get("certo") or "")
+    return out
+
+
+def set_corrections(correcoes, version=None):
+    """
+    Troca a tabela de correções. Com `version` (SHA do correcoes.json)
+    igual à atual, não recompila nada. Retorna True se trocou.
+    """
+    global _correcoes
+    with _correcoes_lock:
+        if version is not None and version == _correcoes.version:
+            return False
+        _correcoes = CompiledCorrections(correcoes, version=version)
+    # Resultados da tabela antiga não servem mais (o LRU também é chaveado
+    # pela tabela; isto só libera a memória)
+    _sanitize_cached.cache_clear()
+    return True
+
+
+def current_corrections():
+    return _correcoes
+
+
+# ============================================================
+# PIPELINE
+# ============================================================
+def fix_technical_spacing(txt: str, correcoes=None) -> str:
+    if not txt:
+        return ""
+    correcoes = correcoes or _correcoes
+
+    urls = {}
+    def _url_replacer(match):
+        key = f"\u0000{len(urls)}\u0000"
+        urls[key] = match.group(0)
+        return key
+
+    # 1) Protege URLs para não inserir espaços no meio delas
+    txt = _RE_URL.sub(_url_replacer, txt)
+
+    # 2) Espaço entre Números e Letras (ex: 90dias -> 90 dias)
+    txt = _RE_NUM_LETRA.sub(r"\1 \2", txt)
+    txt = _RE_LETRA_NUM.sub(r"\1 \2", txt)
+
+    # 3) Espaço após pontuação se estiver colado (ex: fechar.> -> fechar. >)
+    # Ignora pontos decimais em números
+    txt = _RE_PONTO.sub(". ", txt)
+    txt = _RE_DOIS_PONTOS.sub(": ", txt)
+    txt = _RE_PONTO_VIRGULA.sub("; ", txt)
+
+    # 4) Espaços ao redor de operadores e delimitadores técnicos
+    txt = _RE_MAIOR.sub(" > ", txt)
+    txt = _RE_BARRA.sub(" / ", txt)
+
+    # 5) Correções específicas de colagem (todas numa passada)
+    txt = correcoes.apply(txt)
+
+    # 6) Bullets coladas (•Texto -> • Texto)
+    txt = _RE_BULLET.sub(r"\1 \2", txt)
+
+    # 7) Restaura URLs
+    for k, v in urls.items():
+        txt = txt.replace(k, v)
+
+    return txt
+
+
+def _sanitize(txt, correcoes=None):
+    # Normalização e remoção de caracteres invisíveis que causam colagem
+    txt = unicodedata.normalize("NFKC", txt)
+    txt = _RE_INVISIVEIS.sub(" ", txt)
+
+    # Aplica correções de espaçamento
+    txt = fix_technical_spacing(txt, correcoes)
+
+    # Remove espaços duplos
+    txt = _RE_ESPACOS.sub(" ", txt)
+    return txt.strip()
+
+
+_sanitize_cached = lru_cache(maxsize=CACHE_SIZE)(_sanitize)
+
+
+@metrics.timed("texto.sanitize_text")
+def sanitize_text(text) -> str:
+    if not text:
+        return ""
+    txt = str(text)
+    correcoes = _correcoes
+    if len(txt) > CACHE_MAX_CHARS:
+        return _sanitize(txt, correcoes)
+    return _sanitize_cached(txt, correcoes)
+
+
+def cache_info():
+    """Acertos/faltas do LRU (painel de diagnóstico / benchmark)."""
+    return _sanitize_cached.cache_info()
+
+
+def cache_clear():
+    _sanitize_cached.cache_clear()
@@ -0,0 +1,139 @@
+# write_queue.py — Write-behind: junta mutações concorrentes em UM commit
+# Fila por arquivo (processo inteiro) | Janela curta (ex.: 500ms) | Futures
+#
+# Em rajadas de edição, cada save() faria load + PUT e disputaria o SHA com
+# os outros (409 + backoff). Aqui as mutações entram numa fila por arquivo;
+# uma thread espera a janela, aplica todas em ordem sobre a versão mais
+# recente e publica um único commit. Cada chamador recebe um Future que só
+# resolve quando a SUA alteração está gravada no GitHub.
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from record_merge import MergeConflict
+
+# Uma fila por arquivo (cache_key do GitHubJSON), compartilhada no processo
+_QUEUES = {}
+_QUEUES_LOCK = threading.Lock()
+
+
+def get_write_queue(db, window=0.5, max_batch=100):
+    with _QUEUES_LOCK:
+        queue = _QUEUES.get(db.cache_key)
+        if queue is None:
+            queue = WriteQueue(db, window=window, max_batch=max_batch)
+            _QUEUES[db.cache_key] = queue
+        else:
+            # Instâncias novas a cada rerun: usa a mais recente p/ gravar
+            queue.db = db
+        return queue
+
+
+class WriteQueue:
+    def __init__(self, db, window=0.5, max_batch=100):
+        self.db = db
+        self.window = float(window)
+        self.max_batch = int(max_batch)
+
+        self._cond = threading.Condition()
+        self._pending = deque()     # (update_fn, commit_message, Future)
+        self._thread = None
+
+        self.stats = {"batches": 0, "mutations": 0, "failed_batches": 0, "max_batch": 0}
+        self.batch_sizes = deque(maxlen=200)
+
+    # ============================================================
+    # API PÚBLICA
+    # ============================================================
+    def submit(self, update_fn, commit_message=None):
+        """
+        Enfileira update_fn(list) -> list. Retorna um Future que resolve
+        (True) quando o commit que contém a mutação foi publicado.
+        """
+        future = Future()
+        with self._cond:
+            self._pending.append((update_fn, commit_message, future))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def depth(self):
+        with self._cond:
+            return len(self._pending)
+
+    def snapshot_stats(self):
+        with self._cond:
+            sizes = list(self.batch_sizes)
+            return {
+                **self.stats,
+                "queue_depth": len(self._pending),
+                "avg_batch": (sum(sizes) / len(sizes)) if sizes else 0.0,
+                "recent_batches": sizes[-20:],
+            }
+
+    # ============================================================
+    # WORKER
+    # ============================================================
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+
+            # Janela de coalescência: quem chegar nela vai no mesmo commit
+            time.sleep(self.window)
+
+            with self._cond:
+                n = min(len(self._pending), self.max_batch)
+                batch = [self._pending.popleft() for _ in range(n)]
+            if batch:
+                self._apply(batch)
+
+    def _apply(self, batch):
+        errors = {}
+
+        def _combined(data):
+            # Pode rodar mais de uma vez (retry do update): recomeça limpo
+            errors.clear()
+            for i, (fn, _, _) in enumerate(batch):
+                try:
+                    out = fn(list(data))
+                    if not isinstance(out, list):
+                        raise ValueError("update_fn deve retornar uma lista JSON serializável.")
+                    data = out
+                except Exception as e:
+                    errors[i] = e
+            return data
+
+        messages = [m for (_, m, _) in batch if m]
+        msg = messages[0] if len(set(messages)) == 1 else None
+        if len(batch) > 1:
+            base = msg or self.db.DEFAULT_COMMIT_MESSAGE
+            msg = f"{base} ({len(batch)} alterações)"
+
+        try:
+            self.db._update_direct(_combined, commit_message=msg)
+        except Exception as e:
+            with self._cond:
+                self.stats["failed_batches"] += 1
+            for (_, _, future) in batch:
+                future.set_exception(e)
+            return
+
+        with self._cond:
+            self.stats["batches"] += 1
+            self.stats["mutations"] += len(batch)
+            self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+            self.batch_sizes.append(len(batch))
+
+        for i, (_, _, future) in enumerate(batch):
+            if isinstance(errors.get(i), MergeConflict):
+                future.set_exception(errors[i])
+            elif i in errors:
+                future.set_exception(Exception(f"update_fn falhou: {errors[i]}"))
+            else:
+                future.set_result(True)